@@ -0,0 +1,122 @@
+"""
+Recall@k vs latency of the IVF-PQ index against exact search.
+
+Synthetic data is a Gaussian mixture (uniform random vectors have no
+cluster structure and are a worst case no real corpus looks like). With
+--chroma the stored embeddings of an existing Chroma collection (e.g. the
+pdfs/ corpus ingested by the app) are evaluated as well, using held-out
+stored vectors as queries.
+
+    python -m benchmarks.bench_ann_recall --size 100000 --dim 256
+    python -m benchmarks.bench_ann_recall --chroma pdf_chunks_v2
+"""
+
+from lib.database.IVFIndex import IVFIndex
+import argparse
+import numpy as np
+import time
+
+
+def synthetic(
+    size: int, dim: int, clusters: int = 512, noise: float = 0.35, seed: int = 0
+) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, clusters, size)]
+    vectors += noise * rng.standard_normal((size, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def from_chroma(collection_name: str) -> np.ndarray:
+    import chromadb
+
+    client = chromadb.PersistentClient(path="./chroma_db")
+    stored = client.get_collection(collection_name).get(include=["embeddings"])
+    vectors = np.asarray(stored["embeddings"], dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def evaluate(name: str, vectors: np.ndarray, args):
+    rng = np.random.default_rng(1)
+    held_out = rng.choice(len(vectors), min(args.queries, len(vectors) // 10), False)
+    mask = np.ones(len(vectors), dtype=bool)
+    mask[held_out] = False
+    queries, data = vectors[held_out], vectors[mask]
+    ids = [str(n) for n in range(len(data))]
+
+    start = time.perf_counter()
+    exact_scores = queries @ data.T
+    exact = np.argsort(-exact_scores, axis=1)[:, : args.k]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    n_lists = args.lists or max(1, int(np.sqrt(len(data))))
+    subvectors = args.subvectors
+    while data.shape[1] % subvectors:
+        subvectors //= 2
+
+    index = IVFIndex(n_lists=n_lists, n_subvectors=subvectors, train_size=50_000)
+    start = time.perf_counter()
+    index.train(data)
+    index.add(ids, data)
+    build_s = time.perf_counter() - start
+
+    print(
+        f"\n{name}: {len(data)} vectors x {data.shape[1]} dims, {index.n_lists} lists"
+    )
+    print(f"build {build_s:.2f}s | exact search {exact_ms:.3f} ms/query")
+    print(f"{'nprobe':>6} | {'recall@k':>8} | {'+rerank':>8} | {'ms/query':>8}")
+
+    for nprobe in args.nprobe:
+        if nprobe > index.n_lists:
+            continue
+        hits = 0
+        rerank_hits = 0
+        start = time.perf_counter()
+        results = [
+            index.search(query[None, :], args.k * args.rerank, nprobe)[0]
+            for query in queries
+        ]
+        elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+
+        for truth, query, (found, _) in zip(exact, queries, results):
+            found = np.array([int(i) for i in found], dtype=np.int64)
+            truth = set(truth.tolist())
+            hits += len(truth & set(found[: args.k].tolist()))
+            if len(found):
+                reranked = found[np.argsort(-(data[found] @ query))][: args.k]
+                rerank_hits += len(truth & set(reranked.tolist()))
+
+        total = len(queries) * args.k
+        print(
+            f"{nprobe:>6} | {hits / total:8.3f} | {rerank_hits / total:8.3f} | "
+            f"{elapsed:8.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=0)
+    parser.add_argument("--subvectors", type=int, default=32)
+    parser.add_argument("--clusters", type=int, default=512)
+    parser.add_argument("--noise", type=float, default=0.35)
+    parser.add_argument("--rerank", type=int, default=8)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--chroma", default=None, help="Chroma collection name")
+    args = parser.parse_args()
+
+    evaluate(
+        "synthetic",
+        synthetic(args.size, args.dim, args.clusters, args.noise),
+        args,
+    )
+
+    if args.chroma:
+        evaluate(f"chroma:{args.chroma}", from_chroma(args.chroma), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Memory benchmark for chunk and embedding records.
+
+Builds the same synthetic chunks twice and measures retained bytes per
+chunk with tracemalloc:
+
+- legacy: one dict per chunk (string id, duplicated source path) plus one
+  record dict per chunk holding the embedding as a list of Python floats,
+  as PdfReader.convet_to_json and App.embed_chunk used to produce;
+- compact: ChunkRecord (slots, interned source) plus one EmbeddingBatch
+  with a contiguous float32 matrix.
+
+Chunk text is counted in both, so the difference is pure overhead.
+
+    python -m benchmarks.bench_chunk_memory --chunks 2000 --dim 3072
+"""
+
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.documents.ChunkRecord import ChunkRecord
+import argparse
+import gc
+import random
+import tracemalloc
+
+
+def make_texts(n: int, size: int, seed: int) -> list[tuple[int, int, str]]:
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(5000)]
+    texts = []
+    for i in range(n):
+        text = " ".join(rng.choice(words) for _ in range(size // 6))
+        texts.append((i // 8 + 1, i % 8 + 1, text[:size]))
+    return texts
+
+
+def make_vectors(n: int, dim: int, seed: int) -> list[list[float]]:
+    rng = random.Random(seed)
+    return [[rng.random() for _ in range(dim)] for _ in range(n)]
+
+
+def build_legacy(source_parts, texts, embed) -> list[dict]:
+    records = []
+    for (page, number, text), vector in zip(texts, embed()):
+        # A fresh path string per chunk, as str.join / f-strings produce.
+        source = "".join(source_parts)
+        chunk = {
+            "id": f"{source}:{page}:{number}",
+            "page_number": page,
+            "chunk_number": number,
+            "content": text,
+            "source": source,
+        }
+        records.append(
+            {
+                "id": chunk["id"],
+                "embedding": vector,
+                "content": chunk["content"],
+                "metadata": {
+                    "page_number": chunk["page_number"],
+                    "chunk_number": chunk["chunk_number"],
+                    "source": chunk["source"],
+                },
+                "tokens": len(text) // 4,
+            }
+        )
+    return records
+
+
+def build_compact(source_parts, texts, embed) -> EmbeddingBatch:
+    chunks = [
+        ChunkRecord("".join(source_parts), page, number, text)
+        for page, number, text in texts
+    ]
+    return EmbeddingBatch(chunks, embed(), [len(t) // 4 for _, _, t in texts])
+
+
+def measure(build, *args) -> tuple[int, object]:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(*args)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--chunk-size", type=int, default=1200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    source_parts = ["/data/pdfs/", "clinical_guidelines_2024", ".pdf"]
+    texts = make_texts(args.chunks, args.chunk_size, args.seed)
+
+    # The embedding client returns lists of floats either way; legacy keeps
+    # them, the batch packs them and lets them go.
+    def embed():
+        return make_vectors(args.chunks, args.dim, args.seed)
+
+    text_bytes = sum(len(t.encode("utf-8")) + 49 for _, _, t in texts)
+
+    legacy_bytes, legacy = measure(build_legacy, source_parts, texts, embed)
+    legacy_bytes += text_bytes
+    del legacy
+    compact_bytes, compact = measure(build_compact, source_parts, texts, embed)
+    compact_bytes += text_bytes
+
+    n = args.chunks
+    print(f"chunks: {n}, dim: {args.dim}, chunk text: {text_bytes / n:,.0f} B/chunk")
+    print(f"legacy dicts + float lists:     {legacy_bytes / n:12,.0f} B/chunk")
+    print(
+        f"ChunkRecord + EmbeddingBatch:   {compact_bytes / n:12,.0f} B/chunk "
+        f"({legacy_bytes / compact_bytes:.1f}x smaller)"
+    )
+    print(
+        f"embedding matrix alone:         {compact.embeddings.nbytes / n:12,.0f} "
+        "B/chunk"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark for PdfReader.clean_text.
+
+Compares the original five-pass regex chain with TextCleaner on the raw
+page text of every PDF in pdfs/ and checks both produce identical output.
+
+    python -m benchmarks.bench_clean_text
+"""
+
+from lib.documents.TextCleaner import TextCleaner
+from langchain_community.document_loaders import PyPDFLoader
+import argparse
+import glob
+import re
+import time
+
+
+def legacy_clean_text(text: str) -> str:
+    text = re.sub(r"(\w+)-\s*\n\s*(\w+)", r"\1\2", text)
+    text = re.sub(r"^\d+\s*$", "", text, flags=re.MULTILINE)
+    text = re.sub(r"(?<!\n)\n(?!\n)", " ", text)
+
+    if "REFERENCES" in text.upper():
+        text = re.split(r"REFERENCES", text, flags=re.IGNORECASE)[0]
+
+    text = re.sub(r" +", " ", text)
+    return text.strip()
+
+
+def load_pages(pattern: str) -> list[str]:
+    pages = []
+    for file_path in sorted(glob.glob(pattern)):
+        pages.extend(doc.page_content for doc in PyPDFLoader(file_path).lazy_load())
+    return pages
+
+
+def throughput(clean, pages: list[str], size_mb: float, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            clean(page)
+    elapsed = time.perf_counter() - start
+    return size_mb * repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pattern", default="pdfs/*.pdf")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pattern)
+    size_mb = sum(len(page.encode("utf-8")) for page in pages) / 1_000_000
+    cleaner = TextCleaner()
+
+    mismatches = sum(
+        1 for page in pages if legacy_clean_text(page) != cleaner.clean(page)
+    )
+
+    before = throughput(legacy_clean_text, pages, size_mb, args.repeat)
+    after = throughput(cleaner.clean, pages, size_mb, args.repeat)
+
+    print(f"pages: {len(pages)} ({size_mb:.2f} MB)")
+    print(f"legacy clean_text: {before:8.2f} MB/s")
+    print(f"TextCleaner:       {after:8.2f} MB/s ({after / before:.2f}x)")
+    print(f"output mismatches: {mismatches}")
+
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Index size, query latency and recall of NumpyVectorStore compression.
+
+Every config (an EmbeddingCodec spec: float32 / int8 / binary, optionally
+truncated to `:<dims>`) is written to a fresh NumpyVectorStore and queried
+one vector at a time. Recall@k is measured against exact float32 search
+over the full-dimension vectors; held-out vectors of the same set are the
+queries.
+
+Vector sets:
+  pdfs       the pdfs/ corpus, split like the app and embedded with
+             gemini-embedding-001 (GOOGLE_API_KEY, goes through the
+             embedding cache) or, with --fake, with FakeEmbeddings.
+             FakeEmbeddings are hashed bag-of-words vectors, not
+             Matryoshka-trained, so truncation numbers only mean
+             something with real embeddings.
+  chroma     stored embeddings of an existing Chroma collection (--chroma).
+  synthetic  a Gaussian mixture of --size vectors at the corpus dimension,
+             to see how size and latency scale (--size 0 to skip). Its
+             components are equally informative, so truncation recall there
+             is a lower bound.
+
+    python -m benchmarks.bench_compression
+    python -m benchmarks.bench_compression --fake --size 100000
+    python -m benchmarks.bench_compression --chroma pdf_chunks_v2 --output c.json
+"""
+
+from lib.database.NumpyVectorStore import NumpyVectorStore
+from lib.database.EmbeddingCodec import EmbeddingCodec
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.documents.ChunkRecord import ChunkRecord
+from benchmarks.bench_ann_recall import synthetic, from_chroma
+import numpy as np
+import argparse
+import glob
+import json
+import os
+import tempfile
+import time
+
+DEFAULT_CONFIGS = [
+    "float32",
+    "float32:1536",
+    "float32:768",
+    "int8",
+    "int8:768",
+    "binary",
+    "binary:1536",
+]
+
+
+def corpus_vectors(pattern: str, fake: bool) -> np.ndarray:
+    from lib.documents.PdfReader import PdfReader
+    from lib.Services.EmbeddingService import EmbeddingService
+
+    reader = PdfReader(chunk_size=1200, chunk_overlap=250)
+    texts = []
+    for file_path in sorted(glob.glob(pattern, recursive=True)):
+        res = reader.extract_data(file_path)
+        if res.success:
+            texts.extend(chunk["content"] for chunk in res.data["pages"])
+
+    if fake:
+        from lib.Services.FakeBackends import FakeEmbeddings
+
+        service = EmbeddingService(
+            model="fake", use_cache=False, embeddings=FakeEmbeddings(dim=3072)
+        )
+    else:
+        service = EmbeddingService()
+
+    vectors = []
+    for start in range(0, len(texts), 100):
+        res = service.embed_query(texts[start : start + 100], max_tokens=10**7)
+        if not res.success:
+            raise SystemExit(f"Embedding failed: {res.error}")
+        vectors.extend(res.data["embedding"])
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def to_batch(vectors: np.ndarray, offset: int = 0) -> EmbeddingBatch:
+    chunks = [
+        ChunkRecord("bench.pdf", n // 10 + 1, n, f"chunk {n}", f"bench.pdf:{n}")
+        for n in range(offset, offset + len(vectors))
+    ]
+    return EmbeddingBatch(chunks, vectors)
+
+
+def disk_bytes(directory: str) -> int:
+    return sum(
+        os.path.getsize(path) for path in glob.glob(os.path.join(directory, "*.npy"))
+    )
+
+
+def evaluate(name: str, vectors: np.ndarray, configs: list[str], args) -> list[dict]:
+    rng = np.random.default_rng(1)
+    held_out = rng.choice(len(vectors), min(args.queries, len(vectors) // 10), False)
+    mask = np.ones(len(vectors), dtype=bool)
+    mask[held_out] = False
+    queries, data = vectors[held_out], vectors[mask]
+
+    exact = np.argsort(-(queries @ data.T), axis=1)[:, : args.k]
+    truth = [{f"bench.pdf:{n}" for n in row} for row in exact]
+
+    print(
+        f"\n{name}: {len(data)} vectors x {data.shape[1]} dims, {len(queries)} queries"
+    )
+    print(
+        f"{'config':>14} | {'index MB':>9} | {'rerank MB':>9} | {'disk MB':>8} | "
+        f"{'x smaller':>9} | {'p50 ms':>7} | {'p99 ms':>7} | {'recall@k':>8}"
+    )
+
+    rows = []
+    baseline = None
+    for spec in configs:
+        codec = EmbeddingCodec.parse(spec)
+        codec.rerank_factor = args.rerank
+        if codec.dims and codec.dims > data.shape[1]:
+            continue
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = NumpyVectorStore("bench", path=tmp, compression=codec)
+            for start in range(0, len(data), 50_000):
+                res = store.sync(to_batch(data[start : start + 50_000], start), [])
+                assert res.success, res.error
+
+            samples = []
+            hits = 0
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                res = store.get(query, n_results=args.k)
+                samples.append(time.perf_counter() - started)
+                assert res.success, res.error
+                hits += len(expected & set(res.data["ids"][0]))
+
+            sizes = store.storage_bytes()
+            row = {
+                "set": name,
+                "config": spec,
+                "vectors": len(data),
+                "dims": data.shape[1],
+                "index_bytes": sizes["index"],
+                "rerank_bytes": sizes["rerank"],
+                "disk_bytes": disk_bytes(store.directory),
+                "p50_ms": float(np.percentile(samples, 50) * 1000),
+                "p99_ms": float(np.percentile(samples, 99) * 1000),
+                "recall": hits / (len(queries) * args.k),
+            }
+
+        baseline = baseline or row
+        print(
+            f"{spec:>14} | {row['index_bytes'] / 1e6:9.2f} | "
+            f"{row['rerank_bytes'] / 1e6:9.2f} | {row['disk_bytes'] / 1e6:8.2f} | "
+            f"{baseline['index_bytes'] / row['index_bytes']:9.1f} | "
+            f"{row['p50_ms']:7.3f} | {row['p99_ms']:7.3f} | {row['recall']:8.3f}"
+        )
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS)
+    parser.add_argument("--pattern", default="pdfs/**/*.pdf")
+    parser.add_argument("--fake", action="store_true", help="FakeEmbeddings")
+    parser.add_argument("--chroma", default=None, help="Chroma collection name")
+    parser.add_argument("--size", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=8)
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    vectors = corpus_vectors(args.pattern, args.fake)
+    rows = evaluate("pdfs", vectors, args.configs, args)
+
+    if args.chroma:
+        rows += evaluate(
+            f"chroma:{args.chroma}", from_chroma(args.chroma), args.configs, args
+        )
+
+    if args.size:
+        rows += evaluate(
+            "synthetic",
+            synthetic(args.size, vectors.shape[1]),
+            args.configs,
+            args,
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
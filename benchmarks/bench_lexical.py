@@ -0,0 +1,169 @@
+"""
+Write and query cost of BM25Index at scale.
+
+A synthetic corpus of --chunks chunks is drawn from a Zipf-distributed
+vocabulary (a few very common terms, a long tail of rare ones) and synced
+into the index in batches of --batch, the way ingestion writes it. Reported
+for writes: mean / p99 sync latency, the number and cost of the checkpoints
+sync took, what one full save costs (what every sync used to pay) and the
+size of the packed postings.
+
+Queries come in three mixes: common terms only (long posting lists, the
+worst case), rare terms only, and one rare term plus common ones. Each is
+run with MaxScore pruning and exhaustively (p50 / p99 ms) and the top-k of
+both is compared. The query runs are repeated after tombstoning --delete of
+the chunks.
+
+    python -m benchmarks.bench_lexical
+    python -m benchmarks.bench_lexical --chunks 200000 --queries 200
+"""
+
+from lib.database.LexicalIndex import BM25Index
+import numpy as np
+import argparse
+import os
+import tempfile
+import time
+
+
+def make_corpus(args) -> tuple[list[str], list[dict]]:
+    rng = np.random.default_rng(args.seed)
+    vocab = [f"t{n}" for n in range(args.vocab)]
+    weights = 1.0 / np.arange(1, args.vocab + 1) ** args.zipf
+    weights /= weights.sum()
+
+    lengths = rng.integers(args.min_words, args.max_words, size=args.chunks)
+    words = rng.choice(args.vocab, size=int(lengths.sum()), p=weights)
+    ends = np.cumsum(lengths)
+    chunks = [
+        {
+            "id": f"synthetic.pdf:{n // 10 + 1}:{n + 1}",
+            "content": " ".join(vocab[w] for w in words[end - length : end]),
+        }
+        for n, (end, length) in enumerate(zip(ends, lengths))
+    ]
+    return vocab, chunks
+
+
+def make_queries(vocab: list[str], args) -> dict[str, list[str]]:
+    rng = np.random.default_rng(args.seed + 1)
+    common = vocab[: args.common_terms]
+    rare = vocab[args.vocab // 10 :]
+
+    def pick(pool, size):
+        return [pool[n] for n in rng.choice(len(pool), size, replace=False)]
+
+    return {
+        "common": [" ".join(pick(common, 4)) for _ in range(args.queries)],
+        "rare": [" ".join(pick(rare, 2)) for _ in range(args.queries)],
+        "mixed": [
+            " ".join(pick(rare, 1) + pick(common, 3)) for _ in range(args.queries)
+        ],
+    }
+
+
+def percentiles(samples: list[float]) -> tuple[float, float]:
+    ms = np.asarray(samples) * 1000
+    return float(np.percentile(ms, 50)), float(np.percentile(ms, 99))
+
+
+def bench_writes(index: BM25Index, chunks: list[dict], batch: int) -> dict:
+    samples = []
+    checkpoints = []
+    for start in range(0, len(chunks), batch):
+        started = time.perf_counter()
+        res = index.sync(chunks[start : start + batch], [])
+        elapsed = time.perf_counter() - started
+        assert res.success, res.error
+        # sync empties the log when it checkpoints.
+        (checkpoints if index.logged == 0 else samples).append(elapsed)
+
+    started = time.perf_counter()
+    index.save()
+    full_save = time.perf_counter() - started
+    postings = os.path.getsize(os.path.join(index.path, "postings.npz"))
+
+    return {
+        "sync_mean_ms": float(np.mean(samples)) * 1000,
+        "sync_p99_ms": percentiles(samples)[1],
+        "checkpoints": len(checkpoints),
+        "checkpoint_seconds": float(np.sum(checkpoints)),
+        "full_save_seconds": full_save,
+        "postings_mb": postings / 1e6,
+        "bytes_per_posting": postings / sum(len(p) for p in index.postings.values()),
+    }
+
+
+def bench_queries(index: BM25Index, queries: dict[str, list[str]], k: int):
+    print(
+        f"{'queries':>8} | {'pruned p50':>10} | {'p99':>7} | "
+        f"{'exhaustive p50':>14} | {'p99':>7} | same top-{k}"
+    )
+    for name, texts in queries.items():
+        pruned, exhaustive = [], []
+        same = 0
+        for text in texts:
+            started = time.perf_counter()
+            fast = index.search(text, k)
+            pruned.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            full = index.search(text, k, exhaustive=True)
+            exhaustive.append(time.perf_counter() - started)
+
+            same += np.allclose([s for _, s in fast], [s for _, s in full], atol=1e-4)
+
+        p50, p99 = percentiles(pruned)
+        e50, e99 = percentiles(exhaustive)
+        print(
+            f"{name:>8} | {p50:10.2f} | {p99:7.2f} | {e50:14.2f} | {e99:7.2f} | "
+            f"{same / len(texts):.0%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--zipf", type=float, default=1.0)
+    parser.add_argument("--min-words", type=int, default=80)
+    parser.add_argument("--max-words", type=int, default=220)
+    parser.add_argument("--common-terms", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--delete", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    vocab, chunks = make_corpus(args)
+    queries = make_queries(vocab, args)
+    print(f"{len(chunks)} chunks generated in {time.perf_counter() - started:.1f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = BM25Index(path=tmp)
+        started = time.perf_counter()
+        writes = bench_writes(index, chunks, args.batch)
+        print(
+            f"indexed in {time.perf_counter() - started:.1f}s: sync mean "
+            f"{writes['sync_mean_ms']:.1f} ms, p99 {writes['sync_p99_ms']:.1f} ms; "
+            f"{writes['checkpoints']} checkpoints, "
+            f"{writes['checkpoint_seconds']:.1f}s total; "
+            f"one full save {writes['full_save_seconds']:.1f}s; postings "
+            f"{writes['postings_mb']:.0f} MB, "
+            f"{writes['bytes_per_posting']:.2f} bytes per posting"
+        )
+
+        print()
+        bench_queries(index, queries, args.k)
+
+        rng = np.random.default_rng(args.seed + 2)
+        removed = rng.choice(len(chunks), int(len(chunks) * args.delete), replace=False)
+        index.remove([chunks[n]["id"] for n in removed])
+        print(f"\n{len(removed)} chunks tombstoned")
+        bench_queries(index, queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
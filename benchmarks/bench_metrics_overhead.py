@@ -0,0 +1,64 @@
+"""
+Cost of the instrumentation layer on hot paths.
+
+Times an empty function called bare, through @Metrics.traced, inside a
+Metrics.span block and next to a Metrics.count call, first with metrics
+disabled (the default) and then enabled with the in-memory aggregator.
+
+    python -m benchmarks.bench_metrics_overhead --calls 1000000
+"""
+
+from lib.common.metrics import Metrics
+import argparse
+import time
+
+
+def work():
+    return None
+
+
+@Metrics.traced("bench")
+def traced_work():
+    return None
+
+
+def per_call_ns(func, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def spanned():
+    with Metrics.span("bench"):
+        return None
+
+
+def counted():
+    Metrics.count("bench_total")
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    for enabled in (False, True):
+        Metrics.configure(enabled=enabled)
+        Metrics.reset()
+        bare = per_call_ns(work, args.calls)
+        print(f"metrics {'enabled ' if enabled else 'disabled'}")
+        print(f"  bare call          {bare:8.1f} ns")
+        for name, func in (
+            ("@Metrics.traced", traced_work),
+            ("Metrics.span", spanned),
+            ("Metrics.count", counted),
+        ):
+            cost = per_call_ns(func, args.calls)
+            print(f"  {name:<18} {cost:8.1f} ns  (+{cost - bare:.1f} ns)")
+    Metrics.configure(enabled=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Serial vs page-range-sharded PdfReader.extract_data on one large PDF.
+
+The pages of every PDF in pdfs/ are repeated into a single document of
+--pages pages, which is then parsed with workers=1 and with each of
+--workers. Every sharded run is checked against the serial one: same
+chunk ids, page numbers, contents and token counts, in the same order.
+
+    python -m benchmarks.bench_pdf_parse
+    python -m benchmarks.bench_pdf_parse --pages 2000 --workers 2 4 8
+"""
+
+from lib.documents.PdfReader import PdfReader
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+
+def build_pdf(pattern: str, pages: int, path: str):
+    from pypdf import PdfReader as PyPdf, PdfWriter
+
+    sources = [PyPdf(file_path) for file_path in sorted(glob.glob(pattern))]
+    source_pages = [page for pdf in sources for page in pdf.pages]
+    if not source_pages:
+        raise SystemExit(f"No PDFs match {pattern}")
+
+    writer = PdfWriter()
+    for n in range(pages):
+        writer.add_page(source_pages[n % len(source_pages)])
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def parse(file_path: str, workers: int, args) -> tuple[float, list]:
+    reader = PdfReader(
+        chunk_size=1200,
+        chunk_overlap=250,
+        workers=workers,
+        min_shard_pages=args.min_shard_pages,
+    )
+    started = time.perf_counter()
+    res = reader.extract_data(file_path)
+    elapsed = time.perf_counter() - started
+    if not res.success:
+        raise SystemExit(f"Parsing failed: {res.error}")
+    return elapsed, res.data["pages"]
+
+
+def signature(chunks: list) -> list[tuple]:
+    return [
+        (chunk.id, chunk.page_number, chunk.content, chunk.token_count)
+        for chunk in chunks
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pattern", default="pdfs/*.pdf")
+    parser.add_argument("--pages", type=int, default=1200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--min-shard-pages", type=int, default=25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "large.pdf")
+        build_pdf(args.pattern, args.pages, file_path)
+        size_mb = os.path.getsize(file_path) / 1e6
+        print(f"{args.pages} pages, {size_mb:.1f} MB, {os.cpu_count()} CPUs")
+
+        baseline, expected = parse(file_path, 1, args)
+        expected = signature(expected)
+        print(
+            f"{'workers':>7} | {'seconds':>8} | {'speedup':>7} | {'chunks':>6} | same"
+        )
+        print(f"{1:>7} | {baseline:8.2f} | {1.0:7.2f} | {len(expected):>6} | -")
+
+        for workers in args.workers:
+            elapsed, chunks = parse(file_path, workers, args)
+            same = signature(chunks) == expected
+            print(
+                f"{workers:>7} | {elapsed:8.2f} | {baseline / elapsed:7.2f} | "
+                f"{len(chunks):>6} | {'yes' if same else 'NO'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""
+Stage-by-stage benchmark of the RAG pipeline, fully offline.
+
+Embedding and LLM calls go to FakeEmbeddings / FakeChatModel with
+configurable latency and error rate, so the numbers reflect this code
+rather than the network. Stages: PDF load, clean_text, splitting,
+embedding, vector store write, vector and hybrid query, context assembly
+and prompt build + generate. Every stage after PDF load is repeated on
+synthetic scale-ups of the corpus (`--scales`).
+
+Results are written as JSON. With `--compare` the run is checked against
+an earlier results file and exits 1 when a stage got slower than
+`--tolerance` allows.
+
+    python -m benchmarks.bench_pipeline --scales 1 10 --output bench.json
+    python -m benchmarks.bench_pipeline --compare bench.json
+
+tiktoken's cl100k_base encoding must already be in its local cache.
+"""
+
+from lib.Services.EmbeddingService import EmbeddingService
+from lib.Services.EmbeddingBatcher import EmbeddingBatcher
+from lib.Services.LLMService import LLMService
+from lib.Services.FakeBackends import FakeEmbeddings, FakeChatModel, FaultInjector
+from lib.database.VectorStoreFactory import create_vector_store
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.database.LexicalIndex import BM25Index
+from lib.documents.PdfReader import PdfReader
+from lib.documents.ChunkRecord import ChunkRecord
+from lib.retrieval.HybridRetriever import HybridRetriever
+from lib.retrieval.ContextAssembler import ContextAssembler
+from lib.scheduler.RequestScheduler import RequestScheduler
+from langchain_community.document_loaders import PyPDFLoader
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+import numpy as np
+import argparse
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+# Stages compared by --compare, with the metric that is compared.
+COMPARED = {
+    "pdf_load": "seconds",
+    "clean_text": "seconds",
+    "split": "seconds",
+    "embedding": "seconds",
+    "store_write": "seconds",
+    "query_vector": "p50_ms",
+    "query_hybrid": "p50_ms",
+    "context_assembly": "p50_ms",
+    "prompt_generate": "p50_ms",
+}
+
+
+def timed(samples: list[float]) -> dict:
+    ms = np.asarray(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+        "count": len(samples),
+    }
+
+
+def throughput(seconds: float, items: int, unit: str) -> dict:
+    return {
+        "seconds": seconds,
+        unit: items,
+        f"{unit}_per_second": items / seconds if seconds else 0.0,
+    }
+
+
+def scale_up(pages: list, scale: int) -> list:
+    """Repeat the corpus `scale` times, marking each copy so nothing dedupes"""
+    if scale == 1:
+        return pages
+    return [
+        type(page)(
+            page_content=f"{page.page_content}\ncopy {copy}",
+            metadata={
+                **page.metadata,
+                "source": f"copy{copy}/{page.metadata.get('source')}",
+            },
+        )
+        for copy in range(scale)
+        for page in pages
+    ]
+
+
+# ---------------------------------------------------
+# Stages
+# ---------------------------------------------------
+def bench_load(pattern: str) -> tuple[dict, list]:
+    start = time.perf_counter()
+    pages = []
+    for file_path in sorted(glob.glob(pattern)):
+        pages.extend(PyPDFLoader(file_path).lazy_load())
+    return throughput(time.perf_counter() - start, len(pages), "pages"), pages
+
+
+def bench_clean(reader: PdfReader, pages: list) -> tuple[dict, list]:
+    start = time.perf_counter()
+    cleaned = []
+    for page in pages:
+        text = reader.cleaner.clean(page.page_content)
+        cleaned.append(type(page)(page_content=text, metadata=page.metadata))
+    seconds = time.perf_counter() - start
+    size_mb = sum(len(p.page_content.encode("utf-8")) for p in pages) / 1_000_000
+    return {**throughput(seconds, len(pages), "pages"), "mb": size_mb}, cleaned
+
+
+def bench_split(reader: PdfReader, pages: list) -> tuple[dict, list]:
+    start = time.perf_counter()
+    chunks = []
+    for page in pages:
+        source = page.metadata.get("source", "corpus")
+        page_number = page.metadata.get("page", 0) + 1
+        for content in reader.splitter.split_text(page.page_content):
+            chunks.append(ChunkRecord(source, page_number, len(chunks) + 1, content))
+    return throughput(time.perf_counter() - start, len(chunks), "chunks"), chunks
+
+
+def bench_embed(batcher: EmbeddingBatcher, chunks: list, workers: int):
+    start = time.perf_counter()
+    built = batcher.build_batches(chunks)
+    assert built.success, built.error
+    batches = built.data["batches"]
+
+    embedded = []
+    requests = 0
+    failed = len(built.data["rejected"])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(batcher.embed_batch, batches):
+            requests += result["requests"]
+            failed += len(result["failed"])
+            embedded.append(result["batch"])
+    records = EmbeddingBatch.concat(embedded)
+    seconds = time.perf_counter() - start
+    tokens = records.total_tokens
+    return {
+        **throughput(seconds, len(records), "chunks"),
+        "tokens": tokens,
+        "tokens_per_second": tokens / seconds if seconds else 0.0,
+        "requests": requests,
+        "failed": failed,
+    }, records
+
+
+def bench_write(store, lexical: BM25Index, records: EmbeddingBatch) -> dict:
+    start = time.perf_counter()
+    for offset in range(0, len(records), 5000):
+        res = store.sync(records[offset : offset + 5000], [])
+        assert res.success, res.error
+    store_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lexical.add(records)
+    lexical_seconds = time.perf_counter() - start
+
+    return {
+        **throughput(store_seconds, len(records), "chunks"),
+        "lexical_seconds": lexical_seconds,
+    }
+
+
+def bench_queries(
+    service, scheduler, store, retriever, assembler, llm, questions, n_results
+):
+    vector, hybrid, assembly, generate = [], [], [], []
+    saved = 0
+    failed = 0
+    for question in questions:
+        res = scheduler.run(service.embed_query, question, max_tokens=3000)
+        if not res.success:
+            failed += 1
+            continue
+        embedding = res.data["embedding"]
+
+        start = time.perf_counter()
+        res = store.get(embedding, n_results=n_results)
+        vector.append(time.perf_counter() - start)
+        assert res.success, res.error
+
+        start = time.perf_counter()
+        res = retriever.retrieve(question, embedding, n_results)
+        hybrid.append(time.perf_counter() - start)
+        assert res.success, res.error
+
+        start = time.perf_counter()
+        context = assembler.assemble(
+            res.data["ids"][0], res.data["documents"][0], res.data["metadatas"][0]
+        )
+        assembly.append(time.perf_counter() - start)
+        saved += context.data["tokens_saved"]
+
+        start = time.perf_counter()
+        # LLMService prints the raw model response.
+        with redirect_stdout(io.StringIO()):
+            answer = scheduler.run(
+                llm.generate_response_for_pdf_chunks, context.data["chunks"], question
+            )
+        generate.append(time.perf_counter() - start)
+        if not answer.success:
+            failed += 1
+
+    return {
+        "query_vector": timed(vector),
+        "query_hybrid": timed(hybrid),
+        "context_assembly": {
+            **timed(assembly),
+            "tokens_saved_per_query": saved / len(assembly),
+        },
+        "prompt_generate": {**timed(generate), "failed": failed},
+    }
+
+
+# ---------------------------------------------------
+# Report
+# ---------------------------------------------------
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    baseline_runs = {run["scale"]: run["stages"] for run in baseline["runs"]}
+    for run in results["runs"]:
+        previous = baseline_runs.get(run["scale"])
+        if previous is None:
+            continue
+        for stage, metric in COMPARED.items():
+            old = previous.get(stage, {}).get(metric)
+            new = run["stages"].get(stage, {}).get(metric)
+            if old and new and new > old * (1 + tolerance):
+                regressions.append(
+                    f"scale {run['scale']} {stage}: {metric} {old:.4g} -> {new:.4g} "
+                    f"(+{(new / old - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pattern", default="pdfs/*.pdf")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--store", default="chroma", choices=["chroma", "numpy"])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--output", default="bench_pipeline.json")
+    parser.add_argument("--compare", default=None, help="earlier results file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        # Read first: --output may point at the same file.
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    reader = PdfReader(chunk_size=1200, chunk_overlap=250)
+    load, pages = bench_load(args.pattern)
+    if not pages:
+        raise SystemExit(f"No PDFs match {args.pattern}")
+
+    results = {"meta": metadata(args), "runs": []}
+
+    # One directory for the whole run: Chroma caches its client by the
+    # relative ./chroma_db path, so each scale gets its own collection.
+    tmp = tempfile.TemporaryDirectory()
+    cwd = os.getcwd()
+    os.chdir(tmp.name)
+
+    service = EmbeddingService(
+        use_cache=False,
+        embeddings=FakeEmbeddings(
+            args.dim, FaultInjector(args.embed_latency, error_rate=args.error_rate)
+        ),
+    )
+    # No rate limits: injected errors are retried as in App, but the
+    # benchmark never waits on a quota.
+    scheduler = RequestScheduler("Benchmark", max_concurrency=args.workers)
+    batcher = EmbeddingBatcher(service, scheduler=scheduler)
+    llm = LLMService(
+        model=FakeChatModel(
+            FaultInjector(args.llm_latency, error_rate=args.error_rate, seed=1)
+        )
+    )
+    assembler = ContextAssembler(lambda text: service.count_tokens(text).data)
+
+    for scale in args.scales:
+        stages = {"pdf_load": load}
+        scaled_pages = scale_up(pages, scale)
+
+        stages["clean_text"], cleaned = bench_clean(reader, scaled_pages)
+        stages["split"], chunks = bench_split(reader, cleaned)
+
+        store = create_vector_store(args.store, f"bench_x{scale}")
+        stages["embedding"], records = bench_embed(batcher, chunks, args.workers)
+
+        lexical = BM25Index(path=f"bm25_x{scale}")
+        stages["store_write"] = bench_write(store, lexical, records)
+
+        step = max(1, len(chunks) // args.queries)
+        questions = [
+            " ".join(chunk["content"].split()[:12])
+            for chunk in chunks[::step][: args.queries]
+        ]
+        stages.update(
+            bench_queries(
+                service,
+                scheduler,
+                store,
+                HybridRetriever(store, lexical),
+                assembler,
+                llm,
+                questions,
+                args.n_results,
+            )
+        )
+
+        results["runs"].append({"scale": scale, "stages": stages})
+
+        print(f"\nscale x{scale}: {len(scaled_pages)} pages, {len(chunks)} chunks")
+        for name, stage in stages.items():
+            if "seconds" in stage:
+                rate = next(v for k, v in stage.items() if k.endswith("_per_second"))
+                print(f"  {name:<17} {stage['seconds']:8.3f}s  {rate:12.1f}/s")
+            else:
+                print(
+                    f"  {name:<17} p50 {stage['p50_ms']:8.3f} ms  "
+                    f"p99 {stage['p99_ms']:8.3f} ms"
+                )
+
+    os.chdir(cwd)
+    tmp.cleanup()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Recall vs latency of the rerank stage.
+
+The pdfs/ corpus is split into small chunks, embedded (gemini-embedding-001,
+or FakeEmbeddings with --fake) and written to a NumpyVectorStore plus a
+BM25Index. Each query is a noisy excerpt of a chunk: a window of
+--query-words words with every word dropped with probability --drop. The
+relevant chunks are the ones that contain the whole window.
+
+For each first stage (vector, hybrid) the top 3 without reranking are the
+baseline; then every --candidates x --budgets combination over-fetches,
+reranks with LexicalReranker and keeps the top 3. Reported: recall@3, MRR@3,
+rerank p50 / p99 latency, the share of candidates scored and how often the
+budget cut scoring short.
+
+    python -m benchmarks.bench_rerank --fake
+    python -m benchmarks.bench_rerank --candidates 10 20 50 --budgets 0.5 2 50
+"""
+
+from lib.database.NumpyVectorStore import NumpyVectorStore
+from lib.database.LexicalIndex import BM25Index, tokenize
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.documents.PdfReader import PdfReader
+from lib.retrieval.HybridRetriever import HybridRetriever
+from lib.retrieval.Rerankers import create_reranker
+from lib.retrieval.RerankStage import RerankStage
+import numpy as np
+import argparse
+import glob
+import json
+import os
+import random
+import tempfile
+
+
+def load_chunks(pattern: str, chunk_size: int) -> list:
+    reader = PdfReader(chunk_size=chunk_size, chunk_overlap=chunk_size // 5)
+    chunks = []
+    for file_path in sorted(glob.glob(pattern, recursive=True)):
+        res = reader.extract_data(file_path)
+        if res.success:
+            chunks.extend(res.data["pages"])
+    return chunks
+
+
+def embedder(fake: bool):
+    if fake:
+        from lib.Services.FakeBackends import FakeEmbeddings
+
+        return FakeEmbeddings(dim=768).embed_documents
+
+    from lib.Services.EmbeddingService import EmbeddingService
+
+    service = EmbeddingService()
+
+    def embed(texts: list[str]) -> list:
+        vectors = []
+        for start in range(0, len(texts), 100):
+            res = service.embed_query(texts[start : start + 100], max_tokens=10**7)
+            if not res.success:
+                raise SystemExit(f"Embedding failed: {res.error}")
+            vectors.extend(res.data["embedding"])
+        return vectors
+
+    return embed
+
+
+def make_queries(chunks: list, args) -> list[dict]:
+    rng = random.Random(args.seed)
+    token_lists = [tokenize(chunk.content) for chunk in chunks]
+    padded = [f" {' '.join(tokens)} " for tokens in token_lists]
+
+    queries = []
+    while len(queries) < args.queries:
+        tokens = token_lists[rng.randrange(len(chunks))]
+        if len(tokens) < args.query_words * 2:
+            continue
+        start = rng.randrange(len(tokens) - args.query_words)
+        window = tokens[start : start + args.query_words]
+        words = [w for w in window if rng.random() >= args.drop] or window[:1]
+
+        needle = f" {' '.join(window)} "
+        relevant = {chunk.id for chunk, text in zip(chunks, padded) if needle in text}
+        queries.append({"question": " ".join(words), "relevant": relevant})
+    return queries
+
+
+def score(results: list[list[str]], queries: list[dict], k: int = 3) -> dict:
+    hits = 0
+    reciprocal = 0.0
+    for ids, query in zip(results, queries):
+        ranks = [n for n, i in enumerate(ids[:k]) if i in query["relevant"]]
+        hits += bool(ranks)
+        reciprocal += 1 / (ranks[0] + 1) if ranks else 0.0
+    return {"recall": hits / len(queries), "mrr": reciprocal / len(queries)}
+
+
+def evaluate(name: str, candidates_by_query: list[dict], queries: list, index, args):
+    print(f"\n{name}")
+    print(
+        f"{'candidates':>10} | {'budget ms':>9} | {'recall@3':>8} | {'MRR@3':>6} | "
+        f"{'p50 ms':>7} | {'p99 ms':>7} | {'scored':>6} | {'cutoffs':>7}"
+    )
+
+    base = score([c["ids"][:3] for c in candidates_by_query], queries)
+    print(
+        f"{'-':>10} | {'-':>9} | {base['recall']:8.3f} | {base['mrr']:6.3f} | "
+        f"{'-':>7} | {'-':>7} | {'-':>6} | {'-':>7}"
+    )
+    rows = [{"stage": name, "candidates": 0, "budget_ms": None, **base}]
+
+    reranker = create_reranker("lexical", index)
+    for candidates in args.candidates:
+        for budget in args.budgets:
+            stage = RerankStage(
+                reranker,
+                candidates=candidates,
+                batch_size=args.batch_size,
+                budget_ms=budget,
+            )
+            results = []
+            latencies = []
+            for query, first in zip(queries, candidates_by_query):
+                res = stage.rerank(
+                    query["question"],
+                    {
+                        "ids": [first["ids"][:candidates]],
+                        "documents": [first["documents"][:candidates]],
+                        "metadatas": [first["metadatas"][:candidates]],
+                    },
+                    n_results=3,
+                )
+                assert res.success, res.error
+                results.append(res.data["ids"][0])
+                latencies.append(res.data["rerank"][0]["elapsed_ms"])
+
+            row = {
+                "stage": name,
+                "candidates": candidates,
+                "budget_ms": budget,
+                **score(results, queries),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "scored": stage.stats["scored"] / max(stage.stats["candidates"], 1),
+                "cutoffs": stage.stats["cutoffs"] / stage.stats["queries"],
+            }
+            print(
+                f"{candidates:>10} | {budget:9.1f} | {row['recall']:8.3f} | "
+                f"{row['mrr']:6.3f} | {row['p50_ms']:7.3f} | {row['p99_ms']:7.3f} | "
+                f"{row['scored']:6.2f} | {row['cutoffs']:7.2f}"
+            )
+            rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pattern", default="pdfs/**/*.pdf")
+    parser.add_argument("--fake", action="store_true", help="FakeEmbeddings")
+    parser.add_argument("--chunk-size", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--query-words", type=int, default=10)
+    parser.add_argument("--drop", type=float, default=0.4)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 20, 50])
+    parser.add_argument("--budgets", type=float, nargs="+", default=[0.5, 2, 50])
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.pattern, args.chunk_size)
+    queries = make_queries(chunks, args)
+    embed = embedder(args.fake)
+    print(f"{len(chunks)} chunks, {len(queries)} queries")
+
+    depth = max(args.candidates)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = NumpyVectorStore("bench", path=tmp)
+        vectors = np.asarray(embed([chunk.content for chunk in chunks]), np.float32)
+        res = store.sync(EmbeddingBatch(chunks, vectors), [])
+        assert res.success, res.error
+
+        index = BM25Index(path=os.path.join(tmp, "bm25"))
+        index.add(chunks)
+        hybrid = HybridRetriever(store, index, candidates=depth)
+
+        questions = [query["question"] for query in queries]
+        query_vectors = embed(questions)
+
+        rows = []
+        for name, res in (
+            ("vector", store.get_many(query_vectors, n_results=depth)),
+            ("hybrid", hybrid.retrieve_many(questions, query_vectors, depth)),
+        ):
+            assert res.success, res.error
+            first = [
+                {key: res.data[key][q] for key in ("ids", "documents", "metadatas")}
+                for q in range(len(queries))
+            ]
+            rows += evaluate(name, first, queries, index, args)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
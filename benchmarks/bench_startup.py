@@ -0,0 +1,99 @@
+"""
+Startup profile for the terminal app.
+
+Runs `python -X importtime` on rag.first_project and prints the slowest
+imports (cumulative) and the import time per top-level package, then
+times a query-only start: a fresh interpreter that imports the app and
+constructs App, i.e. everything before the menu shows. Interpreter start
+(`python -c pass`) is measured separately and subtracted.
+
+Exits with status 1 when the median query-only start exceeds --budget-ms,
+so it can gate changes that pull heavy imports back into startup.
+
+    python -m benchmarks.bench_startup --budget-ms 400
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+START_APP = (
+    "from rag.first_project import App; "
+    "App('pdfs/generative_ai_healthcare_guide.pdf')"
+)
+
+
+def import_profile(module: str) -> list[tuple[str, int, int, int]]:
+    """(module, self us, cumulative us, depth) per line of -X importtime"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def by_package(rows: list) -> dict[str, int]:
+    totals = {}
+    for name, self_us, _, _ in rows:
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return dict(sorted(totals.items(), key=lambda kv: -kv[1]))
+
+
+def wall_ms(code: str, repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="rag.first_project")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=400.0)
+    args = parser.parse_args()
+
+    rows = import_profile(args.module)
+    total = next((c for n, _, c, d in rows if n == args.module and d == 0), 0)
+
+    print(f"import {args.module}: {total / 1000:.1f} ms cumulative\n")
+    print("slowest imports (cumulative):")
+    for name, _, cumulative, _ in sorted(rows, key=lambda r: -r[2])[: args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    print("\nself time by top-level package:")
+    for package, self_us in list(by_package(rows).items())[: args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+
+    interpreter = statistics.median(wall_ms("pass", args.repeat))
+    start = statistics.median(wall_ms(START_APP, args.repeat)) - interpreter
+
+    print(f"\ninterpreter start:  {interpreter:8.1f} ms")
+    print(f"query-only start:   {start:8.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    if start > args.budget_ms:
+        print("over budget")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Query latency of the Chroma and NumPy vector store backends.
+
+Both stores are filled with the same synthetic unit vectors in temporary
+directories, then queried one vector at a time (p50/p99) and in one
+batched get_many call.
+
+    python -m benchmarks.bench_vector_store --sizes 10000 100000 --dim 768
+"""
+
+from lib.database.NumpyVectorStore import NumpyVectorStore
+from lib.database.ChormaDB import ChromaDB
+import argparse
+import numpy as np
+import os
+import tempfile
+import time
+
+
+def make_records(size: int, dim: int, seed: int = 0) -> tuple[list, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((size, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    records = [
+        {
+            "id": f"synthetic.pdf:{n // 10 + 1}:{n + 1}",
+            "embedding": vectors[n].tolist(),
+            "content": f"synthetic chunk {n}",
+            "metadata": {
+                "page_number": n // 10 + 1,
+                "chunk_number": n + 1,
+                "source": "synthetic.pdf",
+            },
+        }
+        for n in range(size)
+    ]
+    return records, vectors
+
+
+def percentiles(samples: list[float]) -> dict:
+    ms = np.asarray(samples) * 1000
+    return {"p50": float(np.percentile(ms, 50)), "p99": float(np.percentile(ms, 99))}
+
+
+def bench(store, queries: np.ndarray, n_results: int) -> dict:
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        res = store.get(query.tolist(), n_results=n_results)
+        samples.append(time.perf_counter() - start)
+        assert res.success, res.error
+
+    start = time.perf_counter()
+    res = store.get_many(queries.tolist(), n_results=n_results)
+    batched = time.perf_counter() - start
+    assert res.success, res.error
+
+    return {**percentiles(samples), "batched_ms": batched * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-results", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    for size in args.sizes:
+        records, _ = make_records(size, args.dim)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                stores = {
+                    "numpy": NumpyVectorStore("bench"),
+                    "chroma": ChromaDB("bench"),
+                }
+                for name, store in stores.items():
+                    start = time.perf_counter()
+                    for offset in range(0, size, 5000):
+                        res = store.sync(records[offset : offset + 5000], [])
+                        assert res.success, res.error
+                    load = time.perf_counter() - start
+
+                    stats = bench(store, queries, args.n_results)
+                    print(
+                        f"{name:>6} | {size:>7} chunks | load {load:7.2f}s | "
+                        f"p50 {stats['p50']:7.3f} ms | p99 {stats['p99']:7.3f} ms | "
+                        f"{args.queries} batched {stats['batched_ms']:8.2f} ms"
+                    )
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+from lib.common.logger import Logger
+from lib.common.responses import Response
+from lib.Services.interface.EmbeddingsInterface import EmbeddingsInterface
+from lib.scheduler.RequestScheduler import RequestScheduler, is_transient
+from lib.scheduler.CircuitBreaker import CircuitOpenError
+from lib.database.EmbeddingBatch import EmbeddingBatch
+import re
+
+# Errors caused by the request's content; only these can be narrowed down
+# by splitting the batch: a 400 / INVALID_ARGUMENT, or an explicit token
+# or request size limit.
+_INPUT_ERROR = re.compile(
+    r"\b400\b|invalid.?argument|bad request|"
+    r"token (?:count|limit)|(?:maximum|max) (?:number of )?(?:input )?tokens|"
+    r"too many (?:input )?tokens|context length|"
+    r"\b413\b|payload size|request (?:size|too large|entity too large)",
+    re.IGNORECASE,
+)
+# Failures of the account, not of the input, even when they come as a 400
+# (Gemini answers a bad API key with 400 INVALID_ARGUMENT).
+_ACCOUNT_ERROR = re.compile(
+    r"\b40[13]\b|api.?key|unauthenticated|unauthori[sz]ed|permission.?denied|"
+    r"quota|billing|resource.?exhausted",
+    re.IGNORECASE,
+)
+
+
+def is_input_error(error: str) -> bool:
+    """Whether a failed request was rejected for what it sent"""
+    return bool(_INPUT_ERROR.search(error)) and not _ACCOUNT_ERROR.search(error)
+
+
+class EmbeddingBatcher:
+    """
+    Packs chunks into token-bounded embed_documents requests.
+
+    A batch rejected for its content (invalid argument, token limit) is
+    split in half and retried, so one bad chunk only costs the requests
+    needed to isolate it instead of the whole document. Transient failures
+    (429, timeouts, 5xx) are left to the scheduler's backoff; if they
+    outlast it the batch fails as a whole rather than fanning out into
+    more requests against a throttled API.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingsInterface,
+        max_batch_tokens: int = 8000,
+        max_batch_size: int = 100,
+        max_chunk_tokens: int = 3000,
+        scheduler: RequestScheduler | None = None,
+    ):
+        self.service_name = "EmbeddingBatcher"
+        self.embedding_service = embedding_service
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_chunk_tokens = max_chunk_tokens
+        self.scheduler = scheduler
+
+    # ---------------------------------------------------
+    # Build Batches
+    # ---------------------------------------------------
+    def build_batches(self, chunks: list[dict]) -> Response[dict]:
+        """
+        Group chunks into batches that respect both the token and the item
+        limit. Chunks above max_chunk_tokens are reported as rejected. A
+        chunk's token_count from split time is used when it has one.
+        """
+        try:
+            batches = []
+            rejected = []
+            current = []
+            current_tokens = 0
+
+            for chunk in chunks:
+                tokens = chunk.get("token_count")
+                if tokens is None:
+                    counted = self.embedding_service.count_tokens(chunk["content"])
+                    if not counted.success:
+                        rejected.append(chunk["id"])
+                        continue
+                    tokens = counted.data
+
+                if tokens > self.max_chunk_tokens:
+                    Logger.warning(
+                        f"Chunk {chunk['id']} too long: {tokens} tokens",
+                        self.service_name,
+                    )
+                    rejected.append(chunk["id"])
+                    continue
+
+                if current and (
+                    current_tokens + tokens > self.max_batch_tokens
+                    or len(current) >= self.max_batch_size
+                ):
+                    batches.append(current)
+                    current = []
+                    current_tokens = 0
+
+                current.append((chunk, tokens))
+                current_tokens += tokens
+
+            if current:
+                batches.append(current)
+
+            return Response.ok(
+                {"batches": batches, "rejected": rejected}, "Batches built successfully"
+            )
+
+        except Exception as e:
+            Logger.error(f"Failed to build batches: {e}", self.service_name)
+            return Response.fail(str(e), "Failed to build batches")
+
+    # ---------------------------------------------------
+    # Embed Batch
+    # ---------------------------------------------------
+    def embed_batch(self, batch: list[tuple[dict, int]]) -> dict:
+        """
+        Embed one batch. Returns {"batch": EmbeddingBatch of the embedded
+        chunks, "failed": [ids], "requests": n}.
+        """
+        texts = [chunk["content"] for chunk, _ in batch]
+        budget = sum(tokens for _, tokens in batch)
+
+        # The batch was sized from known counts; no need to encode it again.
+        if self.scheduler is None:
+            res = self.embedding_service.embed_query(
+                texts, max_tokens=budget, tokens=budget
+            )
+        else:
+            try:
+                res = self.scheduler.run(
+                    self.embedding_service.embed_query,
+                    texts,
+                    max_tokens=budget,
+                    tokens=budget,
+                    token_cost=budget,
+                )
+            except CircuitOpenError as e:
+                # Splitting cannot help while the provider is down.
+                Logger.error(f"Batch skipped: {e}", self.service_name)
+                return {
+                    "batch": EmbeddingBatch.empty(),
+                    "failed": [chunk["id"] for chunk, _ in batch],
+                    "requests": 0,
+                }
+            except Exception as e:
+                res = Response.fail(str(e), "Embedding generation failed")
+
+        if res.success:
+            # The client's per-chunk float lists are dropped here in favour
+            # of one float32 matrix.
+            return {
+                "batch": EmbeddingBatch(
+                    [chunk for chunk, _ in batch],
+                    res.data["embedding"],
+                    [tokens for _, tokens in batch],
+                ),
+                "failed": [],
+                "requests": 1,
+            }
+
+        error = res.error or res.message or ""
+        if len(batch) == 1 or is_transient(error) or not is_input_error(error):
+            Logger.error(
+                f"Embedding failed for {len(batch)} chunks "
+                f"(first {batch[0][0]['id']}): {error}",
+                self.service_name,
+            )
+            return {
+                "batch": EmbeddingBatch.empty(),
+                "failed": [chunk["id"] for chunk, _ in batch],
+                "requests": 1,
+            }
+
+        Logger.warning(
+            f"Batch of {len(batch)} chunks failed, splitting: {res.error}",
+            self.service_name,
+        )
+
+        middle = len(batch) // 2
+        left = self.embed_batch(batch[:middle])
+        right = self.embed_batch(batch[middle:])
+
+        return {
+            "batch": EmbeddingBatch.concat([left["batch"], right["batch"]]),
+            "failed": left["failed"] + right["failed"],
+            "requests": 1 + left["requests"] + right["requests"],
+        }
@@ -1,31 +1,41 @@
 from lib.common.logger import Logger
 from lib.Services.interface.EmbeddingsInterface import EmbeddingsInterface
 from lib.common.responses import Response
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from dotenv import load_dotenv
+from lib.common.metrics import Metrics
+from lib.common.env import load_env
+from lib.common.tokens import get_encoding
+from lib.cache.EmbeddingCache import EmbeddingCache
 import os
-import tiktoken
 import logging
 
-load_dotenv()
 logging.basicConfig(level=logging.INFO)
 
 
 class EmbeddingService(EmbeddingsInterface):
 
-    def __init__(self, model: str | None = None):
+    def __init__(
+        self,
+        model: str | None = None,
+        use_cache: bool = True,
+        cache_path: str = "./embedding_cache.db",
+        embeddings=None,
+    ):
+        """
+        `embeddings` replaces the Google client with any object exposing the
+        LangChain embeddings methods, e.g. FakeEmbeddings for offline runs.
+
+        The Google client and the tiktoken encoder are created on first use,
+        so constructing the service does not import either library.
+        """
         self.service_name = "EmbeddingService"
         try:
             if model is None:
                 model = "models/gemini-embedding-001"
 
             self.model = model
-
-            self.embeddings = GoogleGenerativeAIEmbeddings(
-                model=model, api_key=os.getenv("GOOGLE_API_KEY")
-            )
-
-            self.enc = tiktoken.get_encoding("cl100k_base")
+            self.cache = EmbeddingCache(cache_path) if use_cache else None
+            self._embeddings = embeddings
+            self._enc = None
 
             Logger.info(
                 f"EmbeddingService initialized with model: {model}", self.service_name
@@ -37,6 +47,23 @@ class EmbeddingService(EmbeddingsInterface):
             )
             raise e
 
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+            load_env()
+            self._embeddings = GoogleGenerativeAIEmbeddings(
+                model=self.model, api_key=os.getenv("GOOGLE_API_KEY")
+            )
+        return self._embeddings
+
+    @property
+    def enc(self):
+        if self._enc is None:
+            self._enc = get_encoding()
+        return self._enc
+
     def count_tokens(self, query: str | list) -> Response[int]:
         try:
             if isinstance(query, str):
@@ -57,13 +84,17 @@ class EmbeddingService(EmbeddingsInterface):
     # ---------------------------------------------------
     # Validate Token Limit
     # ---------------------------------------------------
-    def can_send_request(self, query, max_tokens: int = 1024) -> Response[int]:
-        token_response = self.count_tokens(query)
+    def can_send_request(
+        self, query, max_tokens: int = 1024, tokens: int | None = None
+    ) -> Response[int]:
+        """`tokens` is a count taken earlier (e.g. at split time); skips encoding"""
+        if tokens is None:
+            token_response = self.count_tokens(query)
 
-        if not token_response.success:
-            return token_response
+            if not token_response.success:
+                return token_response
 
-        tokens = token_response.data
+            tokens = token_response.data
 
         if tokens > max_tokens:
             error_msg = f"Query too long: {tokens} tokens (max: {max_tokens})"
@@ -75,9 +106,12 @@ class EmbeddingService(EmbeddingsInterface):
     # ---------------------------------------------------
     # Embed Query
     # ---------------------------------------------------
-    def embed_query(self, query: str | list, max_tokens: int = 1024) -> Response[dict]:
+    @Metrics.traced("embedding")
+    def embed_query(
+        self, query: str | list, max_tokens: int = 1024, tokens: int | None = None
+    ) -> Response[dict]:
         try:
-            validation = self.can_send_request(query, max_tokens)
+            validation = self.can_send_request(query, max_tokens, tokens)
 
             if not validation.success:
                 return validation
@@ -85,10 +119,11 @@ class EmbeddingService(EmbeddingsInterface):
             tokens = validation.data
 
             if isinstance(query, str):
-                embedding = self.embeddings.embed_query(query)
+                embedding, cached = self.__embed_cached([query], single=True)
+                embedding = embedding[0]
 
             elif isinstance(query, list):
-                embedding = self.embeddings.embed_documents(query)
+                embedding, cached = self.__embed_cached(query)
 
             else:
                 raise ValueError("Query must be string or list")
@@ -97,9 +132,103 @@ class EmbeddingService(EmbeddingsInterface):
                 "embedding": embedding,
                 "tokens_used": tokens,
                 "model": self.model,
+                "cached": cached,
             }
+            self.__record_usage(query, tokens, cached)
+
+            if cached == (1 if isinstance(query, str) else len(query)):
+                Logger.info("Embedding served from cache", self.service_name)
+            else:
+                Logger.info("Embedding generated successfully", self.service_name)
+
+            return Response.ok(result, "Embedding generated successfully")
+
+        except Exception as e:
+            Logger.error(f"Embedding failed: {e}", self.service_name)
+            return Response.fail(str(e), "Embedding generation failed")
+
+    # ---------------------------------------------------
+    # Embed Queries (batched)
+    # ---------------------------------------------------
+    @Metrics.traced("embedding", mode="queries")
+    def embed_queries(
+        self,
+        queries: list[str],
+        max_tokens: int = 1024,
+        token_counts: list[int] | None = None,
+    ) -> Response[dict]:
+        """
+        Embed many questions in one request. Unlike embed_query(list), which
+        uses the document task type, these share cache entries with single
+        embed_query calls. `max_tokens` applies to each question;
+        `token_counts` are per-question counts taken earlier.
+        """
+        try:
+            counts = token_counts
+            if counts is None:
+                counts = []
+                for query in queries:
+                    count = self.count_tokens(query)
+                    if not count.success:
+                        return count
+                    counts.append(count.data)
+
+            for count in counts:
+                if count > max_tokens:
+                    error_msg = f"Query too long: {count} tokens (max: {max_tokens})"
+                    Logger.warning(error_msg, self.service_name)
+                    return Response.fail(error_msg, "Token limit exceeded")
+
+            tokens = sum(counts)
+            embeddings, cached = self.__embed_cached(list(queries), queries=True)
+            self.__record_usage(list(queries), tokens, cached, kind="queries")
+
+            return Response.ok(
+                {
+                    "embeddings": embeddings,
+                    "tokens_used": tokens,
+                    "model": self.model,
+                    "cached": cached,
+                },
+                "Embeddings generated successfully",
+            )
+
+        except Exception as e:
+            Logger.error(f"Embedding failed: {e}", self.service_name)
+            return Response.fail(str(e), "Embedding generation failed")
+
+    # ---------------------------------------------------
+    # Embed Query (async)
+    # ---------------------------------------------------
+    @Metrics.traced("embedding", mode="async")
+    async def aembed_query(
+        self, query: str | list, max_tokens: int = 1024, tokens: int | None = None
+    ) -> Response[dict]:
+        try:
+            validation = self.can_send_request(query, max_tokens, tokens)
 
-            Logger.info("Embedding generated successfully", self.service_name)
+            if not validation.success:
+                return validation
+
+            tokens = validation.data
+
+            if isinstance(query, str):
+                embedding, cached = await self.__aembed_cached([query], single=True)
+                embedding = embedding[0]
+
+            elif isinstance(query, list):
+                embedding, cached = await self.__aembed_cached(query)
+
+            else:
+                raise ValueError("Query must be string or list")
+
+            result = {
+                "embedding": embedding,
+                "tokens_used": tokens,
+                "model": self.model,
+                "cached": cached,
+            }
+            self.__record_usage(query, tokens, cached)
 
             return Response.ok(result, "Embedding generated successfully")
 
@@ -107,6 +236,82 @@ class EmbeddingService(EmbeddingsInterface):
             Logger.error(f"Embedding failed: {e}", self.service_name)
             return Response.fail(str(e), "Embedding generation failed")
 
+    # ---------------------------------------------------
+    # Cache-aware embedding
+    # ---------------------------------------------------
+    def __embed_cached(
+        self, texts: list[str], single: bool = False, queries: bool = False
+    ):
+        """
+        Return (embeddings, cached_count). Only texts missing from the cache
+        are sent to the remote model; fresh results are written back.
+        `queries` embeds a list with the query task type in one request.
+        """
+        if self.cache is None:
+            return self.__fetch(texts, single, queries), 0
+
+        # embed_query and embed_documents use different task types, so they
+        # must not share cache entries.
+        namespace = self.model if single or queries else f"{self.model}:documents"
+        embeddings = self.cache.get_many(namespace, texts)
+        missing = [i for i, e in enumerate(embeddings) if e is None]
+
+        if missing:
+            pending = [texts[i] for i in missing]
+            fresh = self.__fetch(pending, single, queries)
+
+            self.cache.put_many(namespace, pending, fresh)
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+
+        return embeddings, len(texts) - len(missing)
+
+    def __fetch(self, texts: list[str], single: bool, queries: bool):
+        if single:
+            return [self.embeddings.embed_query(texts[0])]
+        if queries:
+            return self.embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+        return self.embeddings.embed_documents(texts)
+
+    async def __aembed_cached(self, texts: list[str], single: bool = False):
+        namespace = self.model if single else f"{self.model}:documents"
+        if self.cache is None:
+            embeddings = [None] * len(texts)
+        else:
+            embeddings = self.cache.get_many(namespace, texts)
+        missing = [i for i, e in enumerate(embeddings) if e is None]
+
+        if missing:
+            pending = [texts[i] for i in missing]
+            if single:
+                fresh = [await self.embeddings.aembed_query(pending[0])]
+            else:
+                fresh = await self.embeddings.aembed_documents(pending)
+
+            if self.cache is not None:
+                self.cache.put_many(namespace, pending, fresh)
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+
+        return embeddings, len(texts) - len(missing)
+
+    def __record_usage(
+        self, query: str | list, tokens: int, cached: int, kind: str | None = None
+    ):
+        if not Metrics.enabled:
+            return
+        texts = 1 if isinstance(query, str) else len(query)
+        kind = kind or ("query" if isinstance(query, str) else "documents")
+        Metrics.count("embedding_requests_total", kind=kind)
+        Metrics.count("embedding_tokens_total", tokens, kind=kind)
+        Metrics.count("embedding_cache_total", cached, result="hit")
+        Metrics.count("embedding_cache_total", texts - cached, result="miss")
+
+    def cache_stats(self) -> dict:
+        if self.cache is None:
+            return {"hits": 0, "misses": 0, "hit_rate": 0.0, "memory_items": 0}
+        return self.cache.stats()
+
     # ---------------------------------------------------
     # Get Model Name
     # ---------------------------------------------------
@@ -0,0 +1,200 @@
+from dataclasses import dataclass, field
+import numpy as np
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import zlib
+
+_WORD = re.compile(r"\w+")
+
+
+class FakeBackendError(Exception):
+    """Injected failure; the message mimics a provider error"""
+
+
+class FaultInjector:
+    """
+    Latency and error injection shared by the fake backends.
+
+    Each call sleeps `latency` seconds plus up to `jitter` seconds and fails
+    with probability `error_rate`. Draws come from a seeded RNG, so a run
+    with the same seed and call order fails at the same calls.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_message: str = "429 RESOURCE_EXHAUSTED: fake quota exceeded",
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_message = error_message
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self) -> tuple[float, bool]:
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            return delay, fail
+
+    def before_call(self):
+        delay, fail = self._draw()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeBackendError(self.error_message)
+
+    async def abefore_call(self):
+        delay, fail = self._draw()
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            raise FakeBackendError(self.error_message)
+
+
+class FakeEmbeddings:
+    """
+    Deterministic offline stand-in for GoogleGenerativeAIEmbeddings.
+
+    Texts are embedded by feature hashing: every word adds +-1 to one of
+    `dim` buckets and the result is L2-normalised. The same text always
+    gives the same vector and texts that share words score higher, so
+    retrieval behaves plausibly without a network or API key.
+    """
+
+    def __init__(
+        self,
+        dim: int = 768,
+        faults: FaultInjector | None = None,
+        per_text_latency: float = 0.0,
+    ):
+        self.service_name = "FakeEmbeddings"
+        self.dim = dim
+        self.faults = faults or FaultInjector()
+        # Extra delay per text, so batch size affects latency as it does
+        # for the real endpoint.
+        self.per_text_latency = per_text_latency
+
+    def _vector(self, text: str) -> list[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            h = zlib.crc32(word.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        self.faults.before_call()
+        return self._vector(text)
+
+    def embed_documents(self, texts: list[str], **kwargs) -> list[list[float]]:
+        self.faults.before_call()
+        if self.per_text_latency:
+            time.sleep(self.per_text_latency * len(texts))
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        await self.faults.abefore_call()
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: list[str], **kwargs) -> list[list[float]]:
+        await self.faults.abefore_call()
+        if self.per_text_latency:
+            await asyncio.sleep(self.per_text_latency * len(texts))
+        return [self._vector(text) for text in texts]
+
+
+@dataclass
+class FakeMessage:
+    """The parts of a LangChain AIMessage / AIMessageChunk LLMService reads"""
+
+    text: str
+    usage_metadata: dict = field(default_factory=dict)
+
+
+class FakeChatModel:
+    """
+    Offline stand-in for ChatGoogleGenerativeAI.
+
+    `invoke` answers with the first `answer_words` words of the context
+    (padded with filler for short contexts); `astream` yields the same
+    answer word by word with `token_latency` between words. A prompt with
+    image parts gets a JSON array with one made-up caption per image.
+    """
+
+    def __init__(
+        self,
+        faults: FaultInjector | None = None,
+        answer_words: int = 60,
+        token_latency: float = 0.0,
+    ):
+        self.service_name = "FakeChatModel"
+        self.faults = faults or FaultInjector()
+        self.answer_words = answer_words
+        self.token_latency = token_latency
+
+    @staticmethod
+    def _images(prompt) -> list[str]:
+        return [
+            part["image_url"]
+            for _, content in prompt
+            if isinstance(content, list)
+            for part in content
+            if part.get("type") == "image_url"
+        ]
+
+    def _answer(self, prompt) -> tuple[str, int]:
+        images = self._images(prompt)
+        if images:
+            captions = [
+                f"Page image {i + 1}: figure fake{zlib.crc32(image.encode()):08x} "
+                f"({len(image)} bytes encoded)"
+                for i, image in enumerate(images)
+            ]
+            # Gemini counts an image of up to 384x384 px as 258 input tokens.
+            return json.dumps(captions), 258 * len(images)
+
+        text = "\n".join(content for _, content in prompt)
+        context = text.split("Context:", 1)[-1]
+        words = _WORD.findall(context)[: self.answer_words]
+        words += ["answer"] * (self.answer_words - len(words))
+        return " ".join(words), len(_WORD.findall(text))
+
+    def invoke(self, prompt) -> FakeMessage:
+        self.faults.before_call()
+        answer, input_words = self._answer(prompt)
+        output_words = len(answer.split())
+        return FakeMessage(
+            answer,
+            {
+                "input_tokens": input_words,
+                "output_tokens": output_words,
+                "total_tokens": input_words + output_words,
+            },
+        )
+
+    async def astream(self, prompt):
+        await self.faults.abefore_call()
+        answer, _ = self._answer(prompt)
+        for word in answer.split():
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield FakeMessage(word + " ")
+
+    def __repr__(self) -> str:
+        return f"FakeChatModel(answer_words={self.answer_words})"
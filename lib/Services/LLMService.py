@@ -1,24 +1,37 @@
 import json
 from lib.common.responses import Response
 from lib.common.logger import Logger
-from langchain_google_genai import ChatGoogleGenerativeAI
+from lib.common.metrics import Metrics
+from lib.common.env import load_env
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from typing import AsyncIterator
+import time
 
 
 class LLMService:
-    def __init__(self):
+    def __init__(self, model=None):
+        """
+        `model` replaces the Gemini chat model, e.g. FakeChatModel. The Gemini
+        client is only imported and built when the first prompt is sent.
+        """
         self.service_name = "LLMService"
-        self.model = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0.7,
-            api_key=os.getenv("GOOGLE_API_KEY"),
-            max_tokens=4000,  # increase to handle bigger outputs
-            timeout=60,
-            max_retries=2,
-        )
+        self._model = model
+
+    @property
+    def model(self):
+        if self._model is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            load_env()
+            self._model = ChatGoogleGenerativeAI(
+                model="gemini-2.5-flash",
+                temperature=0.7,
+                api_key=os.getenv("GOOGLE_API_KEY"),
+                max_tokens=4000,  # increase to handle bigger outputs
+                timeout=60,
+                max_retries=2,
+            )
+        return self._model
 
     def __build_prompt(self, chunks: list[str], question: str):
         """
@@ -61,31 +74,161 @@ class LLMService:
             ("human", human_message),
         ]
 
-    def generate_response_for_pdf_chunks(
-        self, chunks: list[str], question: str
-    ) -> Response[list[dict]]:
+    @Metrics.traced("llm_generate")
+    def generate_answer(self, chunks: list[str], question: str) -> Response[dict]:
         """
-        Accepts a list of cleaned PDF text chunks, sends them to LLM,
-        parses the JSON, and returns a Python list of summaries.
+        Answer `question` from the context chunks. Returns the answer text
+        with the input and output token counts of the request.
         """
         try:
             prompt = self.__build_prompt(chunks, question)
             response = self.model.invoke(prompt)
 
-            print(response)
-
             answer_text = response.text.strip()
 
             # استخراج معلومات التوكنز
             usage = response.usage_metadata
-            total_tokens = usage.get("total_tokens", 0) if usage else 0
             input_tokens = usage.get("input_tokens", 0) if usage else 0
             output_tokens = usage.get("output_tokens", 0) if usage else 0
 
-            return Response.ok(answer_text, "PDF processed successfully")
+            Metrics.count("llm_requests_total", status="ok")
+            Metrics.count("llm_tokens_total", input_tokens, direction="input")
+            Metrics.count("llm_tokens_total", output_tokens, direction="output")
+            Metrics.count("llm_context_chunks_total", len(chunks))
+
+            return Response.ok(
+                {
+                    "answer": answer_text,
+                    "input_tokens": input_tokens,
+                    "output_tokens": output_tokens,
+                },
+                "PDF processed successfully",
+            )
+        except Exception as e:
+            Metrics.count("llm_requests_total", status="error")
+            Logger.error(f"Error generating response: {e}", self.service_name)
+            return Response.fail(str(e), "Failed to process PDF")
+
+    def generate_response_for_pdf_chunks(
+        self, chunks: list[str], question: str
+    ) -> Response[str]:
+        """
+        Accepts a list of cleaned PDF text chunks, sends them to LLM,
+        and returns the answer text.
+        """
+        res = self.generate_answer(chunks, question)
+        if not res.success:
+            return res
+        return Response.ok(res.data["answer"], res.message)
+
+    def __build_vision_prompt(self, images: list[str]):
+        """One multimodal message holding every page image of the batch"""
+        system_message = """
+        You are an expert assistant that reads pages of healthcare documents.
+
+        You will receive one or more rendered PDF pages as images.
+
+        For every image, in order:
+        - Transcribe any text that appears in it (OCR).
+        - Describe figures, charts and tables: what they show, their axes,
+          labels and the key values or trends.
+        - Do NOT invent information that is not visible on the page.
+
+        Return ONLY a JSON array of strings, one string per image, in the
+        same order as the images. No markdown, no extra keys.
+        """
+        content = [
+            {"type": "text", "text": f"Describe these {len(images)} page images."}
+        ]
+        content += [{"type": "image_url", "image_url": image} for image in images]
+
+        return [
+            ("system", system_message),
+            ("human", content),
+        ]
+
+    @Metrics.traced("llm_describe_pages")
+    def describe_pages(self, images: list[str]) -> Response[list[str]]:
+        """
+        Caption / OCR a batch of page images (data URIs) in one request.
+        Returns one description per image, in order.
+        """
+        try:
+            prompt = self.__build_vision_prompt(images)
+            response = self.model.invoke(prompt)
+
+            text = response.text.strip()
+            if text.startswith("```"):
+                text = text.strip("`").removeprefix("json").strip()
+            descriptions = json.loads(text)
+
+            if not isinstance(descriptions, list) or len(descriptions) != len(images):
+                raise ValueError(
+                    f"Expected {len(images)} descriptions, got {descriptions!r:.200}"
+                )
+
+            usage = response.usage_metadata or {}
+            Metrics.count("llm_requests_total", status="ok", kind="vision")
+            Metrics.count(
+                "llm_tokens_total", usage.get("input_tokens", 0), direction="input"
+            )
+            Metrics.count(
+                "llm_tokens_total", usage.get("output_tokens", 0), direction="output"
+            )
+
+            return Response.ok(
+                [str(d).strip() for d in descriptions], "Pages described successfully"
+            )
         except json.JSONDecodeError as json_err:
+            Metrics.count("llm_requests_total", status="error", kind="vision")
             Logger.error(f"JSON parsing error: {json_err}", self.service_name)
             return Response.fail(str(json_err), "Failed to parse JSON from LLM output")
         except Exception as e:
-            Logger.error(f"Error generating response: {e}", self.service_name)
-            return Response.fail(str(e), "Failed to process PDF")
+            Metrics.count("llm_requests_total", status="error", kind="vision")
+            Logger.error(f"Error describing pages: {e}", self.service_name)
+            return Response.fail(str(e), "Failed to describe pages")
+
+    async def astream_response_for_pdf_chunks(
+        self, chunks: list[str], question: str
+    ) -> AsyncIterator[str]:
+        """
+        Stream the answer text as the model produces it. Errors are logged
+        and re-raised so the caller can stop rendering.
+        """
+        started = time.perf_counter()
+        first_token = True
+        try:
+            prompt = self.__build_prompt(chunks, question)
+            async for chunk in self.model.astream(prompt):
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage:
+                    Metrics.count(
+                        "llm_tokens_total",
+                        usage.get("input_tokens", 0),
+                        direction="input",
+                    )
+                    Metrics.count(
+                        "llm_tokens_total",
+                        usage.get("output_tokens", 0),
+                        direction="output",
+                    )
+                if chunk.text:
+                    if first_token:
+                        first_token = False
+                        Metrics.observe(
+                            "stage_duration_seconds",
+                            time.perf_counter() - started,
+                            stage="llm_first_token",
+                        )
+                    yield chunk.text
+            Metrics.count("llm_requests_total", status="ok")
+        except Exception as e:
+            Metrics.count("llm_requests_total", status="error")
+            Logger.error(f"Error streaming response: {e}", self.service_name)
+            raise
+        finally:
+            Metrics.observe(
+                "stage_duration_seconds",
+                time.perf_counter() - started,
+                stage="llm_stream",
+            )
@@ -4,7 +4,9 @@ from abc import ABC, abstractmethod
 class EmbeddingsInterface(ABC):
 
     @abstractmethod
-    def embed_query(self, query: str | list):
+    def embed_query(
+        self, query: str | list, max_tokens: int = 1024, tokens: int | None = None
+    ):
         pass
 
     @abstractmethod
@@ -0,0 +1,193 @@
+from lib.cache.EmbeddingCache import EmbeddingCache
+from lib.common.metrics import Metrics
+from collections import OrderedDict
+import numpy as np
+import hashlib
+import threading
+import time
+
+
+class AnswerCache:
+    """
+    Two-tier cache for LLM answers.
+
+    exact:    sha256(normalized question + retrieved context) -> answer
+    semantic: a previous question over the *same* retrieved context whose
+              embedding has cosine similarity >= similarity_threshold
+
+    The retrieved context is identified by chunk ids and their content
+    hashes, so a re-indexed chunk never serves a stale answer. Entries expire
+    after ttl_seconds and the least recently used ones are evicted past
+    max_entries.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1000,
+    ):
+        self.service_name = "AnswerCache"
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._by_context = {}
+        self._by_chunk = {}
+        self._lock = threading.Lock()
+
+    # ---------------------------------------------------
+    # Keys
+    # ---------------------------------------------------
+    @staticmethod
+    def context_key(chunk_ids: list[str], content_hashes: list[str | None]) -> str:
+        joined = "\n".join(f"{i}:{h or ''}" for i, h in zip(chunk_ids, content_hashes))
+        return hashlib.sha256(joined.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def exact_key(question: str, context_key: str) -> str:
+        normalized = EmbeddingCache.normalize(question).lower()
+        return hashlib.sha256(
+            f"{normalized}\0{context_key}".encode("utf-8")
+        ).hexdigest()
+
+    # ---------------------------------------------------
+    # Lookup
+    # ---------------------------------------------------
+    def lookup(
+        self, question: str, question_embedding: list[float], context_key: str
+    ) -> dict | None:
+        """Return {"answer", "tier", "similarity"} or None"""
+        with self._lock:
+            self._expire()
+
+            key = self.exact_key(question, context_key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                Metrics.count("answer_cache_lookups_total", result="exact")
+                return {"answer": entry["answer"], "tier": "exact", "similarity": 1.0}
+
+            candidates = list(self._by_context.get(context_key, ()))
+            if candidates:
+                query = self._normalize(question_embedding)
+                matrix = np.stack([self._entries[k]["embedding"] for k in candidates])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+
+                if scores[best] >= self.similarity_threshold:
+                    key = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    Metrics.count("answer_cache_lookups_total", result="semantic")
+                    return {
+                        "answer": self._entries[key]["answer"],
+                        "tier": "semantic",
+                        "similarity": float(scores[best]),
+                    }
+
+            self.misses += 1
+            Metrics.count("answer_cache_lookups_total", result="miss")
+            return None
+
+    # ---------------------------------------------------
+    # Store
+    # ---------------------------------------------------
+    def store(
+        self,
+        question: str,
+        question_embedding: list[float],
+        context_key: str,
+        chunk_ids: list[str],
+        answer: str,
+    ):
+        key = self.exact_key(question, context_key)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = {
+                "answer": answer,
+                "embedding": self._normalize(question_embedding),
+                "context_key": context_key,
+                "chunk_ids": tuple(chunk_ids),
+                "created_at": time.monotonic(),
+            }
+            self._by_context.setdefault(context_key, set()).add(key)
+            for chunk_id in chunk_ids:
+                self._by_chunk.setdefault(chunk_id, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    # ---------------------------------------------------
+    # Invalidation
+    # ---------------------------------------------------
+    def invalidate_chunks(self, chunk_ids: list[str]) -> int:
+        """Drop every answer built from any of the given chunks"""
+        with self._lock:
+            keys = set()
+            for chunk_id in chunk_ids:
+                keys |= self._by_chunk.get(chunk_id, set())
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+            self._by_chunk.clear()
+
+    def _expire(self):
+        if self.ttl_seconds is None:
+            return
+        deadline = time.monotonic() - self.ttl_seconds
+        expired = [k for k, e in self._entries.items() if e["created_at"] < deadline]
+        for key in expired:
+            self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        siblings = self._by_context.get(entry["context_key"])
+        if siblings is not None:
+            siblings.discard(key)
+            if not siblings:
+                del self._by_context[entry["context_key"]]
+
+        for chunk_id in entry["chunk_ids"]:
+            keys = self._by_chunk.get(chunk_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_chunk[chunk_id]
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # ---------------------------------------------------
+    # Stats
+    # ---------------------------------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            total = hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
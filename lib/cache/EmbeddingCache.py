@@ -0,0 +1,133 @@
+from lib.common.logger import Logger
+from collections import OrderedDict
+from array import array
+import hashlib
+import sqlite3
+import threading
+import re
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache.
+
+    Entries are keyed by sha256(model + normalized text) and persisted in a
+    local SQLite file as packed float32 blobs. A bounded in-memory LRU sits
+    in front of the database so hot chunks never touch disk.
+    """
+
+    def __init__(
+        self, path: str = "./embedding_cache.db", max_memory_items: int = 4096
+    ):
+        self.service_name = "EmbeddingCache"
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, embedding BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    # ---------------------------------------------------
+    # Keys
+    # ---------------------------------------------------
+    @staticmethod
+    def normalize(text: str) -> str:
+        return _WHITESPACE.sub(" ", text).strip()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        normalized = EmbeddingCache.normalize(text)
+        return hashlib.sha256(f"{model}\0{normalized}".encode("utf-8")).hexdigest()
+
+    # ---------------------------------------------------
+    # Lookup
+    # ---------------------------------------------------
+    def get(self, model: str, text: str) -> list[float] | None:
+        return self.get_many(model, [text])[0]
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        keys = [self.make_key(model, text) for text in texts]
+        results = [None] * len(keys)
+        missing = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[i] = self._memory[key]
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            if missing:
+                placeholders = ",".join("?" * len(missing))
+                rows = self._conn.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})",
+                    list(missing),
+                ).fetchall()
+
+                for key, blob in rows:
+                    embedding = array("f", blob).tolist()
+                    self._remember(key, embedding)
+                    for i in missing[key]:
+                        results[i] = embedding
+
+            found = sum(1 for r in results if r is not None)
+            self.hits += found
+            self.misses += len(results) - found
+
+        return results
+
+    # ---------------------------------------------------
+    # Store
+    # ---------------------------------------------------
+    def put(self, model: str, text: str, embedding: list[float]):
+        self.put_many(model, [text], [embedding])
+
+    def put_many(self, model: str, texts: list[str], embeddings: list[list[float]]):
+        rows = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = self.make_key(model, text)
+                self._remember(key, list(embedding))
+                rows.append((key, model, array("f", embedding).tobytes()))
+
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, embedding) VALUES (?, ?, ?)",
+                    rows,
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                Logger.warning(f"Failed to persist embeddings: {e}", self.service_name)
+
+    def _remember(self, key: str, embedding: list[float]):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    # ---------------------------------------------------
+    # Stats
+    # ---------------------------------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_items": len(self._memory),
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,13 @@
+from functools import cache
+
+
+@cache
+def load_env() -> bool:
+    """
+    Read .env into os.environ once per process. Callers invoke this right
+    before they read configuration instead of every module loading dotenv
+    at import time.
+    """
+    from dotenv import load_dotenv
+
+    return load_dotenv()
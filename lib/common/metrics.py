@@ -0,0 +1,374 @@
+from contextvars import ContextVar
+from typing import Callable
+import asyncio
+import atexit
+import bisect
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+# Upper bounds in seconds, from a cache hit to a slow LLM answer.
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+_current_span: ContextVar["Span | None"] = ContextVar("metrics_span", default=None)
+_span_ids = itertools.count(1)
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _NoopSpan:
+    """Returned while metrics are disabled; every method does nothing"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key: str, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    Times one stage. The duration goes to the `stage_duration_seconds`
+    histogram and, when a JSONL sink is configured, to one trace line that
+    links to the enclosing span.
+    """
+
+    __slots__ = ("name", "labels", "attributes", "span_id", "parent", "start", "_reset")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self.attributes = {}
+        self.span_id = next(_span_ids)
+        self.parent = None
+        self.start = 0.0
+        self._reset = None
+
+    def set(self, key: str, value):
+        """Attach a value (token count, chunk count, ...) to the trace line"""
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self._reset = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _current_span.reset(self._reset)
+
+        labels = dict(self.labels, stage=self.name)
+        if exc_type is not None:
+            labels["status"] = "error"
+        Metrics.observe("stage_duration_seconds", duration, **labels)
+
+        if Metrics._sink is not None:
+            root = self.parent
+            while root is not None and root.parent is not None:
+                root = root.parent
+            Metrics._emit(
+                {
+                    "ts": time.time(),
+                    "span": self.name,
+                    "duration_ms": duration * 1000,
+                    "span_id": self.span_id,
+                    "parent_id": self.parent.span_id if self.parent else None,
+                    "trace_id": (root or self).span_id,
+                    "labels": self.labels,
+                    "attributes": self.attributes,
+                    "error": repr(exc) if exc is not None else None,
+                }
+            )
+        return False
+
+
+class Metrics:
+    """
+    Process-wide spans, counters and histograms.
+
+    Disabled by default: `span` then returns a shared no-op object and
+    `count`/`observe` return after one flag check, so instrumented hot paths
+    cost next to nothing. `configure` (or `configure_from_env`) enables the
+    in-memory aggregator and optionally a JSONL trace file, a Prometheus
+    text file written at exit and a /metrics HTTP endpoint.
+    """
+
+    enabled = False
+    buckets = DEFAULT_BUCKETS
+
+    _lock = threading.Lock()
+    _counters = {}
+    _histograms = {}
+    _sink = None
+    _sink_lock = threading.Lock()
+    _server = None
+    _prometheus_path = None
+    _atexit_registered = False
+
+    # ---------------------------------------------------
+    # Configuration
+    # ---------------------------------------------------
+    @staticmethod
+    def configure(
+        enabled: bool = True,
+        jsonl_path: str | None = None,
+        prometheus_path: str | None = None,
+        port: int | None = None,
+    ):
+        Metrics.enabled = enabled
+        Metrics.close()
+        Metrics._prometheus_path = None
+
+        if not enabled:
+            return
+
+        if jsonl_path:
+            os.makedirs(os.path.dirname(jsonl_path) or ".", exist_ok=True)
+            Metrics._sink = open(jsonl_path, "a", encoding="utf-8")
+        Metrics._prometheus_path = prometheus_path
+        if port:
+            Metrics.serve(port)
+
+        if not Metrics._atexit_registered:
+            atexit.register(Metrics.close)
+            Metrics._atexit_registered = True
+
+    @staticmethod
+    def configure_from_env():
+        """METRICS_ENABLED, METRICS_JSONL, METRICS_PROM_FILE, METRICS_PORT"""
+        Metrics.configure(
+            enabled=os.getenv("METRICS_ENABLED", "0").lower() in ("1", "true", "yes"),
+            jsonl_path=os.getenv("METRICS_JSONL") or None,
+            prometheus_path=os.getenv("METRICS_PROM_FILE") or None,
+            port=int(os.getenv("METRICS_PORT", 0)) or None,
+        )
+
+    @staticmethod
+    def close():
+        """Flush the JSONL sink, write the Prometheus file, stop the server"""
+        if Metrics._prometheus_path:
+            Metrics.write_prometheus(Metrics._prometheus_path)
+        with Metrics._sink_lock:
+            if Metrics._sink is not None:
+                Metrics._sink.close()
+                Metrics._sink = None
+        if Metrics._server is not None:
+            Metrics._server.shutdown()
+            Metrics._server = None
+
+    @staticmethod
+    def reset():
+        with Metrics._lock:
+            Metrics._counters = {}
+            Metrics._histograms = {}
+
+    # ---------------------------------------------------
+    # Recording
+    # ---------------------------------------------------
+    @staticmethod
+    def span(name: str, **labels):
+        if not Metrics.enabled:
+            return _NOOP_SPAN
+        return Span(name, labels)
+
+    @staticmethod
+    def count(name: str, value: float = 1, **labels):
+        if not Metrics.enabled:
+            return
+        key = _key(name, labels)
+        with Metrics._lock:
+            Metrics._counters[key] = Metrics._counters.get(key, 0) + value
+
+    @staticmethod
+    def observe(name: str, value: float, **labels):
+        if not Metrics.enabled:
+            return
+        key = _key(name, labels)
+        slot = bisect.bisect_left(Metrics.buckets, value)
+        with Metrics._lock:
+            histogram = Metrics._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts plus one overflow slot, then sum and count.
+                histogram = [[0] * (len(Metrics.buckets) + 1), 0.0, 0]
+                Metrics._histograms[key] = histogram
+            histogram[0][slot] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @staticmethod
+    def traced(name: str, **labels) -> Callable:
+        """Decorator form of `span` for whole functions"""
+
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not Metrics.enabled:
+                        return await func(*args, **kwargs)
+                    with Span(name, labels):
+                        return await func(*args, **kwargs)
+
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not Metrics.enabled:
+                    return func(*args, **kwargs)
+                with Span(name, labels):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def _emit(event: dict):
+        line = json.dumps(event, default=str) + "\n"
+        with Metrics._sink_lock:
+            if Metrics._sink is not None:
+                Metrics._sink.write(line)
+
+    # ---------------------------------------------------
+    # Export
+    # ---------------------------------------------------
+    @staticmethod
+    def snapshot() -> dict:
+        """Counters and histogram summaries keyed by name and labels"""
+        with Metrics._lock:
+            counters = dict(Metrics._counters)
+            histograms = {
+                key: (list(h[0]), h[1], h[2]) for key, h in Metrics._histograms.items()
+            }
+
+        result = {"counters": {}, "histograms": {}}
+        for (name, labels), value in counters.items():
+            result["counters"][name + _format_labels(labels)] = value
+        for (name, labels), (slots, total, count) in histograms.items():
+            result["histograms"][name + _format_labels(labels)] = {
+                "count": count,
+                "sum": total,
+                "mean": total / count if count else 0.0,
+                "p50": Metrics._quantile(slots, count, 0.5),
+                "p99": Metrics._quantile(slots, count, 0.99),
+            }
+        return result
+
+    @staticmethod
+    def _quantile(slots: list, count: int, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile"""
+        if not count:
+            return 0.0
+        target = q * count
+        seen = 0
+        for bound, n in zip(Metrics.buckets, slots):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    @staticmethod
+    def to_prometheus() -> str:
+        with Metrics._lock:
+            counters = sorted(Metrics._counters.items())
+            histograms = sorted(
+                (key, (list(h[0]), h[1], h[2]))
+                for key, h in Metrics._histograms.items()
+            )
+
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), (slots, total, count) in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, n in zip(Metrics.buckets, slots):
+                cumulative += n
+                le = _format_labels(labels, (("le", repr(bound)),))
+                lines.append(f"{name}_bucket{le} {cumulative}")
+            le = _format_labels(labels, (("le", "+Inf"),))
+            lines.append(f"{name}_bucket{le} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def write_prometheus(path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(Metrics.to_prometheus())
+        os.replace(tmp, path)
+
+    @staticmethod
+    def serve(port: int, host: str = "127.0.0.1"):
+        """Expose GET /metrics in Prometheus text format from a daemon thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = Metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        Metrics._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=Metrics._server.serve_forever, daemon=True).start()
@@ -0,0 +1,18 @@
+from functools import cache
+
+ENCODING = "cl100k_base"
+
+
+@cache
+def get_encoding():
+    """
+    The tiktoken encoder used for every token count in the app, loaded once
+    per process (each parse worker process loads its own).
+    """
+    import tiktoken
+
+    return tiktoken.get_encoding(ENCODING)
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text))
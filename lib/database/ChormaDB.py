@@ -1,40 +1,73 @@
 import chromadb
 from lib.common.responses import Response
 from lib.common.logger import Logger
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from dotenv import load_dotenv
-import os
+from lib.common.metrics import Metrics
+from lib.database.interfaces.VectorStoreInterface import VectorStoreInterface
+from lib.database.EmbeddingBatch import EmbeddingBatch
 
-load_dotenv()
 
-
-class ChromaDB:
+class ChromaDB(VectorStoreInterface):
     def __init__(self, collection_name="pdf_chunks_v2"):
 
         self.service_name = "ChromaDB"
         self.client = chromadb.PersistentClient(path="./chroma_db")
         self.collection = self.client.get_or_create_collection(collection_name)
 
-    def add(self, data: list):
+    @Metrics.traced("vector_store_write", backend="chroma")
+    def add(self, data: EmbeddingBatch | list):
         try:
-            contents = []
-            metadatas = []
-            embeddings = []
-            ids = []
-            for d in data:
-                contents.append(d["content"])
-                metadatas.append(d["metadata"])
-                embeddings.append(d["embedding"])
-                ids.append(d["id"])
-
+            batch = EmbeddingBatch.coerce(data)
+            # Chroma takes the float32 matrix as is; no per-chunk float lists.
             self.collection.add(
-                documents=contents, metadatas=metadatas, embeddings=embeddings, ids=ids
+                documents=batch.documents,
+                metadatas=batch.metadatas(),
+                embeddings=batch.embeddings,
+                ids=batch.ids,
             )
             return Response.ok(None, "data added successfully")
         except Exception as e:
             Logger.error(f"Error in adding data to ChromaDB: {e}", self.service_name)
             return Response.fail(str(e), "failed to add data")
 
+    def stored_hashes(self, source: str) -> dict:
+        existing = self.collection.get(where={"source": source}, include=["metadatas"])
+        return {
+            chunk_id: (metadata or {}).get("content_hash")
+            for chunk_id, metadata in zip(existing["ids"], existing["metadatas"])
+        }
+
+    def stored_embeddings(self, ids: list) -> dict:
+        stored = self.collection.get(ids=ids, include=["embeddings"])
+        return dict(zip(stored["ids"], stored["embeddings"]))
+
+    @Metrics.traced("vector_store_write", backend="chroma")
+    def sync(
+        self, data: EmbeddingBatch | list, removed_ids: list, batch_size: int = 5000
+    ):
+        """Upsert new/changed records and delete removed ids in bulk"""
+        try:
+            data = EmbeddingBatch.coerce(data)
+            for start in range(0, len(removed_ids), batch_size):
+                self.collection.delete(ids=removed_ids[start : start + batch_size])
+
+            for start in range(0, len(data), batch_size):
+                batch = data[start : start + batch_size]
+                self.collection.upsert(
+                    documents=batch.documents,
+                    metadatas=batch.metadatas(self.content_hash),
+                    embeddings=batch.embeddings,
+                    ids=batch.ids,
+                )
+
+            return Response.ok(
+                {"upserted": len(data), "deleted": len(removed_ids)},
+                "data synced successfully",
+            )
+        except Exception as e:
+            Logger.error(f"Error in syncing data to ChromaDB: {e}", self.service_name)
+            return Response.fail(str(e), "failed to sync data")
+
+    @Metrics.traced("vector_store_query", backend="chroma")
     def get(self, query_embedding: str, n_results: int = 5):
         try:
             results = self.collection.query(
@@ -44,3 +77,37 @@ class ChromaDB:
         except Exception as e:
             Logger.error(f"Error in getting data from ChromaDB: {e}", self.service_name)
             return Response.fail(str(e), "failed to get data")
+
+    @Metrics.traced("vector_store_query", backend="chroma")
+    def get_many(self, query_embeddings: list, n_results: int = 5):
+        try:
+            results = self.collection.query(
+                query_embeddings=list(query_embeddings), n_results=n_results
+            )
+            return Response.ok(results, "data retrieved successfully")
+        except Exception as e:
+            Logger.error(f"Error in getting data from ChromaDB: {e}", self.service_name)
+            return Response.fail(str(e), "failed to get data")
+
+    @Metrics.traced("vector_store_fetch", backend="chroma")
+    def get_by_ids(self, ids: list):
+        try:
+            stored = self.collection.get(ids=ids, include=["documents", "metadatas"])
+            found = {
+                i: (document, metadata)
+                for i, document, metadata in zip(
+                    stored["ids"], stored["documents"], stored["metadatas"]
+                )
+            }
+            ordered = [i for i in ids if i in found]
+            return Response.ok(
+                {
+                    "ids": ordered,
+                    "documents": [found[i][0] for i in ordered],
+                    "metadatas": [found[i][1] for i in ordered],
+                },
+                "data retrieved successfully",
+            )
+        except Exception as e:
+            Logger.error(f"Error in getting data from ChromaDB: {e}", self.service_name)
+            return Response.fail(str(e), "failed to get data")
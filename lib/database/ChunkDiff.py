@@ -0,0 +1,76 @@
+from lib.database.EmbeddingBatch import EmbeddingBatch
+
+
+class ChunkDiff:
+    """
+    Diff of one source's chunks against a vector store, fed a batch at a
+    time while the document is parsed.
+
+    Only the stored id -> content hash map and the ids seen so far are
+    kept, so a document never has to be held whole: once every batch has
+    gone through `update`, `removed()` lists the stored chunks the
+    document no longer has. Page-image records of the source are left
+    alone; the image stage diffs those by render hash.
+    """
+
+    def __init__(self, store, source: str):
+        self.store = store
+        self.source = source
+        self.stored = {
+            chunk_id: content_hash
+            for chunk_id, content_hash in store.stored_hashes(source).items()
+            if not store.is_image_id(chunk_id)
+        }
+        self.ids_by_hash = {}
+        for chunk_id, content_hash in self.stored.items():
+            if content_hash:
+                self.ids_by_hash.setdefault(content_hash, chunk_id)
+        self.seen = set()
+
+    def update(self, chunks: list) -> dict:
+        """
+        Returns:
+            pending:   chunks whose content is not stored anywhere -> must be embedded
+            reused:    EmbeddingBatch of chunks whose content moved to a new id;
+                       the stored embedding is reused instead of re-embedding
+            unchanged: ids whose content hash did not change
+        """
+        pending = []
+        moved = []
+        unchanged = []
+
+        for chunk in chunks:
+            chunk_id = chunk["id"]
+            content_hash = self.store.content_hash(chunk["content"])
+            self.seen.add(chunk_id)
+
+            if self.stored.get(chunk_id) == content_hash:
+                unchanged.append(chunk_id)
+            elif content_hash in self.ids_by_hash:
+                moved.append((chunk, self.ids_by_hash[content_hash]))
+            else:
+                pending.append(chunk)
+
+        reused = EmbeddingBatch.empty()
+        if moved:
+            embeddings = self.store.stored_embeddings(
+                list({old_id for _, old_id in moved})
+            )
+
+            reused_chunks = []
+            reused_embeddings = []
+            for chunk, old_id in moved:
+                if old_id not in embeddings:
+                    pending.append(chunk)
+                    continue
+                reused_chunks.append(chunk)
+                reused_embeddings.append(embeddings[old_id])
+
+            if reused_chunks:
+                reused = self.store.to_batch(reused_chunks, reused_embeddings)
+
+        return {"pending": pending, "reused": reused, "unchanged": unchanged}
+
+    def removed(self) -> list[str]:
+        """Stored ids not seen in any batch"""
+        return [chunk_id for chunk_id in self.stored if chunk_id not in self.seen]
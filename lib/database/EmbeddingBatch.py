@@ -0,0 +1,122 @@
+from lib.documents.ChunkRecord import ChunkRecord
+from array import array
+import numpy as np
+
+
+class EmbeddingBatch:
+    """
+    Chunks and their embeddings in column form.
+
+    Embeddings are one contiguous (n, dim) float32 matrix instead of a
+    Python list of floats per chunk (~8x smaller and directly usable by
+    numpy and Chroma), and token counts are a uint32 array. Slicing returns
+    views. Iterating yields the ChunkRecords, so code that only needs
+    chunk["id"] / chunk["content"] (lexical index, cache invalidation)
+    accepts a batch wherever it accepted a list of records.
+    """
+
+    __slots__ = ("chunks", "embeddings", "tokens")
+
+    def __init__(self, chunks: list, embeddings, tokens=None):
+        self.chunks = [
+            chunk if isinstance(chunk, ChunkRecord) else ChunkRecord.from_dict(chunk)
+            for chunk in chunks
+        ]
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self.embeddings.ndim != 2:
+            self.embeddings = self.embeddings.reshape(len(self.chunks), -1)
+        if len(self.embeddings) != len(self.chunks):
+            raise ValueError(
+                f"{len(self.embeddings)} embeddings for {len(self.chunks)} chunks"
+            )
+        self.tokens = array("I", tokens if tokens is not None else [0] * len(chunks))
+
+    @classmethod
+    def empty(cls, dim: int = 0) -> "EmbeddingBatch":
+        return cls([], np.zeros((0, dim), dtype=np.float32))
+
+    @classmethod
+    def from_records(cls, records: list[dict]) -> "EmbeddingBatch":
+        """Build from to_record() dicts"""
+        if not records:
+            return cls.empty()
+        return cls(
+            [
+                ChunkRecord(
+                    r["metadata"]["source"],
+                    r["metadata"]["page_number"],
+                    r["metadata"]["chunk_number"],
+                    r["content"],
+                    r["id"],
+                    token_count=r["metadata"].get("token_count"),
+                )
+                for r in records
+            ],
+            [r["embedding"] for r in records],
+            [r.get("tokens", 0) for r in records],
+        )
+
+    @classmethod
+    def coerce(cls, data) -> "EmbeddingBatch":
+        if isinstance(data, EmbeddingBatch):
+            return data
+        return cls.from_records(list(data))
+
+    @classmethod
+    def concat(cls, batches: list) -> "EmbeddingBatch":
+        batches = [b for b in (cls.coerce(b) for b in batches) if len(b)]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+
+        batch = cls.__new__(cls)
+        batch.chunks = [chunk for b in batches for chunk in b.chunks]
+        batch.embeddings = np.concatenate([b.embeddings for b in batches])
+        batch.tokens = array("I")
+        for b in batches:
+            batch.tokens.extend(b.tokens)
+        return batch
+
+    # ---------------------------------------------------
+    # Access
+    # ---------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def __getitem__(self, index: slice) -> "EmbeddingBatch":
+        if not isinstance(index, slice):
+            raise TypeError("EmbeddingBatch only supports slicing")
+        batch = EmbeddingBatch.__new__(EmbeddingBatch)
+        batch.chunks = self.chunks[index]
+        batch.embeddings = self.embeddings[index]
+        batch.tokens = self.tokens[index]
+        return batch
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1]
+
+    @property
+    def ids(self) -> list[str]:
+        return [chunk.id for chunk in self.chunks]
+
+    @property
+    def documents(self) -> list[str]:
+        return [chunk.content for chunk in self.chunks]
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens)
+
+    def metadatas(self, content_hash=None) -> list[dict]:
+        """Store metadata per chunk, with `content_hash(content)` if given"""
+        if content_hash is None:
+            return [chunk.metadata() for chunk in self.chunks]
+        return [
+            {**chunk.metadata(), "content_hash": content_hash(chunk.content)}
+            for chunk in self.chunks
+        ]
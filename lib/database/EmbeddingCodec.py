@@ -0,0 +1,268 @@
+import numpy as np
+import json
+import os
+
+QUANTIZATIONS = ("float32", "int8", "binary")
+
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Row indices and scores of the k best columns per row, best first"""
+    size = scores.shape[1]
+    k = min(k, size)
+    if k < size:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(size), (len(scores), 1))
+
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(top, order, axis=1),
+        np.take_along_axis(top_scores, order, axis=1),
+    )
+
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    # numpy < 2.0: byte-wise lookup table.
+    table = np.array([bin(n).count("1") for n in range(256)], dtype=np.uint8)
+    return table[values.view(np.uint8)]
+
+
+class EmbeddingCodec:
+    """
+    Storage format of a NumpyVectorStore collection.
+
+    dims:          keep the first `dims` components and re-normalize.
+                   Matryoshka-trained models (gemini-embedding-001 at
+                   768 / 1536) put most of the signal in the leading
+                   components.
+    quantization:  "float32" keeps full-precision rows (4 bytes / dim).
+                   "int8" stores each row as int8 codes scaled by the row's
+                   largest component (1 byte / dim + 4 bytes / row); rows
+                   are decoded to float32 in cache-sized blocks while scoring.
+                   "binary" stores sign bits (1 bit / dim) and ranks rows by
+                   Hamming distance, then re-scores the best
+                   `rerank_factor * k` candidates with float32 rows kept in a
+                   memory-mapped file, so only the candidate rows are read.
+
+    Arrays are persisted as `<name>.npy` in the collection directory and the
+    settings as `codec.json`; a collection without one is plain float32.
+    """
+
+    def __init__(
+        self,
+        dims: int | None = None,
+        quantization: str = "float32",
+        rerank_factor: int = 8,
+        block_bytes: int = 1 << 22,
+    ):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        if dims is not None and dims <= 0:
+            raise ValueError(f"dims must be positive, got {dims}")
+        self.dims = dims
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        # Rows are decoded / compared in blocks of about this many bytes, so
+        # temporaries stay in cache instead of spanning the whole collection.
+        self.block_bytes = block_bytes
+
+    @classmethod
+    def parse(cls, spec: str | None) -> "EmbeddingCodec":
+        """
+        "<quantization>[:<dims>]", e.g. "int8", "binary:1536" or "float32:768".
+        Empty means plain float32.
+        """
+        if not spec:
+            return cls()
+        quantization, _, dims = spec.strip().lower().partition(":")
+        return cls(dims=int(dims) if dims else None, quantization=quantization)
+
+    def __repr__(self) -> str:
+        return f"{self.quantization}:{self.dims or 'full'}"
+
+    def __eq__(self, other) -> bool:
+        """Same stored format; rerank_factor only affects queries"""
+        return (
+            isinstance(other, EmbeddingCodec)
+            and self.dims == other.dims
+            and self.quantization == other.quantization
+        )
+
+    # ---------------------------------------------------
+    # Persistence
+    # ---------------------------------------------------
+    def to_dict(self) -> dict:
+        return {
+            "dims": self.dims,
+            "quantization": self.quantization,
+            "rerank_factor": self.rerank_factor,
+        }
+
+    @classmethod
+    def load(cls, directory: str) -> "EmbeddingCodec | None":
+        path = os.path.join(directory, "codec.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+    def save(self, directory: str):
+        path = os.path.join(directory, "codec.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(path + ".tmp", path)
+
+    @property
+    def array_names(self) -> tuple[str, ...]:
+        if self.quantization == "int8":
+            return ("codes", "scales")
+        if self.quantization == "binary":
+            return ("codes", "embeddings")
+        return ("embeddings",)
+
+    # ---------------------------------------------------
+    # Encode
+    # ---------------------------------------------------
+    def prepare(self, vectors) -> np.ndarray:
+        """float32 rows, truncated to `dims` and L2-normalized"""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        if self.dims is not None:
+            if matrix.shape[1] < self.dims:
+                raise ValueError(
+                    f"Embedding dimension {matrix.shape[1]} is smaller than "
+                    f"the collection's {self.dims} dims"
+                )
+            matrix = matrix[:, : self.dims]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def encode(self, rows: np.ndarray) -> dict[str, np.ndarray]:
+        """Arrays for prepared float32 rows"""
+        if self.quantization == "int8":
+            scales = np.abs(rows).max(axis=1, initial=0.0)
+            scales[scales == 0] = 1.0
+            codes = np.rint(rows / scales[:, None] * 127).astype(np.int8)
+            return {"codes": codes, "scales": scales.astype(np.float32)}
+        if self.quantization == "binary":
+            return {"codes": np.packbits(rows > 0, axis=1), "embeddings": rows}
+        return {"embeddings": rows}
+
+    def empty(self, dim: int = 0) -> dict[str, np.ndarray]:
+        return self.encode(np.zeros((0, dim), dtype=np.float32))
+
+    @staticmethod
+    def take(arrays: dict, rows) -> dict[str, np.ndarray]:
+        return {name: np.asarray(array[rows]) for name, array in arrays.items()}
+
+    @staticmethod
+    def concat(parts: list[dict]) -> dict[str, np.ndarray]:
+        return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+    @staticmethod
+    def size(arrays: dict) -> int:
+        return next(iter(arrays.values())).shape[0]
+
+    def dim(self, arrays: dict) -> int:
+        if self.quantization == "int8":
+            return arrays["codes"].shape[1]
+        return arrays["embeddings"].shape[1]
+
+    def decode(self, arrays: dict, rows) -> np.ndarray:
+        """Approximate float32 rows (exact for float32 and binary)"""
+        if self.quantization == "int8":
+            codes = np.asarray(arrays["codes"][rows], dtype=np.float32)
+            scales = np.asarray(arrays["scales"][rows])
+            return codes * (scales[..., None] / 127)
+        return np.asarray(arrays["embeddings"][rows])
+
+    def nbytes(self, arrays: dict) -> dict[str, int]:
+        """
+        Bytes scanned per query ("index") and rows only read for re-ranking
+        ("rerank")
+        """
+        sizes = {name: int(array.nbytes) for name, array in arrays.items()}
+        if self.quantization == "binary":
+            return {"index": sizes["codes"], "rerank": sizes["embeddings"]}
+        return {"index": sum(sizes.values()), "rerank": 0}
+
+    # ---------------------------------------------------
+    # Search
+    # ---------------------------------------------------
+    def search(
+        self,
+        arrays: dict,
+        queries: np.ndarray,
+        k: int,
+        exclude: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Row indices (q, k) and cosine similarities of the best rows for
+        prepared queries. Rows in `exclude` score -inf, so they only come
+        back when fewer than k other rows exist.
+        """
+        if self.quantization == "binary":
+            return self._search_binary(arrays, queries, k, exclude)
+        if self.quantization == "int8":
+            scores = self._scores_int8(arrays, queries)
+        else:
+            scores = queries @ np.asarray(arrays["embeddings"]).T
+        if exclude is not None and len(exclude):
+            scores[:, exclude] = -np.inf
+        return top_k(scores, k)
+
+    def block_rows(self, row_bytes: int) -> int:
+        return max(64, self.block_bytes // max(1, row_bytes))
+
+    def _scores_int8(self, arrays: dict, queries: np.ndarray) -> np.ndarray:
+        codes, scales = arrays["codes"], arrays["scales"]
+        size = codes.shape[0]
+        block = self.block_rows(codes.shape[1] * 4)
+        scores = np.empty((len(queries), size), dtype=np.float32)
+        for start in range(0, size, block):
+            end = min(start + block, size)
+            rows = np.asarray(codes[start:end], dtype=np.float32)
+            scores[:, start:end] = (queries @ rows.T) * (scales[start:end] / 127)
+        return scores
+
+    def _search_binary(
+        self,
+        arrays: dict,
+        queries: np.ndarray,
+        k: int,
+        exclude: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        codes, embeddings = arrays["codes"], arrays["embeddings"]
+        size, width = codes.shape
+        candidates = min(size, k * max(1, self.rerank_factor))
+
+        packed = np.packbits(queries > 0, axis=1)
+        # Compare 8 bytes at a time where the row width allows it.
+        view = np.uint64 if width % 8 == 0 else np.uint8
+        block = self.block_rows(width)
+
+        rows = np.empty((len(queries), min(k, size)), dtype=np.int64)
+        scores = np.empty(rows.shape, dtype=np.float32)
+        for q, (query, query_bits) in enumerate(zip(queries, packed)):
+            query_bits = query_bits.view(view)
+            distances = np.empty(size, dtype=np.int32)
+            for start in range(0, size, block):
+                end = min(start + block, size)
+                bits = np.ascontiguousarray(codes[start:end]).view(view)
+                distances[start:end] = popcount(bits ^ query_bits).sum(axis=1)
+            if exclude is not None and len(exclude):
+                distances[exclude] = width * 8 + 1
+
+            best, _ = top_k(-distances[None, :].astype(np.float32), candidates)
+            best = np.sort(best[0])
+            exact = np.asarray(embeddings[best]) @ query
+            exact[distances[best] > width * 8] = -np.inf
+            order, top_scores = top_k(exact[None, :], k)
+            rows[q] = best[order[0]]
+            scores[q] = top_scores[0]
+        return rows, scores
@@ -0,0 +1,431 @@
+from lib.common.logger import Logger
+import numpy as np
+import base64
+import json
+import os
+import threading
+
+
+def kmeans(
+    vectors: np.ndarray, k: int, iterations: int = 20, seed: int = 0
+) -> np.ndarray:
+    """Plain Lloyd k-means on float32 rows; returns the (k, d) centroids"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = nearest(vectors, centroids)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Re-seed empty clusters from random points so no list stays unused.
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+
+    return centroids
+
+
+def nearest(vectors: np.ndarray, centroids: np.ndarray, block: int = 8192):
+    """Index of the closest centroid (L2) for every row, computed in blocks"""
+    centroid_norms = (centroids**2).sum(axis=1)
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        part = vectors[start : start + block]
+        distances = centroid_norms[None, :] - 2 * part @ centroids.T
+        out[start : start + block] = np.argmin(distances, axis=1)
+    return out
+
+
+class IVFIndex:
+    """
+    Inverted-file index with product-quantized residuals (IVF-PQ).
+
+    Vectors are assigned to the nearest of `n_lists` coarse centroids and
+    the residual is compressed to `n_subvectors` one-byte codes. A query
+    scans only the `nprobe` closest lists and scores codes with per-query
+    lookup tables (asymmetric distance), so cost grows with nprobe rather
+    than with the collection size. Scores approximate the inner product;
+    callers should re-rank the candidates with full-precision vectors.
+
+    Until `train_size` vectors have been added the index stays untrained
+    and `search` returns None so the caller can fall back to exact search.
+
+    Lists are buffers with spare capacity, so adding appends in place.
+    Removed vectors are dropped from their list right away; their labels
+    are reclaimed by renumbering once they outnumber the live ones. Once
+    saved, the index logs every add and remove to `<path>.log` and a load
+    replays the log over the last checkpoint, so `save` only has to run
+    now and then.
+    """
+
+    def __init__(
+        self,
+        n_lists: int = 256,
+        n_subvectors: int = 16,
+        nprobe: int = 8,
+        train_size: int = 10_000,
+        seed: int = 0,
+    ):
+        self.service_name = "IVFIndex"
+        self.n_lists = n_lists
+        self.n_subvectors = n_subvectors
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.seed = seed
+
+        self.centroids = None
+        self.codebooks = None
+        # Label -> id (None once removed, until the next renumbering) and
+        # label -> list.
+        self.ids = []
+        self.list_of = []
+        self.labels_by_id = {}
+        # Vectors added or removed since the last save.
+        self.logged = 0
+        self.path = None
+        # Per list: (labels buffer, codes buffer, used rows). A list's tuple
+        # is replaced as a whole, so a concurrent search sees either the old
+        # or the new contents.
+        self._lists = []
+        # Renumbering swaps ids and lists together; searches read both
+        # under this lock.
+        self._lock = threading.Lock()
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    # ---------------------------------------------------
+    # Train
+    # ---------------------------------------------------
+    def train(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        dim = vectors.shape[1]
+        if dim % self.n_subvectors:
+            raise ValueError(
+                f"Dimension {dim} is not divisible by {self.n_subvectors} subvectors"
+            )
+
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > self.train_size:
+            vectors = vectors[rng.choice(len(vectors), self.train_size, replace=False)]
+
+        self.centroids = kmeans(vectors, self.n_lists, seed=self.seed)
+        self.n_lists = len(self.centroids)
+        residuals = vectors - self.centroids[nearest(vectors, self.centroids)]
+
+        sub = dim // self.n_subvectors
+        self.codebooks = np.stack(
+            [
+                kmeans(
+                    np.ascontiguousarray(residuals[:, m * sub : (m + 1) * sub]),
+                    256,
+                    iterations=10,
+                    seed=self.seed + m,
+                )
+                for m in range(self.n_subvectors)
+            ]
+        )
+        self._lists = [self._empty_list() for _ in range(self.n_lists)]
+
+        Logger.info(
+            f"Trained IVF-PQ on {len(vectors)} vectors: {self.n_lists} lists, "
+            f"{self.n_subvectors} x 8-bit codes",
+            self.service_name,
+        )
+
+    def encode(self, residuals: np.ndarray) -> np.ndarray:
+        sub = residuals.shape[1] // self.n_subvectors
+        codes = np.empty((len(residuals), self.n_subvectors), dtype=np.uint8)
+        for m in range(self.n_subvectors):
+            codes[:, m] = nearest(
+                np.ascontiguousarray(residuals[:, m * sub : (m + 1) * sub]),
+                self.codebooks[m],
+            )
+        return codes
+
+    def _empty_list(self) -> tuple:
+        return (
+            np.zeros(0, dtype=np.int64),
+            np.zeros((0, self.n_subvectors), dtype=np.uint8),
+            0,
+        )
+
+    # ---------------------------------------------------
+    # Insert / Remove
+    # ---------------------------------------------------
+    def add(self, ids: list[str], vectors: np.ndarray):
+        """Insert (or replace) vectors incrementally; the index must be trained"""
+        if not self.trained:
+            raise ValueError("IVFIndex must be trained before adding vectors")
+        if not ids:
+            return
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        assignment = nearest(vectors, self.centroids)
+        codes = self.encode(vectors - self.centroids[assignment])
+
+        self._log(
+            {
+                "add": list(ids),
+                "lists": assignment.tolist(),
+                "codes": base64.b64encode(codes.tobytes()).decode("ascii"),
+            }
+        )
+        self._insert(ids, assignment, codes)
+
+    def _insert(self, ids: list[str], assignment: np.ndarray, codes: np.ndarray):
+        self._drop([i for i in ids if i in self.labels_by_id])
+
+        start = len(self.ids)
+        labels = np.arange(start, start + len(ids), dtype=np.int64)
+        for label, chunk_id, list_id in zip(labels, ids, assignment.tolist()):
+            self.ids.append(chunk_id)
+            self.list_of.append(list_id)
+            self.labels_by_id[chunk_id] = int(label)
+
+        order = np.argsort(assignment, kind="stable")
+        boundaries = np.searchsorted(assignment[order], np.arange(self.n_lists + 1))
+        for list_id in np.unique(assignment):
+            rows = order[boundaries[list_id] : boundaries[list_id + 1]]
+            self._append(list_id, labels[rows], codes[rows])
+
+    def _append(self, list_id: int, labels: np.ndarray, codes: np.ndarray):
+        list_labels, list_codes, size = self._lists[list_id]
+        end = size + len(labels)
+        if end > len(list_labels):
+            # Grow geometrically so appends stay amortized O(1) per vector.
+            capacity = max(end, 2 * len(list_labels), 16)
+            grown_labels = np.empty(capacity, dtype=np.int64)
+            grown_codes = np.empty((capacity, self.n_subvectors), dtype=np.uint8)
+            grown_labels[:size] = list_labels[:size]
+            grown_codes[:size] = list_codes[:size]
+            list_labels, list_codes = grown_labels, grown_codes
+
+        # Rows past `size` are not visible to searches until the swap below.
+        list_labels[size:end] = labels
+        list_codes[size:end] = codes
+        self._lists[list_id] = (list_labels, list_codes, end)
+
+    def remove(self, ids: list[str]):
+        """Drop ids from their lists"""
+        ids = [i for i in ids if i in self.labels_by_id]
+        if not ids:
+            return
+        self._log({"remove": ids})
+        self._drop(ids)
+
+    def _drop(self, ids: list[str]):
+        if not ids:
+            return
+        labels = np.array([self.labels_by_id.pop(i) for i in ids], dtype=np.int64)
+
+        # Only the lists that hold a removed label are rewritten.
+        for list_id in {self.list_of[label] for label in labels.tolist()}:
+            list_labels, list_codes, size = self._lists[list_id]
+            keep = ~np.isin(list_labels[:size], labels)
+            self._lists[list_id] = (
+                list_labels[:size][keep],
+                list_codes[:size][keep],
+                int(keep.sum()),
+            )
+        for label in labels.tolist():
+            self.ids[label] = None
+
+        if len(self.ids) > 2 * len(self.labels_by_id) + 1024:
+            self._renumber()
+
+    def _renumber(self):
+        """Give the live vectors labels 0..n-1 again"""
+        mapping = np.full(len(self.ids), -1, dtype=np.int64)
+        ids = []
+        list_of = []
+        for label, chunk_id in enumerate(self.ids):
+            if chunk_id is not None:
+                mapping[label] = len(ids)
+                ids.append(chunk_id)
+                list_of.append(self.list_of[label])
+
+        lists = [
+            (mapping[labels[:size]], codes[:size].copy(), size)
+            for labels, codes, size in self._lists
+        ]
+        with self._lock:
+            self.ids = ids
+            self._lists = lists
+        self.list_of = list_of
+        self.labels_by_id = {chunk_id: label for label, chunk_id in enumerate(ids)}
+
+    def __len__(self) -> int:
+        return len(self.labels_by_id)
+
+    # ---------------------------------------------------
+    # Search
+    # ---------------------------------------------------
+    def search(self, queries: np.ndarray, k: int, nprobe: int | None = None):
+        """
+        Approximate top-k by inner product for each query row.
+        Returns a list of (ids, scores) per query, or None if untrained.
+        An id removed while the search runs may come back as None.
+        """
+        if not self.trained:
+            return None
+
+        queries = np.asarray(queries, dtype=np.float32)
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        sub = queries.shape[1] // self.n_subvectors
+
+        coarse = queries @ self.centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        # tables[q, m, c] = <query_m, codebook_m[c]>
+        tables = np.einsum(
+            "qmd,mcd->qmc",
+            queries.reshape(len(queries), self.n_subvectors, sub),
+            self.codebooks,
+        )
+        subspaces = np.arange(self.n_subvectors)
+        with self._lock:
+            ids, all_lists = self.ids, self._lists
+
+        results = []
+        for q, lists in enumerate(probes):
+            labels = []
+            scores = []
+            for list_id in lists:
+                list_labels, codes, size = all_lists[list_id]
+                if not size:
+                    continue
+                labels.append(list_labels[:size])
+                scores.append(
+                    coarse[q, list_id] + tables[q][subspaces, codes[:size]].sum(axis=1)
+                )
+
+            if not labels:
+                results.append(([], np.zeros(0, dtype=np.float32)))
+                continue
+
+            labels = np.concatenate(labels)
+            scores = np.concatenate(scores)
+
+            top = min(k, len(labels))
+            if top < len(labels):
+                best = np.argpartition(-scores, top - 1)[:top]
+            else:
+                best = np.arange(len(labels))
+            best = best[np.argsort(-scores[best])]
+
+            results.append(([ids[n] for n in labels[best]], scores[best]))
+
+        return results
+
+    # ---------------------------------------------------
+    # Persistence
+    # ---------------------------------------------------
+    def _log(self, entry: dict):
+        if self.path is None:
+            return
+        with open(self.path + ".log", "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        self.logged += len(entry.get("add") or entry.get("remove"))
+
+    def save(self, path: str):
+        """Checkpoint the whole index and start an empty log"""
+        if not self.trained:
+            return
+
+        arrays = {"centroids": self.centroids, "codebooks": self.codebooks}
+        for n, (labels, codes, size) in enumerate(self._lists):
+            arrays[f"labels_{n}"] = labels[:size]
+            arrays[f"codes_{n}"] = codes[:size]
+
+        # np.savez appends .npz unless the name already ends with it.
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, **arrays)
+        with open(path + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "n_lists": self.n_lists,
+                    "n_subvectors": self.n_subvectors,
+                    "nprobe": self.nprobe,
+                    "train_size": self.train_size,
+                    "seed": self.seed,
+                    "ids": self.ids,
+                },
+                f,
+            )
+
+        # The log is emptied last: a crash in between replays entries that
+        # the checkpoint already holds, which add and remove tolerate.
+        os.replace(tmp, path)
+        os.replace(path + ".json.tmp", path + ".json")
+        open(path + ".log", "w").close()
+        self.path = path
+        self.logged = 0
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        index = cls(
+            n_lists=meta["n_lists"],
+            n_subvectors=meta["n_subvectors"],
+            nprobe=meta["nprobe"],
+            train_size=meta["train_size"],
+            seed=meta["seed"],
+        )
+        # Indexes saved before removals were dropped list tombstones.
+        deleted = set(meta.get("deleted", ()))
+        index.ids = [
+            None if label in deleted else chunk_id
+            for label, chunk_id in enumerate(meta["ids"])
+        ]
+        with np.load(path) as arrays:
+            index.centroids = arrays["centroids"]
+            index.codebooks = arrays["codebooks"]
+            for n in range(meta["n_lists"]):
+                labels, codes = arrays[f"labels_{n}"], arrays[f"codes_{n}"]
+                if deleted:
+                    keep = ~np.isin(labels, np.fromiter(deleted, dtype=np.int64))
+                    labels, codes = labels[keep], codes[keep]
+                index._lists.append((labels, codes, len(labels)))
+
+        index.labels_by_id = {
+            chunk_id: label
+            for label, chunk_id in enumerate(index.ids)
+            if chunk_id is not None
+        }
+        index.list_of = [0] * len(index.ids)
+        for list_id, (labels, _, _) in enumerate(index._lists):
+            for label in labels.tolist():
+                index.list_of[label] = list_id
+        index._replay(path + ".log")
+        index.path = path
+        return index
+
+    def _replay(self, log_path: str):
+        if not os.path.exists(log_path):
+            return
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if "remove" in entry:
+                    self._drop([i for i in entry["remove"] if i in self.labels_by_id])
+                else:
+                    codes = np.frombuffer(
+                        base64.b64decode(entry["codes"]), dtype=np.uint8
+                    ).reshape(len(entry["add"]), self.n_subvectors)
+                    self._insert(
+                        entry["add"], np.array(entry["lists"], dtype=np.int64), codes
+                    )
+                self.logged += len(entry.get("add") or entry.get("remove"))
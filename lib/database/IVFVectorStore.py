@@ -0,0 +1,200 @@
+from lib.common.responses import Response
+from lib.common.logger import Logger
+from lib.common.metrics import Metrics
+from lib.database.NumpyVectorStore import NumpyVectorStore
+from lib.database.IVFIndex import IVFIndex
+from lib.database.EmbeddingBatch import EmbeddingBatch
+import numpy as np
+import os
+
+
+class IVFVectorStore(NumpyVectorStore):
+    """
+    NumpyVectorStore with an IVF-PQ index for approximate top-k.
+
+    The index is trained from the stored embeddings once the collection
+    reaches `min_train_size` chunks and updated incrementally on every sync,
+    before the store itself; opening the store adds chunks the index
+    missed and drops ids the store no longer has.
+    Syncs only append to the index's log; the index itself is saved next to
+    the embeddings by `checkpoint()`, and by sync once the log holds half as
+    many vectors as the index. Queries fetch `rerank_factor * k` candidates from
+    the index and re-rank them with the full-precision rows, so `nprobe`
+    trades recall for latency. `n_lists` only applies when the index is
+    (re)trained.
+    """
+
+    def __init__(
+        self,
+        collection_name="pdf_chunks_v2",
+        path: str = "./numpy_store",
+        n_lists: int = 256,
+        n_subvectors: int = 16,
+        nprobe: int = 8,
+        rerank_factor: int = 4,
+        min_train_size: int = 10_000,
+    ):
+        self.n_lists = n_lists
+        self.n_subvectors = n_subvectors
+        self.nprobe = nprobe
+        self.rerank_factor = rerank_factor
+        self.min_train_size = min_train_size
+
+        super().__init__(collection_name, path)
+        self.service_name = "IVFVectorStore"
+        if self.codec.quantization != "float32":
+            raise ValueError(
+                f"IVFVectorStore needs float32 rows, {self.directory} "
+                f"is stored as {self.codec}"
+            )
+        self.index_path = os.path.join(self.directory, "ivf.npz")
+
+        if os.path.exists(self.index_path):
+            self.index = IVFIndex.load(self.index_path)
+            self.index.nprobe = nprobe
+            self._reconcile()
+        else:
+            self.index = self._new_index()
+            self._maybe_train()
+
+    def _new_index(self) -> IVFIndex:
+        return IVFIndex(
+            n_lists=self.n_lists,
+            n_subvectors=self.n_subvectors,
+            nprobe=self.nprobe,
+            train_size=max(self.min_train_size, self.n_lists * 40),
+        )
+
+    def _maybe_train(self):
+        arrays, records, positions, _ = self._state
+        matrix = arrays["embeddings"]
+        if self.index.trained or len(positions) < self.min_train_size:
+            return
+
+        live = np.array(sorted(positions.values()), dtype=np.int64)
+        self.index.train(matrix[live])
+        for start in range(0, len(live), 50_000):
+            rows = live[start : start + 50_000]
+            self.index.add([records["ids"][n] for n in rows], np.asarray(matrix[rows]))
+        self.index.save(self.index_path)
+
+    def _reconcile(self):
+        """
+        Bring a loaded index in line with the store: add stored chunks it
+        is missing and drop ids the store no longer holds, e.g. after a
+        crash between the index log and the store write.
+        """
+        arrays, records, positions, _ = self._state
+        indexed = self.index.labels_by_id
+        stale = [i for i in indexed if i not in positions]
+        missing = [i for i in positions if i not in indexed]
+        if not stale and not missing:
+            return
+
+        self.index.remove(stale)
+        matrix = arrays["embeddings"]
+        for start in range(0, len(missing), 50_000):
+            ids = missing[start : start + 50_000]
+            rows = np.array([positions[i] for i in ids], dtype=np.int64)
+            self.index.add(ids, np.asarray(matrix[rows]))
+        Logger.warning(
+            f"IVF index was out of sync with the store: added {len(missing)}, "
+            f"dropped {len(stale)}",
+            self.service_name,
+        )
+
+    def rebuild_index(self):
+        """Retrain the coarse centroids and codebooks from the current data"""
+        with self._lock:
+            self.index = self._new_index()
+            self._maybe_train()
+
+    # ---------------------------------------------------
+    # Write
+    # ---------------------------------------------------
+    @Metrics.traced("vector_store_write", backend="ivf")
+    def sync(self, data: EmbeddingBatch | list, removed_ids: list):
+        try:
+            data = EmbeddingBatch.coerce(data)
+            with self._lock:
+                # The index is updated first. If the store write then fails,
+                # the index holds vectors the store does not, which searches
+                # skip and the next open drops. The other way round, a failed
+                # index update would leave chunks that diff reports unchanged
+                # but that no search can find.
+                if self.index.trained:
+                    self.index.remove(removed_ids)
+                    if len(data):
+                        self.index.add(data.ids, self.codec.prepare(data.embeddings))
+
+                synced = self._sync(data, removed_ids)
+
+                if self.index.trained:
+                    # Checkpoints at doubling sizes keep saving amortized
+                    # O(1) per vector and the log under half the index.
+                    if 2 * self.index.logged >= len(self.index):
+                        self.index.save(self.index_path)
+                else:
+                    self._maybe_train()
+
+            return Response.ok(synced, "data synced successfully")
+        except Exception as e:
+            Logger.error(
+                f"Error in syncing data to IVFVectorStore: {e}", self.service_name
+            )
+            return Response.fail(str(e), "failed to sync data")
+
+    def checkpoint(self):
+        """Save the index and empty its log"""
+        try:
+            with self._lock:
+                if self.index.trained and self.index.logged:
+                    self.index.save(self.index_path)
+            return Response.ok(None, "index checkpointed successfully")
+        except Exception as e:
+            Logger.error(f"Error in saving IVF index: {e}", self.service_name)
+            return Response.fail(str(e), "failed to checkpoint index")
+
+    # ---------------------------------------------------
+    # Read
+    # ---------------------------------------------------
+    @Metrics.traced("vector_store_query", backend="ivf")
+    def get_many(self, query_embeddings: list, n_results: int = 5, nprobe=None):
+        if not self.index.trained:
+            return super().get_many(query_embeddings, n_results)
+
+        try:
+            arrays, records, positions, _ = self._state
+            matrix = arrays["embeddings"]
+            queries = self.codec.prepare(query_embeddings)
+            candidates = self.index.search(
+                queries, n_results * self.rerank_factor, nprobe
+            )
+
+            results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+            for query, (ids, _) in zip(queries, candidates):
+                rows = np.array(
+                    [positions[i] for i in ids if i in positions], dtype=np.int64
+                )
+                rows.sort()
+                scores = np.asarray(matrix[rows]) @ query
+                best = np.argsort(-scores)[:n_results]
+
+                results["ids"].append([records["ids"][n] for n in rows[best]])
+                results["documents"].append(
+                    [records["documents"][n] for n in rows[best]]
+                )
+                results["metadatas"].append(
+                    [records["metadatas"][n] for n in rows[best]]
+                )
+                results["distances"].append([float(1.0 - s) for s in scores[best]])
+
+            return Response.ok(results, "data retrieved successfully")
+        except Exception as e:
+            Logger.error(
+                f"Error in getting data from IVFVectorStore: {e}", self.service_name
+            )
+            return Response.fail(str(e), "failed to get data")
+
+    def get(self, query_embedding, n_results: int = 5, nprobe=None):
+        return self.get_many([query_embedding], n_results, nprobe)
@@ -0,0 +1,812 @@
+from lib.common.responses import Response
+from lib.common.logger import Logger
+from lib.common.metrics import Metrics
+from collections import Counter
+from array import array
+import numpy as np
+import json
+import math
+import os
+import re
+import threading
+
+_TOKEN = re.compile(r"\w+")
+
+# Postings per packed block.
+BLOCK = 128
+_WIDTHS = ((1, np.uint8), (2, np.uint16), (4, np.uint32))
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class PackedRows:
+    """
+    Rows of `size` unsigned ints, each stored in the narrowest of 1, 2 or
+    4 bytes that holds the row's largest value. Rows of one width share a
+    buffer; `slot` is a row's position in it.
+    """
+
+    __slots__ = ("size", "buffers", "width", "slot")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.buffers = {}
+        self.width = array("B")
+        self.slot = array("I")
+
+    @staticmethod
+    def width_of(peak: int) -> int:
+        return 1 if peak < 256 else 2 if peak < 65536 else 4
+
+    def append(self, row: np.ndarray):
+        width = self.width_of(int(row.max()))
+        buffer = self.buffers.get(width)
+        if buffer is None:
+            buffer = self.buffers[width] = bytearray()
+        self.width.append(width)
+        self.slot.append(len(buffer) // (width * self.size))
+        buffer += row.astype(_WIDTHS[width // 2][1]).tobytes()
+
+    def extend(self, rows: np.ndarray):
+        peaks = rows.max(axis=1)
+        widths = np.where(peaks < 256, 1, np.where(peaks < 65536, 2, 4))
+        slots = np.empty(len(rows), dtype=np.uint32)
+        for width, dtype in _WIDTHS:
+            mask = widths == width
+            count = int(np.count_nonzero(mask))
+            if not count:
+                continue
+            buffer = self.buffers.setdefault(width, bytearray())
+            start = len(buffer) // (width * self.size)
+            slots[mask] = np.arange(start, start + count)
+            buffer += rows[mask].astype(dtype).tobytes()
+        self.width.frombytes(widths.astype(np.uint8).tobytes())
+        self.slot.frombytes(slots.tobytes())
+
+    def take(self, rows, out: np.ndarray):
+        """Copy `rows` (indices or a slice) into `out`, shape (n, size)"""
+        widths = np.frombuffer(self.width, dtype=np.uint8)[rows]
+        slots = np.frombuffer(self.slot, dtype=np.uint32)[rows].astype(np.intp)
+        for width, dtype in _WIDTHS:
+            buffer = self.buffers.get(width)
+            if buffer is None:
+                continue
+            packed = np.frombuffer(buffer, dtype=dtype).reshape(-1, self.size)
+            mask = widths == width
+            if mask.all():
+                # The usual case for a whole list: one width throughout.
+                out[...] = np.take(packed, slots, axis=0)
+                return
+            if mask.any():
+                out[mask] = packed[slots[mask]]
+
+
+class PostingBlocks:
+    """
+    Full blocks of a posting list. Document numbers are stored as the
+    block's first number plus BLOCK - 1 gaps, term frequencies as they
+    are; both packed to the narrowest width per block. Skip entries per
+    block: first and last document number (to find the block of a
+    document without decoding) and the largest tf and shortest document
+    (for the block's score bound).
+    """
+
+    __slots__ = ("first", "last", "max_tf", "min_length", "gaps", "tfs")
+
+    def __init__(self):
+        self.first = array("I")
+        self.last = array("I")
+        self.max_tf = array("H")
+        self.min_length = array("I")
+        self.gaps = PackedRows(BLOCK - 1)
+        self.tfs = PackedRows(BLOCK)
+
+    def __len__(self) -> int:
+        return len(self.first)
+
+    def decode(self, blocks, docs: np.ndarray, tfs: np.ndarray):
+        """
+        Document numbers and tfs of `blocks` (indices or a slice) into
+        `docs` and `tfs`, shape (n, BLOCK)
+        """
+        docs[:, 0] = np.frombuffer(self.first, dtype=np.uint32)[blocks]
+        self.gaps.take(blocks, docs[:, 1:])
+        np.cumsum(docs, axis=1, out=docs)
+        self.tfs.take(blocks, tfs)
+
+
+class Postings:
+    """
+    Posting list of one term: packed full blocks plus a tail of up to
+    BLOCK - 1 raw postings that new documents are appended to.
+    """
+
+    __slots__ = ("docs", "tfs", "blocks")
+
+    def __init__(self):
+        self.docs = array("I")
+        self.tfs = array("H")
+        self.blocks = None
+
+    def __len__(self) -> int:
+        return (len(self.blocks) * BLOCK if self.blocks else 0) + len(self.docs)
+
+    @property
+    def n_blocks(self) -> int:
+        return len(self.blocks) if self.blocks else 0
+
+    def seal(self, lengths: array):
+        """Pack the full tail into a block"""
+        docs = np.frombuffer(self.docs, dtype=np.uint32)
+        tfs = np.frombuffer(self.tfs, dtype=np.uint16)
+        if self.blocks is None:
+            self.blocks = PostingBlocks()
+        blocks = self.blocks
+        blocks.first.append(self.docs[0])
+        blocks.last.append(self.docs[-1])
+        blocks.max_tf.append(int(tfs.max()))
+        blocks.min_length.append(
+            int(np.frombuffer(lengths, dtype=np.uint32)[docs].min())
+        )
+        blocks.gaps.append(np.diff(docs))
+        blocks.tfs.append(tfs)
+        self.docs = array("I")
+        self.tfs = array("H")
+
+    @classmethod
+    def from_arrays(
+        cls, docs: np.ndarray, tfs: np.ndarray, lengths: np.ndarray
+    ) -> "Postings":
+        """Pack sorted document numbers and their tfs"""
+        posting = cls()
+        n_blocks = len(docs) // BLOCK
+        cut = n_blocks * BLOCK
+        if n_blocks:
+            full_docs = docs[:cut].reshape(n_blocks, BLOCK)
+            full_tfs = tfs[:cut].reshape(n_blocks, BLOCK)
+            blocks = posting.blocks = PostingBlocks()
+            blocks.first = array("I", full_docs[:, 0].astype(np.uint32).tobytes())
+            blocks.last = array("I", full_docs[:, -1].astype(np.uint32).tobytes())
+            blocks.max_tf = array("H", full_tfs.max(axis=1).astype(np.uint16).tobytes())
+            blocks.min_length = array(
+                "I", lengths[full_docs].min(axis=1).astype(np.uint32).tobytes()
+            )
+            blocks.gaps.extend(np.diff(full_docs, axis=1))
+            blocks.tfs.extend(full_tfs)
+        posting.docs = array("I", docs[cut:].astype(np.uint32).tobytes())
+        posting.tfs = array("H", tfs[cut:].astype(np.uint16).tobytes())
+        return posting
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """All document numbers and tfs, decoded"""
+        return self._decode(slice(None), self.n_blocks)
+
+    def _decode(self, blocks, n_blocks: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Postings of `n_blocks` blocks followed by the tail. Document numbers
+        come out as intp, which numpy indexes with without converting.
+        """
+        cut = n_blocks * BLOCK
+        docs = np.empty(cut + len(self.docs), dtype=np.intp)
+        tfs = np.empty(len(docs), dtype=np.uint16)
+        docs[cut:] = np.frombuffer(self.docs, dtype=np.uint32)
+        tfs[cut:] = np.frombuffer(self.tfs, dtype=np.uint16)
+        if n_blocks:
+            self.blocks.decode(
+                blocks, docs[:cut].reshape(-1, BLOCK), tfs[:cut].reshape(-1, BLOCK)
+            )
+        return docs, tfs
+
+    def locate(self, candidates: np.ndarray) -> np.ndarray:
+        """
+        Block of each candidate: its sealed block, n_blocks for the tail or
+        -1 when no block's range holds it
+        """
+        where = np.full(len(candidates), -1, dtype=np.int64)
+        n_blocks = self.n_blocks
+        if n_blocks:
+            first = np.frombuffer(self.blocks.first, dtype=np.uint32)
+            last = np.frombuffer(self.blocks.last, dtype=np.uint32)
+            found = np.searchsorted(last, candidates)
+            inside = found < n_blocks
+            inside[inside] = first[found[inside]] <= candidates[inside]
+            where[inside] = found[inside]
+        if len(self.docs):
+            where[candidates >= self.docs[0]] = n_blocks
+        return where
+
+    def fetch(
+        self, candidates: np.ndarray, where: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """The postings of `candidates`, located with `locate`"""
+        blocks = np.unique(where[where < self.n_blocks])
+        # Blocks precede the tail, so the decoded postings stay sorted.
+        docs, tfs = self._decode(blocks, len(blocks))
+        if not len(docs):
+            return docs, tfs
+        found = np.searchsorted(docs, candidates)
+        found[found == len(docs)] = 0
+        hit = docs[found] == candidates
+        return candidates[hit], tfs[found[hit]]
+
+
+class BM25Index:
+    """
+    Incremental BM25 inverted index.
+
+    Each term owns a Postings list. New chunks get increasing document
+    numbers, so a posting is appended to the list's raw tail and every
+    list stays sorted. Every BLOCK postings the tail is packed into a
+    block: the gaps between document numbers and the tfs, each in the
+    narrowest of 1, 2 or 4 bytes (gaps of common terms fit in one byte),
+    with skip entries for the block's document range and score bound.
+
+    Removed or replaced chunks are tombstoned: they are left out of N, df
+    and the average length, and skipped while scoring. Once they reach
+    `compact_ratio` of the documents, sync drops them for good.
+
+    Queries are scored term at a time with MaxScore pruning. Terms go
+    from the highest score bound (rare terms) to the lowest; a term's bound
+    is the largest of its blocks' bounds. Once the k-th best score reaches
+    the bounds of all terms left, no unseen document can make the top k,
+    so the remaining (long, common) lists are only probed for candidates
+    that can still get there, and only blocks whose bound can lift a
+    candidate to the k-th score are decoded. Scores accumulate in an
+    array kept between queries and reset only where a query wrote, so a
+    query costs the postings it reads, not the size of the index.
+
+    `sync` appends its changes to `log.jsonl`; the postings themselves are
+    written by `checkpoint()`, and by sync once the log holds half as many
+    documents as the index. Loading replays the log over the checkpoint.
+    """
+
+    def __init__(
+        self,
+        path: str = "./bm25_index",
+        k1: float = 1.2,
+        b: float = 0.75,
+        compact_ratio: float = 0.2,
+    ):
+        self.service_name = "BM25Index"
+        self.path = path
+        self.log_path = os.path.join(path, "log.jsonl")
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+
+        self.chunk_ids = []
+        self.doc_lengths = array("I")
+        # 1 for tombstoned document numbers.
+        self.dead = array("B")
+        self.docs_by_id = {}
+        self.deleted = set()
+        self.total_length = 0
+        # term -> Postings
+        self.postings = {}
+        # Live df of terms whose posting lists hold tombstones.
+        self._live_df = {}
+        # Score accumulator and candidate marks shared by queries (under
+        # the lock); all zero between queries.
+        self._scores = np.zeros(0, dtype=np.float32)
+        self._marks = np.zeros(0, dtype=bool)
+        # Documents added or removed since the last checkpoint.
+        self.logged = 0
+
+        self._lock = threading.Lock()
+
+        if os.path.exists(os.path.join(path, "index.json")):
+            self.load()
+        elif os.path.exists(self.log_path):
+            with self._lock:
+                self._replay()
+
+    @property
+    def live_docs(self) -> int:
+        return len(self.chunk_ids) - len(self.deleted)
+
+    # ---------------------------------------------------
+    # Write
+    # ---------------------------------------------------
+    def add(self, chunks: list[dict]):
+        """Index chunks with "id" and "content"; re-adding an id replaces it"""
+        with self._lock:
+            for chunk in chunks:
+                self._add(chunk["id"], Counter(tokenize(chunk["content"])))
+
+    def _add(self, chunk_id: str, terms: dict):
+        self._remove(chunk_id)
+
+        doc = len(self.chunk_ids)
+        length = sum(terms.values())
+
+        self.chunk_ids.append(chunk_id)
+        self.doc_lengths.append(length)
+        self.dead.append(0)
+        self.docs_by_id[chunk_id] = doc
+        self.total_length += length
+
+        postings = self.postings
+        live_df = self._live_df
+        for term, tf in terms.items():
+            if tf > 65535:
+                tf = 65535
+            posting = postings.get(term)
+            if posting is None:
+                posting = postings[term] = Postings()
+            docs = posting.docs
+            docs.append(doc)
+            posting.tfs.append(tf)
+            if len(docs) == BLOCK:
+                posting.seal(self.doc_lengths)
+            if live_df and term in live_df:
+                live_df[term] += 1
+
+    def remove(self, chunk_ids: list[str]):
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._remove(chunk_id)
+
+    def _remove(self, chunk_id: str):
+        doc = self.docs_by_id.pop(chunk_id, None)
+        if doc is not None:
+            self.deleted.add(doc)
+            self.dead[doc] = 1
+            self.total_length -= self.doc_lengths[doc]
+            # The removed document's terms are not known here.
+            self._live_df.clear()
+
+    @Metrics.traced("lexical_sync")
+    def sync(self, records: list[dict], removed_ids: list[str]) -> Response[None]:
+        try:
+            added = [
+                (chunk["id"], Counter(tokenize(chunk["content"]))) for chunk in records
+            ]
+            with self._lock:
+                removed = [i for i in removed_ids if i in self.docs_by_id]
+                for chunk_id in removed:
+                    self._remove(chunk_id)
+                for chunk_id, terms in added:
+                    self._add(chunk_id, terms)
+
+                if removed or added:
+                    os.makedirs(self.path, exist_ok=True)
+                    with open(self.log_path, "a", encoding="utf-8") as f:
+                        entry = {"remove": removed, "add": added}
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    self.logged += len(removed) + len(added)
+
+                if len(self.deleted) > self.compact_ratio * len(self.chunk_ids):
+                    self._compact()
+                    self._save()
+                elif 2 * self.logged >= self.live_docs:
+                    # Checkpoints at doubling sizes keep saving amortized
+                    # O(1) per document.
+                    self._save()
+
+            return Response.ok(None, "lexical index synced successfully")
+        except Exception as e:
+            Logger.error(f"Error in syncing lexical index: {e}", self.service_name)
+            return Response.fail(str(e), "failed to sync lexical index")
+
+    def compact(self):
+        """Rebuild posting lists without tombstoned documents"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        if not self.deleted:
+            return
+        remap = np.full(len(self.chunk_ids), -1, dtype=np.int64)
+        alive = np.flatnonzero(np.frombuffer(self.dead, dtype=np.uint8) == 0)
+        remap[alive] = np.arange(len(alive))
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)[alive]
+
+        postings = {}
+        for term, posting in self.postings.items():
+            docs, tfs = posting.arrays()
+            new_docs = remap[docs]
+            keep = new_docs >= 0
+            if not keep.any():
+                continue
+            postings[term] = Postings.from_arrays(new_docs[keep], tfs[keep], lengths)
+
+        self.chunk_ids = [self.chunk_ids[d] for d in alive]
+        self.doc_lengths = array("I", lengths.tobytes())
+        self.dead = array("B", bytes(len(alive)))
+        self.docs_by_id = {i: n for n, i in enumerate(self.chunk_ids)}
+        self.deleted = set()
+        self.postings = postings
+        self._live_df.clear()
+
+    # ---------------------------------------------------
+    # Search
+    # ---------------------------------------------------
+    def _df(self, term: str, posting: Postings, dead: np.ndarray | None) -> int:
+        """Number of live documents in a posting list"""
+        if dead is None:
+            return len(posting)
+        df = self._live_df.get(term)
+        if df is None:
+            docs, _ = posting.arrays()
+            df = len(docs) - int(np.count_nonzero(dead[docs]))
+            self._live_df[term] = df
+        return df
+
+    def _dead(self) -> np.ndarray | None:
+        if not self.deleted:
+            return None
+        return np.frombuffer(self.dead, dtype=np.uint8).view(bool)
+
+    def _tf_part(self, tfs: np.ndarray, lengths: np.ndarray, avg_length: float):
+        """tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average length))"""
+        k1, b = self.k1, self.b
+        tfs = tfs.astype(np.float32)
+        # In place: this runs over every posting a query reads.
+        norms = lengths.astype(np.float32)
+        norms *= np.float32(k1 * b / avg_length)
+        norms += np.float32(k1 * (1 - b))
+        norms += tfs
+        tfs *= np.float32(k1 + 1)
+        tfs /= norms
+        return tfs
+
+    def _bounds(
+        self, posting: Postings, lengths: np.ndarray, avg_length: float
+    ) -> np.ndarray:
+        """
+        Upper bound of the tf part per block, from its largest tf and its
+        shortest document, and the exact maximum over the tail last
+        """
+        bounds = np.zeros(posting.n_blocks + 1, dtype=np.float32)
+        blocks = posting.blocks
+        if blocks:
+            bounds[:-1] = self._tf_part(
+                np.frombuffer(blocks.max_tf, dtype=np.uint16),
+                np.frombuffer(blocks.min_length, dtype=np.uint32),
+                avg_length,
+            )
+        if len(posting.docs):
+            docs = np.frombuffer(posting.docs, dtype=np.uint32)
+            tfs = np.frombuffer(posting.tfs, dtype=np.uint16)
+            bounds[-1] = self._tf_part(tfs, lengths[docs], avg_length).max()
+        return bounds
+
+    def _accumulator(self) -> np.ndarray:
+        size = len(self.chunk_ids)
+        if len(self._scores) < size:
+            # Grown geometrically, so allocating them is amortized O(1).
+            size = max(size, 2 * len(self._scores))
+            self._scores = np.zeros(size, dtype=np.float32)
+            self._marks = np.zeros(size, dtype=bool)
+        return self._scores
+
+    @Metrics.traced("lexical_search")
+    def search(
+        self, query: str, k: int = 10, exhaustive: bool = False
+    ) -> list[tuple[str, float]]:
+        """
+        Top-k (chunk_id, bm25 score) pairs, best first. `exhaustive` scores
+        every posting instead of pruning; the results are the same.
+        """
+        with self._lock:
+            live = self.live_docs
+            if not live or k <= 0:
+                return []
+
+            lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+            avg_length = self.total_length / live
+            dead = self._dead()
+
+            terms = []
+            for term in set(tokenize(query)):
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+                df = self._df(term, posting, dead)
+                if not df:
+                    continue
+                idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+                bounds = idf * self._bounds(posting, lengths, avg_length)
+                terms.append((float(bounds.max()), idf, posting, bounds))
+
+            if not terms:
+                return []
+
+            terms.sort(key=lambda t: -t[0])
+            scores = self._accumulator()
+            # Documents each term scored first; together, every document
+            # with a non-zero score.
+            touched = []
+            try:
+                best = self._max_score(
+                    terms, scores, touched, lengths, avg_length, dead, k, exhaustive
+                )
+                return [(self.chunk_ids[d], float(scores[d])) for d in best]
+            finally:
+                for docs in touched:
+                    scores[docs] = 0
+
+    def _max_score(
+        self,
+        terms: list[tuple],
+        scores: np.ndarray,
+        touched: list[np.ndarray],
+        lengths: np.ndarray,
+        avg_length: float,
+        dead: np.ndarray | None,
+        k: int,
+        exhaustive: bool,
+    ) -> np.ndarray:
+        marks = self._marks
+        remaining = sum(t[0] for t in terms)
+        scored = 0.0
+        candidates = None
+        threshold = 0.0
+
+        for n, (bound, idf, posting, bounds) in enumerate(terms):
+            remaining -= bound
+            if candidates is None:
+                docs, tfs = posting.arrays()
+                if dead is not None:
+                    alive = ~dead[docs]
+                    docs, tfs = docs[alive], tfs[alive]
+                touched.append(docs if n == 0 else docs[scores[docs] == 0])
+            else:
+                # Only candidates that can still reach the k-th score, and
+                # only those whose block of this list can lift them there.
+                reach = scores[candidates] + (bound + remaining) >= threshold
+                candidates = candidates[reach]
+                if len(candidates) * 16 > len(posting):
+                    # Many candidates: one pass over the list is cheaper.
+                    docs, tfs = posting.arrays()
+                    marks[candidates] = True
+                    keep = marks[docs]
+                    marks[candidates] = False
+                    docs, tfs = docs[keep], tfs[keep]
+                else:
+                    where = posting.locate(candidates)
+                    inside = where >= 0
+                    inside[inside] = (
+                        scores[candidates[inside]] + bounds[where[inside]] + remaining
+                        >= threshold
+                    )
+                    docs, tfs = posting.fetch(candidates[inside], where[inside])
+
+            weights = self._tf_part(tfs, lengths[docs], avg_length)
+            weights *= np.float32(idf)
+            if n == 0:
+                # Nothing scored yet: a plain store, without reading first.
+                scores[docs] = weights
+            else:
+                # Document numbers are unique within a list, so += is safe.
+                scores[docs] += weights
+            scored += bound
+
+            if exhaustive or remaining <= 0:
+                continue
+            if candidates is None:
+                # The k-th score is at most `scored`: no need to look
+                # while that is below what the other terms can add.
+                if scored < remaining:
+                    continue
+                seen = touched[0] if n == 0 else np.concatenate(touched)
+                if len(seen) < k:
+                    continue
+                threshold = float(np.partition(scores[seen], len(seen) - k)[-k])
+                if threshold >= remaining:
+                    candidates = seen
+            elif len(candidates) >= k:
+                threshold = float(
+                    np.partition(scores[candidates], len(candidates) - k)[-k]
+                )
+
+        if candidates is None:
+            candidates = np.concatenate(touched)
+        if not len(candidates):
+            return candidates
+
+        top = min(k, len(candidates))
+        best = candidates[np.argpartition(-scores[candidates], top - 1)[:top]]
+        return best[np.argsort(-scores[best], kind="stable")]
+
+    def idf(self, terms: list[str]) -> np.ndarray:
+        """BM25 idf of each term over the indexed chunks, as `search` uses it"""
+        with self._lock:
+            live = self.live_docs
+            dead = self._dead()
+            df = np.array(
+                [
+                    self._df(t, self.postings[t], dead) if t in self.postings else 0
+                    for t in terms
+                ],
+                dtype=np.float32,
+            )
+        return np.log1p((live - df + 0.5) / (df + 0.5))
+
+    # ---------------------------------------------------
+    # Persistence
+    # ---------------------------------------------------
+    def checkpoint(self) -> Response[None]:
+        """Write the postings and empty the log"""
+        try:
+            with self._lock:
+                if self.logged:
+                    self._save()
+            return Response.ok(None, "lexical index checkpointed successfully")
+        except Exception as e:
+            Logger.error(f"Error in saving lexical index: {e}", self.service_name)
+            return Response.fail(str(e), "failed to checkpoint lexical index")
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        os.makedirs(self.path, exist_ok=True)
+        terms = list(self.postings)
+        postings = [self.postings[t] for t in terms]
+        empty = PostingBlocks()
+        blocks = [p.blocks or empty for p in postings]
+
+        def joined(parts, dtype):
+            return np.frombuffer(b"".join(parts), dtype)
+
+        def offsets(sizes):
+            return np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+
+        arrays = {
+            "doc_lengths": np.frombuffer(self.doc_lengths, dtype=np.uint32),
+            "tail_offsets": offsets([len(p.docs) for p in postings]),
+            "tail_docs": joined([p.docs for p in postings], np.uint32),
+            "tail_tfs": joined([p.tfs for p in postings], np.uint16),
+            "block_offsets": offsets([len(b) for b in blocks]),
+            "first": joined([b.first for b in blocks], np.uint32),
+            "last": joined([b.last for b in blocks], np.uint32),
+            "max_tf": joined([b.max_tf for b in blocks], np.uint16),
+            "min_length": joined([b.min_length for b in blocks], np.uint32),
+        }
+        for column in ("gaps", "tfs"):
+            packed = [getattr(b, column) for b in blocks]
+            arrays[f"{column}_width"] = joined([p.width for p in packed], np.uint8)
+            arrays[f"{column}_slot"] = joined([p.slot for p in packed], np.uint32)
+            for width, dtype in _WIDTHS:
+                parts = [p.buffers.get(width, b"") for p in packed]
+                arrays[f"{column}_{width}_offsets"] = offsets([len(x) for x in parts])
+                arrays[f"{column}_{width}"] = np.frombuffer(b"".join(parts), np.uint8)
+
+        tmp = os.path.join(self.path, "postings.tmp.npz")
+        # Uncompressed: the blocks are packed already, and a checkpoint of
+        # a large index is bound by disk bandwidth instead of zlib.
+        np.savez(tmp, **arrays)
+
+        index_tmp = os.path.join(self.path, "index.json.tmp")
+        with open(index_tmp, "w", encoding="utf-8") as f:
+            # dumps encodes in C; dump would stream it through Python.
+            f.write(
+                json.dumps(
+                    {
+                        "terms": terms,
+                        "chunk_ids": self.chunk_ids,
+                        "deleted": sorted(self.deleted),
+                    },
+                    ensure_ascii=False,
+                )
+            )
+
+        # The log is emptied last: a crash in between replays changes the
+        # checkpoint already holds, and replaying them again is harmless.
+        os.replace(tmp, os.path.join(self.path, "postings.npz"))
+        os.replace(index_tmp, os.path.join(self.path, "index.json"))
+        open(self.log_path, "w").close()
+        self.logged = 0
+
+    def load(self):
+        with self._lock:
+            with open(
+                os.path.join(self.path, "index.json"), "r", encoding="utf-8"
+            ) as f:
+                meta = json.load(f)
+
+            with np.load(os.path.join(self.path, "postings.npz")) as arrays:
+                arrays = {name: arrays[name] for name in arrays.files}
+            self.doc_lengths = array("I", arrays["doc_lengths"].tobytes())
+
+            if "tail_docs" in arrays:
+                self.postings = self._unpack(meta["terms"], arrays)
+            else:
+                self.postings = self._unpack_unblocked(meta["terms"], arrays)
+
+            self.chunk_ids = meta["chunk_ids"]
+            self.deleted = set(meta["deleted"])
+            self.dead = array("B", bytes(len(self.chunk_ids)))
+            for doc in self.deleted:
+                self.dead[doc] = 1
+            self.docs_by_id = {
+                chunk_id: doc
+                for doc, chunk_id in enumerate(self.chunk_ids)
+                if doc not in self.deleted
+            }
+            self.total_length = sum(
+                self.doc_lengths[d] for d in self.docs_by_id.values()
+            )
+            self._live_df = {}
+            self.logged = 0
+            self._replay()
+
+    @staticmethod
+    def _unpack(terms: list[str], arrays: dict) -> dict:
+        def part(name, start, end, typecode):
+            return array(typecode, arrays[name][start:end].tobytes())
+
+        tail = arrays["tail_offsets"]
+        block = arrays["block_offsets"]
+        postings = {}
+        for n, term in enumerate(terms):
+            posting = Postings()
+            posting.docs = part("tail_docs", tail[n], tail[n + 1], "I")
+            posting.tfs = part("tail_tfs", tail[n], tail[n + 1], "H")
+
+            start, end = block[n], block[n + 1]
+            if end > start:
+                blocks = posting.blocks = PostingBlocks()
+                blocks.first = part("first", start, end, "I")
+                blocks.last = part("last", start, end, "I")
+                blocks.max_tf = part("max_tf", start, end, "H")
+                blocks.min_length = part("min_length", start, end, "I")
+                for column in ("gaps", "tfs"):
+                    packed = getattr(blocks, column)
+                    packed.width = part(f"{column}_width", start, end, "B")
+                    packed.slot = part(f"{column}_slot", start, end, "I")
+                    for width, _ in _WIDTHS:
+                        offsets = arrays[f"{column}_{width}_offsets"]
+                        if offsets[n + 1] > offsets[n]:
+                            packed.buffers[width] = bytearray(
+                                arrays[f"{column}_{width}"][
+                                    offsets[n] : offsets[n + 1]
+                                ].tobytes()
+                            )
+            postings[term] = posting
+        return postings
+
+    @staticmethod
+    def _unpack_unblocked(terms: list[str], arrays: dict) -> dict:
+        """Checkpoints written before blocks: raw or delta-encoded lists"""
+        offsets = arrays["offsets"]
+        tfs = arrays["tfs"]
+        lengths = arrays["doc_lengths"]
+        if "docs" in arrays:
+            docs = arrays["docs"]
+        else:
+            docs = np.cumsum(arrays["deltas"], dtype=np.uint64)
+            starts = np.repeat(
+                np.concatenate([[0], docs])[offsets[:-1]], np.diff(offsets)
+            )
+            docs = (docs - starts).astype(np.uint32)
+
+        return {
+            term: Postings.from_arrays(
+                docs[offsets[n] : offsets[n + 1]],
+                tfs[offsets[n] : offsets[n + 1]],
+                lengths,
+            )
+            for n, term in enumerate(terms)
+        }
+
+    def _replay(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                for chunk_id in entry["remove"]:
+                    self._remove(chunk_id)
+                for chunk_id, terms in entry["add"]:
+                    self._add(chunk_id, terms)
+                self.logged += len(entry["remove"]) + len(entry["add"])
@@ -0,0 +1,475 @@
+from lib.common.responses import Response
+from lib.common.logger import Logger
+from lib.common.metrics import Metrics
+from lib.database.interfaces.VectorStoreInterface import VectorStoreInterface
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.database.EmbeddingCodec import EmbeddingCodec
+import numpy as np
+import io
+import json
+import os
+import threading
+
+# .npy header readers / writers by format version; other versions are
+# rewritten instead of grown in place.
+_HEADER_IO = {
+    (1, 0): (
+        np.lib.format.read_array_header_1_0,
+        np.lib.format.write_array_header_1_0,
+    ),
+    (2, 0): (
+        np.lib.format.read_array_header_2_0,
+        np.lib.format.write_array_header_2_0,
+    ),
+}
+
+
+class NumpyVectorStore(VectorStoreInterface):
+    """
+    In-process flat vector store.
+
+    Embeddings are L2-normalized float32 rows in a memory-mapped
+    `embeddings.npy`; ids, documents and metadata live in a `records.jsonl`
+    log. A query is one matrix-vector product plus argpartition, with no
+    client, server or serialization in between. Distances are cosine
+    distances (1 - cosine similarity).
+
+    Writes are append-only. A sync appends its rows to the end of every
+    array file (only the .npy header's row count is rewritten) and one line
+    per record to the log, after a line listing the deleted ids. The rows
+    of deleted or re-written chunks stay on disk as tombstones that queries
+    skip; `compact()` rewrites the collection without them, and sync does
+    so by itself once they reach `compact_ratio` of the rows, which keeps
+    the cost of a write proportional to its own size.
+
+    `compression` (an EmbeddingCodec) truncates and/or quantizes the stored
+    rows instead. It is fixed when the collection is first written and kept
+    in `codec.json`; opening a non-empty collection with different settings
+    raises, since the stored rows cannot be converted without loss.
+    """
+
+    def __init__(
+        self,
+        collection_name="pdf_chunks_v2",
+        path: str = "./numpy_store",
+        compression: EmbeddingCodec | None = None,
+        compact_ratio: float = 0.5,
+    ):
+        self.service_name = "NumpyVectorStore"
+        self.directory = os.path.join(path, collection_name)
+        self.records_path = os.path.join(self.directory, "records.jsonl")
+        self.compact_ratio = compact_ratio
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._load(compression)
+
+    # ---------------------------------------------------
+    # Persistence
+    # ---------------------------------------------------
+    def _load(self, compression: EmbeddingCodec | None = None):
+        stored_codec = EmbeddingCodec.load(self.directory) or EmbeddingCodec()
+        self.codec = stored_codec
+
+        legacy_path = os.path.join(self.directory, "records.json")
+        if os.path.exists(legacy_path) and not os.path.exists(self.records_path):
+            # Collections written before the log kept one records.json.
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+            self._write_log(legacy["ids"], legacy["documents"], legacy["metadatas"])
+            os.remove(legacy_path)
+
+        records, positions, dead = self._replay()
+        rows = len(records["ids"])
+
+        if rows:
+            arrays = {}
+            for name in self.codec.array_names:
+                array = np.load(self.array_path(name), mmap_mode="r")
+                if len(array) < rows:
+                    raise ValueError(
+                        f"{self.array_path(name)} holds {len(array)} rows, "
+                        f"the record log {rows}"
+                    )
+                # Rows past the log are left over from an interrupted sync.
+                arrays[name] = array[:rows]
+        else:
+            arrays = self.codec.empty()
+
+        if compression is not None:
+            if compression != stored_codec:
+                if rows:
+                    raise ValueError(
+                        f"Collection {self.directory} is stored as {stored_codec}; "
+                        f"re-ingest into a new collection to use {compression}"
+                    )
+                arrays = compression.empty()
+            self.codec = compression
+
+        self._publish(arrays, records, positions, dead)
+
+    def _replay(self) -> tuple[dict, dict, np.ndarray]:
+        """Records of every row, row of every live id and tombstoned rows"""
+        records = {"ids": [], "documents": [], "metadatas": []}
+        positions = {}
+        dead = []
+        if not os.path.exists(self.records_path):
+            return records, positions, np.array(dead, dtype=np.int64)
+
+        size = 0
+        with open(self.records_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                size += len(line)
+
+                if "deleted" in entry:
+                    for chunk_id in entry["deleted"]:
+                        row = positions.pop(chunk_id, None)
+                        if row is not None:
+                            dead.append(row)
+                    continue
+
+                previous = positions.get(entry["id"])
+                if previous is not None:
+                    dead.append(previous)
+                positions[entry["id"]] = len(records["ids"])
+                records["ids"].append(entry["id"])
+                records["documents"].append(entry["document"])
+                records["metadatas"].append(entry["metadata"])
+
+        if size < os.path.getsize(self.records_path):
+            Logger.warning(
+                f"Dropping a partly written entry at the end of {self.records_path}",
+                self.service_name,
+            )
+            with open(self.records_path, "r+b") as f:
+                f.truncate(size)
+
+        return records, positions, np.array(sorted(dead), dtype=np.int64)
+
+    def array_path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.npy")
+
+    def _publish(self, arrays: dict, records: dict, positions: dict, dead):
+        # Readers grab this tuple once, so they never see a half-applied
+        # write. Record lists only ever grow between compactions, and a
+        # reader indexes them by rows of its own arrays.
+        self._state = (arrays, records, positions, dead)
+
+    @staticmethod
+    def _log_lines(entries: list[dict]) -> bytes:
+        return b"".join(
+            (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+            for entry in entries
+        )
+
+    def _write_log(self, ids: list, documents: list, metadatas: list):
+        tmp_path = self.records_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for start in range(0, len(ids), 10_000):
+                end = start + 10_000
+                f.write(
+                    self._log_lines(
+                        {"id": i, "document": d, "metadata": m}
+                        for i, d, m in zip(
+                            ids[start:end], documents[start:end], metadatas[start:end]
+                        )
+                    )
+                )
+        os.replace(tmp_path, self.records_path)
+
+    def _append_log(self, entries: list[dict]):
+        with open(self.records_path, "ab") as f:
+            f.write(self._log_lines(entries))
+
+    def _write_array(self, name: str, array, rows: np.ndarray | None = None):
+        """Write `array` (or its `rows`) to a new .npy file, block by block"""
+        path = self.array_path(name)
+        count = len(array) if rows is None else len(rows)
+        out = np.lib.format.open_memmap(
+            path + ".tmp.npy",
+            mode="w+",
+            dtype=array.dtype,
+            shape=(count, *array.shape[1:]),
+        )
+        for start in range(0, count, 65_536):
+            block = slice(start, start + 65_536)
+            out[block] = array[block] if rows is None else array[rows[block]]
+        out.flush()
+        del out
+        return path + ".tmp.npy"
+
+    def _append_array(self, name: str, array, part: np.ndarray):
+        """
+        Grow the .npy file of `array` (the first len(array) rows on disk) by
+        `part`. The rows are written past the current end and the header's
+        row count is updated in place; numpy pads headers so the count can
+        grow without moving the data.
+        """
+        path = self.array_path(name)
+        rows = len(array)
+        if rows == 0 or not os.path.exists(path):
+            os.replace(self._write_array(name, part), path)
+            return np.load(path, mmap_mode="r")
+
+        with open(path, "r+b") as f:
+            version = np.lib.format.read_magic(f)
+            read_header, write_header = _HEADER_IO.get(version, (None, None))
+            if read_header is not None:
+                shape, fortran_order, dtype = read_header(f)
+                offset = f.tell()
+
+                header = io.BytesIO()
+                write_header(
+                    header,
+                    {
+                        "descr": np.lib.format.dtype_to_descr(dtype),
+                        "fortran_order": False,
+                        "shape": (rows + len(part), *shape[1:]),
+                    },
+                )
+                if (
+                    not fortran_order
+                    and dtype == part.dtype
+                    and shape[1:] == part.shape[1:]
+                    and len(header.getvalue()) == offset
+                ):
+                    f.seek(offset + rows * dtype.itemsize * int(np.prod(shape[1:])))
+                    f.write(np.ascontiguousarray(part).tobytes())
+                    f.truncate()
+                    f.flush()
+                    # The rows are in place before the header counts them.
+                    f.seek(0)
+                    f.write(header.getvalue())
+                    f.flush()
+                    return np.load(path, mmap_mode="r")
+
+        Logger.warning(f"Cannot grow {path} in place; rewriting it", self.service_name)
+        merged = np.concatenate([np.asarray(array), part])
+        os.replace(self._write_array(name, merged), path)
+        return np.load(path, mmap_mode="r")
+
+    def compact(self) -> Response[dict]:
+        """Rewrite the collection without its tombstoned rows"""
+        try:
+            with self._lock:
+                dropped = self._compact()
+            return Response.ok({"dropped": dropped}, "store compacted successfully")
+        except Exception as e:
+            Logger.error(
+                f"Error in compacting NumpyVectorStore: {e}", self.service_name
+            )
+            return Response.fail(str(e), "failed to compact store")
+
+    def _compact(self) -> int:
+        arrays, records, positions, dead = self._state
+        if not len(dead):
+            return 0
+
+        live = np.array(sorted(positions.values()), dtype=np.int64)
+        tmp_paths = {
+            name: self._write_array(name, array, live) for name, array in arrays.items()
+        }
+        ids = [records["ids"][n] for n in live]
+        documents = [records["documents"][n] for n in live]
+        metadatas = [records["metadatas"][n] for n in live]
+
+        # Arrays first: if this stops half way the arrays are shorter than
+        # the log and loading fails loudly instead of mixing up rows.
+        for name, tmp_path in tmp_paths.items():
+            os.replace(tmp_path, self.array_path(name))
+        self._write_log(ids, documents, metadatas)
+        self.codec.save(self.directory)
+
+        self._publish(
+            (
+                {name: np.load(self.array_path(name), mmap_mode="r") for name in arrays}
+                if len(live)
+                else self.codec.empty()
+            ),
+            {"ids": ids, "documents": documents, "metadatas": metadatas},
+            {i: n for n, i in enumerate(ids)},
+            np.array([], dtype=np.int64),
+        )
+        Logger.info(
+            f"Compacted {self.directory}: dropped {len(dead)} rows, "
+            f"kept {len(live)}",
+            self.service_name,
+        )
+        return len(dead)
+
+    @staticmethod
+    def normalize(vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    # ---------------------------------------------------
+    # Write
+    # ---------------------------------------------------
+    def add(self, data: EmbeddingBatch | list):
+        res = self.sync(data, [])
+        if not res.success:
+            return res
+        return Response.ok(None, "data added successfully")
+
+    @Metrics.traced("vector_store_write", backend="numpy")
+    def sync(self, data: EmbeddingBatch | list, removed_ids: list):
+        """Upsert records and delete ids by appending to the store's files"""
+        try:
+            data = EmbeddingBatch.coerce(data)
+            with self._lock:
+                synced = self._sync(data, removed_ids)
+            return Response.ok(synced, "data synced successfully")
+        except Exception as e:
+            Logger.error(
+                f"Error in syncing data to NumpyVectorStore: {e}", self.service_name
+            )
+            return Response.fail(str(e), "failed to sync data")
+
+    def _sync(self, data: EmbeddingBatch, removed_ids: list) -> dict:
+        """sync with the lock held"""
+        arrays, records, positions, dead = self._state
+        codec = self.codec
+        rows = len(records["ids"])
+
+        new_rows = codec.prepare(data.embeddings) if len(data) else None
+
+        if rows and new_rows is not None:
+            if codec.dim(arrays) != new_rows.shape[1]:
+                raise ValueError(
+                    f"Embedding dimension {new_rows.shape[1]} does not match "
+                    f"store dimension {codec.dim(arrays)}"
+                )
+
+        deleted = [i for i in dict.fromkeys(removed_ids) if i in positions]
+        if new_rows is None and not deleted:
+            return {"upserted": 0, "deleted": 0}
+
+        # Rows go to disk before the log lines that make them visible; rows
+        # past the end of the log are overwritten by the next sync.
+        if new_rows is not None:
+            arrays = {
+                name: self._append_array(name, arrays[name], part)
+                for name, part in codec.encode(new_rows).items()
+            }
+            if not rows:
+                codec.save(self.directory)
+
+        new_ids = data.ids
+        documents = data.documents
+        metadatas = data.metadatas(self.content_hash)
+        entries = [{"deleted": deleted}] if deleted else []
+        entries += [
+            {"id": i, "document": d, "metadata": m}
+            for i, d, m in zip(new_ids, documents, metadatas)
+        ]
+        self._append_log(entries)
+
+        positions = dict(positions)
+        tombstones = [positions.pop(i) for i in deleted]
+        for n, chunk_id in enumerate(new_ids, rows):
+            previous = positions.get(chunk_id)
+            if previous is not None:
+                tombstones.append(previous)
+            positions[chunk_id] = n
+        records["ids"].extend(new_ids)
+        records["documents"].extend(documents)
+        records["metadatas"].extend(metadatas)
+        dead = np.union1d(dead, np.array(tombstones, dtype=np.int64))
+
+        self._publish(arrays, records, positions, dead)
+        if len(dead) >= max(1, self.compact_ratio * len(records["ids"])):
+            self._compact()
+
+        return {"upserted": len(data), "deleted": len(deleted)}
+
+    # ---------------------------------------------------
+    # Read
+    # ---------------------------------------------------
+    def get(self, query_embedding, n_results: int = 5):
+        return self.get_many([query_embedding], n_results)
+
+    @Metrics.traced("vector_store_query", backend="numpy")
+    def get_many(self, query_embeddings: list, n_results: int = 5):
+        try:
+            state = self._state
+            queries = self.codec.prepare(query_embeddings)
+            return Response.ok(
+                self._search(state, queries, n_results),
+                "data retrieved successfully",
+            )
+        except Exception as e:
+            Logger.error(
+                f"Error in getting data from NumpyVectorStore: {e}", self.service_name
+            )
+            return Response.fail(str(e), "failed to get data")
+
+    def _search(self, state: tuple, queries: np.ndarray, n_results: int) -> dict:
+        arrays, records, positions, dead = state
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        if not positions:
+            for key in results:
+                results[key] = [[] for _ in range(len(queries))]
+            return results
+
+        top, top_scores = self.codec.search(arrays, queries, n_results, exclude=dead)
+
+        for rows, row_scores in zip(top, top_scores):
+            # Tombstones only come back when fewer than n_results rows live.
+            live = np.isfinite(row_scores)
+            rows, row_scores = rows[live], row_scores[live]
+            results["ids"].append([records["ids"][n] for n in rows])
+            results["documents"].append([records["documents"][n] for n in rows])
+            results["metadatas"].append([records["metadatas"][n] for n in rows])
+            results["distances"].append([float(1.0 - s) for s in row_scores])
+
+        return results
+
+    @Metrics.traced("vector_store_fetch", backend="numpy")
+    def get_by_ids(self, ids: list):
+        _, records, positions, _ = self._state
+        rows = [positions[i] for i in ids if i in positions]
+        return Response.ok(
+            {
+                "ids": [records["ids"][n] for n in rows],
+                "documents": [records["documents"][n] for n in rows],
+                "metadatas": [records["metadatas"][n] for n in rows],
+            },
+            "data retrieved successfully",
+        )
+
+    def stored_hashes(self, source: str) -> dict:
+        _, records, positions, _ = self._state
+        metadatas = records["metadatas"]
+        return {
+            chunk_id: metadatas[n].get("content_hash")
+            for chunk_id, n in positions.items()
+            if metadatas[n].get("source") == source
+        }
+
+    def stored_embeddings(self, ids: list) -> dict:
+        if self.codec.dims is not None:
+            # Truncated rows cannot be mixed with freshly embedded full-size
+            # ones; moved chunks are embedded again (usually a cache hit).
+            return {}
+        arrays, _, positions, _ = self._state
+        return {
+            i: self.codec.decode(arrays, positions[i]) for i in ids if i in positions
+        }
+
+    def count(self) -> int:
+        return len(self._state[2])
+
+    def storage_bytes(self) -> dict[str, int]:
+        """Bytes of the vectors scanned per query and of the re-rank rows"""
+        return self.codec.nbytes(self._state[0])
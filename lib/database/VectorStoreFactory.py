@@ -0,0 +1,44 @@
+from lib.database.interfaces.VectorStoreInterface import VectorStoreInterface
+
+
+def create_vector_store(
+    backend: str = "chroma",
+    collection_name: str = "pdf_chunks_v2",
+    compression: str | None = None,
+    n_lists: int = 256,
+    nprobe: int = 8,
+    rerank_factor: int = 4,
+) -> VectorStoreInterface:
+    """
+    Build the configured vector store backend ("chroma", "numpy" or "ivf").
+
+    `compression` is an EmbeddingCodec spec for the numpy backend, e.g.
+    "int8", "binary" or "int8:768" (see EmbeddingCodec.parse). `n_lists`,
+    `nprobe` and `rerank_factor` tune the ivf backend.
+    """
+    if compression and backend != "numpy":
+        raise ValueError(f"Compression is not supported by the {backend} backend")
+
+    if backend == "chroma":
+        from lib.database.ChormaDB import ChromaDB
+
+        return ChromaDB(collection_name)
+
+    if backend == "ivf":
+        from lib.database.IVFVectorStore import IVFVectorStore
+
+        return IVFVectorStore(
+            collection_name,
+            n_lists=n_lists,
+            nprobe=nprobe,
+            rerank_factor=rerank_factor,
+        )
+
+    if backend == "numpy":
+        from lib.database.NumpyVectorStore import NumpyVectorStore
+        from lib.database.EmbeddingCodec import EmbeddingCodec
+
+        codec = EmbeddingCodec.parse(compression) if compression else None
+        return NumpyVectorStore(collection_name, compression=codec)
+
+    raise ValueError(f"Unknown vector store backend: {backend}")
@@ -0,0 +1,117 @@
+from abc import ABC, abstractmethod
+from lib.common.responses import Response
+from lib.common.logger import Logger
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.database.ChunkDiff import ChunkDiff
+import hashlib
+
+IMAGE_ID_MARKER = ":image:"
+
+
+class VectorStoreInterface(ABC):
+    """
+    Contract shared by every vector store backend.
+
+    Query results use the Chroma layout: {"ids", "documents", "metadatas",
+    "distances"}, each a list with one inner list per query embedding.
+    Writes take an EmbeddingBatch or a list of to_record() dicts.
+    """
+
+    service_name = "VectorStore"
+
+    @abstractmethod
+    def add(self, data: list) -> Response:
+        pass
+
+    @abstractmethod
+    def get(self, query_embedding, n_results: int = 5) -> Response[dict]:
+        pass
+
+    @abstractmethod
+    def get_many(self, query_embeddings: list, n_results: int = 5) -> Response[dict]:
+        pass
+
+    @abstractmethod
+    def get_by_ids(self, ids: list) -> Response[dict]:
+        """{"ids", "documents", "metadatas"} for the ids that exist, in order"""
+        pass
+
+    @abstractmethod
+    def sync(self, data: EmbeddingBatch | list, removed_ids: list) -> Response[dict]:
+        pass
+
+    @abstractmethod
+    def stored_hashes(self, source: str) -> dict:
+        """{chunk_id: content_hash} for every stored chunk of `source`"""
+        pass
+
+    @abstractmethod
+    def stored_embeddings(self, ids: list) -> dict:
+        """{chunk_id: embedding} for the given ids that exist"""
+        pass
+
+    def checkpoint(self) -> Response:
+        """Persist state the backend buffers between syncs"""
+        return Response.ok(None, "nothing to checkpoint")
+
+    # ---------------------------------------------------
+    # Shared helpers
+    # ---------------------------------------------------
+    @staticmethod
+    def to_record(chunk: dict, embedding, tokens: int) -> dict:
+        return {
+            "id": chunk["id"],
+            "embedding": embedding,
+            "content": chunk["content"],
+            "metadata": {
+                "page_number": chunk["page_number"],
+                "chunk_number": chunk["chunk_number"],
+                "source": chunk["source"],
+                "token_count": tokens,
+            },
+            "tokens": tokens,
+        }
+
+    @staticmethod
+    def to_batch(chunks: list, embeddings, tokens=None) -> EmbeddingBatch:
+        return EmbeddingBatch(chunks, embeddings, tokens)
+
+    @staticmethod
+    def image_id(source: str, page_number: int, render_hash: str) -> str:
+        """Id of a page-image record; it changes whenever the render does"""
+        return f"{source}:{page_number}{IMAGE_ID_MARKER}{render_hash[:16]}"
+
+    @staticmethod
+    def is_image_id(chunk_id: str) -> bool:
+        return IMAGE_ID_MARKER in chunk_id
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def differ(self, source: str) -> ChunkDiff:
+        """Incremental diff of `source`, for chunks that arrive in batches"""
+        return ChunkDiff(self, source)
+
+    def diff(self, source: str, chunks: list) -> Response[dict]:
+        """
+        Compare freshly split chunks of `source` with what is stored.
+
+        Returns:
+            pending:   chunks whose content is not stored anywhere -> must be embedded
+            reused:    EmbeddingBatch of chunks whose content moved to a new id;
+                       the stored embedding is reused instead of re-embedding
+            unchanged: ids whose content hash did not change
+            removed:   stored ids that no longer exist in the document
+
+        Page-image records of `source` are left alone; the image stage
+        diffs those by render hash.
+        """
+        try:
+            differ = self.differ(source)
+            data = differ.update(chunks)
+            data["removed"] = differ.removed()
+            return Response.ok(data, "diff computed successfully")
+        except Exception as e:
+            Logger.error(f"Error in diffing data: {e}", self.service_name)
+            return Response.fail(str(e), "failed to diff data")
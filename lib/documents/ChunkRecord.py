@@ -0,0 +1,123 @@
+import sys
+
+
+class ChunkRecord:
+    """
+    One split chunk, stored in slots instead of a per-chunk dict.
+
+    The source path is interned, so every chunk of a file shares one string,
+    and the id ("<source>:<page>:<chunk>") is derived on access unless it
+    was given explicitly. Item access (`chunk["content"]`) is kept so code
+    written against the old chunk dicts keeps working.
+
+    `token_count` is counted once when the document is split and stored
+    with the chunk, so validation, batching and context budgeting do not
+    encode the text again.
+    """
+
+    __slots__ = (
+        "source",
+        "page_number",
+        "chunk_number",
+        "content",
+        "_id",
+        "extra",
+        "token_count",
+    )
+
+    FIELDS = ("id", "page_number", "chunk_number", "content", "source", "token_count")
+
+    def __init__(
+        self,
+        source: str,
+        page_number: int,
+        chunk_number: int,
+        content: str,
+        chunk_id: str | None = None,
+        extra: dict | None = None,
+        token_count: int | None = None,
+    ):
+        self.source = sys.intern(source)
+        self.page_number = page_number
+        self.chunk_number = chunk_number
+        self.content = content
+        self._id = chunk_id
+        # Additional store metadata, e.g. the kind and linked chunks of a
+        # page-image record. None for plain text chunks.
+        self.extra = extra
+        self.token_count = token_count
+
+    @property
+    def id(self) -> str:
+        if self._id is not None:
+            return self._id
+        return f"{self.source}:{self.page_number}:{self.chunk_number}"
+
+    @classmethod
+    def from_dict(cls, chunk: dict) -> "ChunkRecord":
+        record = cls(
+            chunk["source"],
+            chunk["page_number"],
+            chunk["chunk_number"],
+            chunk["content"],
+            token_count=chunk.get("token_count"),
+        )
+        if chunk["id"] != record.id:
+            record._id = chunk["id"]
+        return record
+
+    def metadata(self) -> dict:
+        metadata = {
+            "page_number": self.page_number,
+            "chunk_number": self.chunk_number,
+            "source": self.source,
+        }
+        if self.token_count is not None:
+            metadata["token_count"] = self.token_count
+        if self.extra:
+            metadata.update(self.extra)
+        return metadata
+
+    # ---------------------------------------------------
+    # Mapping access
+    # ---------------------------------------------------
+    def __getitem__(self, key: str):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def keys(self) -> tuple:
+        return self.FIELDS
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+    def __getstate__(self):
+        return (
+            self.source,
+            self.page_number,
+            self.chunk_number,
+            self.content,
+            self._id,
+            self.extra,
+            self.token_count,
+        )
+
+    def __setstate__(self, state):
+        (
+            source,
+            self.page_number,
+            self.chunk_number,
+            self.content,
+            self._id,
+            self.extra,
+            self.token_count,
+        ) = state
+        # Interning is per process, so redo it after unpickling.
+        self.source = sys.intern(source)
+
+    def __repr__(self) -> str:
+        return f"ChunkRecord({self.id!r}, {len(self.content)} chars)"
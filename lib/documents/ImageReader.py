@@ -1,35 +1,266 @@
 from lib.common.logger import Logger
+from lib.common.metrics import Metrics
 from lib.documents.interfaces.ImageReadersInterface import ImageReadersInterface
-from pdf2image import convert_from_path
-from pdf2image.exceptions import (
-    PDFInfoNotInstalledError,
-    PDFPageCountError,
-    PDFSyntaxError,
-)
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Iterator
 import base64
+import hashlib
 import io
+import os
+import tempfile
+import threading
+
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
 
 
 class ImageReader(ImageReadersInterface):
-    def __init__(self):
+    """
+    Rasterizes PDF pages for multimodal prompts.
+
+    `iter_images` renders page ranges on worker threads (pdftoppm runs as a
+    subprocess, so threads render in parallel) and yields one encoded page
+    at a time in page order. At most `workers * 2` ranges are in flight and
+    each range holds one decoded image at a time, so memory does not grow
+    with the page count.
+
+    Encoded pages are cached on disk under the file's sha256, the page and
+    the render settings, so re-runs over the same PDF skip rasterization.
+    """
+
+    def __init__(
+        self,
+        dpi: int = 200,
+        image_format: str = "PNG",
+        quality: int = 85,
+        max_size: int | None = None,
+        cache_dir: str | None = "./page_cache",
+        workers: int | None = None,
+        pages_per_task: int = 4,
+    ):
         self.service_name = "ImageReader"
+        self.dpi = dpi
+        self.image_format = image_format.upper()
+        if self.image_format == "JPG":
+            self.image_format = "JPEG"
+        if self.image_format not in MIME_TYPES:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        self.quality = quality
+        # Longest side in pixels; pdftoppm scales while rendering.
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.pages_per_task = pages_per_task
+
+        self._hashes = {}
+        self._hash_lock = threading.Lock()
+
+    # ---------------------------------------------------
+    # Encode
+    # ---------------------------------------------------
+    def encode(self, image) -> bytes:
+        """Encode a PIL image in the configured format and size"""
+        if self.max_size and max(image.size) > self.max_size:
+            image.thumbnail((self.max_size, self.max_size))
+        if self.image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        if self.image_format == "PNG":
+            image.save(buffer, format="PNG", optimize=False)
+        else:
+            image.save(buffer, format=self.image_format, quality=self.quality)
+        return buffer.getvalue()
+
+    def to_data_uri(self, data: bytes) -> str:
+        encoded = base64.b64encode(data).decode("utf-8")
+        return f"data:{MIME_TYPES[self.image_format]};base64,{encoded}"
 
     def convert_to_base64(self, image):
         try:
-            png_buffer = io.BytesIO()
-            image.save(png_buffer, format="PNG")
-            png_buffer.seek(0)
-            base64_png = base64.b64encode(png_buffer.read()).decode("utf-8")
-            data_uri = f"data:image/png;base64,{base64_png}"
-            return data_uri
+            return self.to_data_uri(self.encode(image))
         except Exception as e:
             Logger.error(f"Error converting image to base64: {e}", self.service_name)
             raise ValueError(f"Error converting image to base64: {e}")
 
-    def extract_images(self, file_path: str):
+    # ---------------------------------------------------
+    # Cache
+    # ---------------------------------------------------
+    def file_hash(self, file_path: str) -> str:
+        """sha256 of the file, remembered per (path, size, mtime)"""
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._hash_lock:
+            if key in self._hashes:
+                return self._hashes[key]
+
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+
+        with self._hash_lock:
+            self._hashes[key] = digest.hexdigest()
+        return self._hashes[key]
+
+    def cache_path(self, cache_dir: str, file_hash: str, page: int) -> str:
+        settings = f"{self.dpi}dpi_{self.max_size or 'full'}"
+        if self.image_format != "PNG":
+            settings += f"_q{self.quality}"
+        extension = self.image_format.lower()
+        return os.path.join(
+            cache_dir, file_hash[:2], file_hash, f"{page}_{settings}.{extension}"
+        )
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    # ---------------------------------------------------
+    # Render
+    # ---------------------------------------------------
+    def page_count(self, file_path: str) -> int:
+        from pdf2image import pdfinfo_from_path
+
+        return int(pdfinfo_from_path(file_path)["Pages"])
+
+    def _render_range(
+        self, file_path: str, first: int, last: int, targets: dict[int, str]
+    ):
+        """Render pages first..last and write each encoded page to its target"""
+        from pdf2image import convert_from_path
+        from PIL import Image
+
+        with Metrics.span("image_render") as span:
+            span.set("pages", last - first + 1)
+            with tempfile.TemporaryDirectory(prefix="pages_") as tmp:
+                # pdftoppm writes straight to disk; only one decoded page is
+                # held in memory at a time below.
+                paths = convert_from_path(
+                    file_path,
+                    dpi=self.dpi,
+                    first_page=first,
+                    last_page=last,
+                    fmt="png",
+                    output_folder=tmp,
+                    paths_only=True,
+                    size=self.max_size,
+                )
+                for page, path in zip(range(first, last + 1), sorted(paths)):
+                    with Image.open(path) as image:
+                        self._write_atomic(targets[page], self.encode(image))
+
+        Metrics.count("image_pages_total", last - first + 1, result="rendered")
+
+    def _plan(self, missing: list[int]) -> list[tuple[int, int]]:
+        """Group missing pages into contiguous ranges of at most pages_per_task"""
+        ranges = []
+        for page in missing:
+            if (
+                ranges
+                and ranges[-1][1] == page - 1
+                and page - ranges[-1][0] < self.pages_per_task
+            ):
+                ranges[-1] = (ranges[-1][0], page)
+            else:
+                ranges.append((page, page))
+        return ranges
+
+    # ---------------------------------------------------
+    # Iterate Images
+    # ---------------------------------------------------
+    def iter_images(
+        self,
+        file_path: str,
+        first_page: int = 1,
+        last_page: int | None = None,
+        pages: list[int] | None = None,
+    ) -> Iterator[dict]:
+        """
+        Yield {"page_number", "data_uri", "bytes", "hash", "cached"} per page,
+        in page order, rendering only the pages missing from the disk cache.
+        `pages` picks individual pages within first_page..last_page; `hash`
+        is the sha256 of the encoded image.
+        """
+        from pdf2image.exceptions import (
+            PDFInfoNotInstalledError,
+            PDFPageCountError,
+            PDFSyntaxError,
+        )
+
         try:
-            images = convert_from_path(file_path)
-            return [self.convert_to_base64(image) for image in images]
+            last_page = min(last_page or 10**9, self.page_count(file_path))
         except (PDFInfoNotInstalledError, PDFPageCountError, PDFSyntaxError) as e:
             Logger.error(f"Error extracting images: {e}", self.service_name)
             raise ValueError(f"Error extracting images: {e}")
+
+        with tempfile.TemporaryDirectory(prefix="page_cache_") as scratch:
+            cache_dir = self.cache_dir or scratch
+            file_hash = self.file_hash(file_path)
+            selected = range(first_page, last_page + 1)
+            if pages is not None:
+                selected = sorted(set(pages).intersection(selected))
+            targets = {p: self.cache_path(cache_dir, file_hash, p) for p in selected}
+            cached = frozenset(p for p in selected if os.path.exists(targets[p]))
+            ranges = self._plan([p for p in selected if p not in cached])
+
+            Metrics.count("image_pages_total", len(cached), result="cached")
+            Logger.info(
+                f"{file_path}: {len(selected)} pages, {len(cached)} cached, "
+                f"{len(selected) - len(cached)} to render in {len(ranges)} ranges",
+                self.service_name,
+            )
+
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                queued = deque(ranges)
+                # Last page of a range -> its render future.
+                running = {}
+                ready = set(cached)
+
+                def fill():
+                    while queued and len(running) < self.workers * 2:
+                        first, last = queued.popleft()
+                        running[last] = executor.submit(
+                            self._render_range, file_path, first, last, targets
+                        )
+
+                fill()
+                for page in selected:
+                    if page not in ready:
+                        # Ranges are submitted in page order, so the first
+                        # running range ending at or after `page` holds it.
+                        last = min(end for end in running if end >= page)
+                        try:
+                            running.pop(last).result()
+                        except (
+                            PDFInfoNotInstalledError,
+                            PDFPageCountError,
+                            PDFSyntaxError,
+                        ) as e:
+                            Logger.error(
+                                f"Error extracting images: {e}", self.service_name
+                            )
+                            raise ValueError(f"Error extracting images: {e}")
+                        ready.update(range(page, last + 1))
+                        fill()
+
+                    with open(targets[page], "rb") as f:
+                        data = f.read()
+                    yield {
+                        "page_number": page,
+                        "data_uri": self.to_data_uri(data),
+                        "bytes": len(data),
+                        "hash": hashlib.sha256(data).hexdigest(),
+                        "cached": page in cached,
+                    }
+
+    # ---------------------------------------------------
+    # Extract Images
+    # ---------------------------------------------------
+    def extract_images(self, file_path: str):
+        """All pages as data URIs; prefer iter_images for large files"""
+        return [page["data_uri"] for page in self.iter_images(file_path)]
@@ -1,82 +1,294 @@
 from lib.common.logger import Logger
 from lib.documents.interfaces.PdfReadersInterface import PdfReadersInterface
 from lib.common.responses import Response
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-import re
+from lib.common.metrics import Metrics
+from lib.documents.TextCleaner import TextCleaner
+from lib.documents.ChunkRecord import ChunkRecord
+from lib.common.tokens import get_encoding
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+import bisect
 import logging
+import math
+import time
 
 logging.basicConfig(level=logging.INFO)
 
 
 class PdfReader(PdfReadersInterface):
 
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        cleaner: TextCleaner | None = None,
+        length_unit: str = "chars",
+        token_counts: bool = True,
+        token_offsets: bool = False,
+        workers: int = 1,
+        min_shard_pages: int = 25,
+    ):
+        """
+        `length_unit` is "chars" or "tokens": the unit of chunk_size and
+        chunk_overlap. With `token_counts` every chunk carries its
+        token_count; `token_offsets` also stores the chunk's token span
+        within its page (token_start / token_end).
+
+        With `workers` > 1, a document of at least 2 * `min_shard_pages`
+        pages is split into page ranges that are parsed, cleaned and split
+        by a process pool (see iter_chunks).
+        """
+        if length_unit not in ("chars", "tokens"):
+            raise ValueError(f"Unknown length unit: {length_unit}")
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.pages = []
+        self.cleaner = cleaner or TextCleaner()
+        self.length_unit = length_unit
+        self.token_counts = token_counts
+        self.token_offsets = token_offsets
+        self.workers = max(1, workers)
+        self.min_shard_pages = max(1, min_shard_pages)
         self.service_name = "PDFReader"
+        self._splitter = None
+
+    @property
+    def splitter(self):
+        """
+        Built on first use, so a reader costs nothing until a PDF is split.
+        The splitter is stateless, so one reader can be shared across threads.
+        """
+        if self._splitter is None:
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+            self._splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_size,
+                chunk_overlap=self.chunk_overlap,
+                separators=[
+                    "\n\n",
+                    "\n",
+                    ". ",
+                    " ",
+                    "\.",
+                    "?",
+                ],
+                length_function=(
+                    self.token_length if self.length_unit == "tokens" else len
+                ),
+                is_separator_regex=False,
+            )
+        return self._splitter
+
+    def __getstate__(self) -> dict:
+        # Shipped to page-range workers, which build their own splitter.
+        state = self.__dict__.copy()
+        state["_splitter"] = None
+        return state
+
+    @staticmethod
+    def token_length(text: str) -> int:
+        return len(get_encoding().encode(text))
 
     # ---------------------------------------------------
     # Clean Text
     # ---------------------------------------------------
     def clean_text(self, text: str) -> Response[str]:
         try:
-            text = re.sub(r"(\w+)-\s*\n\s*(\w+)", r"\1\2", text)
-            text = re.sub(r"^\d+\s*$", "", text, flags=re.MULTILINE)
-            text = re.sub(r"(?<!\n)\n(?!\n)", " ", text)
-
-            if "REFERENCES" in text.upper():
-                text = re.split(r"REFERENCES", text, flags=re.IGNORECASE)[0]
-
-            text = re.sub(r" +", " ", text)
-
-            return Response.ok(text.strip(), "Text cleaned successfully")
+            return Response.ok(self.cleaner.clean(text), "Text cleaned successfully")
 
         except Exception as e:
             Logger.error(f"Error cleaning text: {e}", self.service_name)
             return Response.fail(str(e), "Failed to clean text")
 
     # ---------------------------------------------------
-    # Extract Data
+    # Iterate Chunks
     # ---------------------------------------------------
-    def extract_data(self, file_path: str) -> Response[dict]:
-        try:
-            logging.info(f"Loading PDF: {file_path}")
+    def iter_chunks(self, file_path: str) -> Iterator[ChunkRecord]:
+        """
+        Lazily yield cleaned ChunkRecords page by page. Only one page is held
+        in memory at a time, so embedding can start before parsing finishes.
 
-            loader = PyPDFLoader(file_path)
-            raw_documents = loader.load()
+        Large documents are parsed in parallel when `workers` > 1: every
+        worker loads, cleans and splits its own page range and numbers its
+        chunks from 1. Ranges are yielded in page order and renumbered by
+        the chunks before them, so chunk numbers and ids are the same as a
+        serial run. Chunks never span pages, so none spans a range either.
+        """
+        logging.info(f"Loading PDF: {file_path}")
 
-            if not raw_documents:
-                raise ValueError("PDF contains no readable pages.")
+        total_pages = self.page_count(file_path) if self.workers > 1 else 0
+        if total_pages >= 2 * self.min_shard_pages:
+            yield from self._iter_sharded(file_path, total_pages)
+            return
 
-            # Clean each page
-            for doc in raw_documents:
-                cleaned = self.clean_text(doc.page_content)
+        from langchain_community.document_loaders import PyPDFLoader
 
-                if not cleaned.success:
-                    raise Exception(cleaned.error)
+        loader = PyPDFLoader(file_path)
+        chunk_num = 0
+        has_pages = False
 
-                doc.page_content = cleaned.data  # FIXED
+        for doc in loader.lazy_load():
+            has_pages = True
+            records = self.chunk_page(
+                doc.page_content, doc.metadata.get("page", 0), file_path, chunk_num
+            )
+            chunk_num += len(records)
+            yield from records
 
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=self.chunk_size,
-                chunk_overlap=self.chunk_overlap,
-                separators=[
-                    "\n\n",
-                    "\n",
-                    ". ",
-                    " ",
-                    "\.",
-                    "?",
-                ],
-                length_function=len,
-                is_separator_regex=False,
+        if not has_pages:
+            raise ValueError("PDF contains no readable pages.")
+
+    def iter_pages(
+        self, file_path: str, min_chunks: int = 1
+    ) -> Iterator[list[ChunkRecord]]:
+        """iter_chunks grouped into whole pages; see group_pages"""
+        return self.group_pages(self.iter_chunks(file_path), min_chunks)
+
+    @staticmethod
+    def group_pages(
+        chunks: Iterable[ChunkRecord], min_chunks: int = 1
+    ) -> Iterator[list[ChunkRecord]]:
+        """
+        Lists of the chunks of consecutive whole pages, each at least
+        `min_chunks` long except the last. Only the current list is held,
+        so a consumer can embed a document while the rest is still parsed.
+        """
+        group = []
+        for chunk in chunks:
+            if len(group) >= min_chunks and (
+                group[-1]["page_number"] != chunk["page_number"]
+            ):
+                yield group
+                group = []
+            group.append(chunk)
+        if group:
+            yield group
+
+    def chunk_page(
+        self, text: str, page_index: int, file_path: str, chunk_num: int = 0
+    ) -> list[ChunkRecord]:
+        """Clean, split and token-count one page; chunks follow `chunk_num`"""
+        started = time.perf_counter()
+        cleaned = self.clean_text(text)
+
+        if not cleaned.success:
+            raise Exception(cleaned.error)
+
+        cleaned_at = time.perf_counter()
+        chunks = self.splitter.split_text(cleaned.data)
+
+        Metrics.observe(
+            "stage_duration_seconds", cleaned_at - started, stage="pdf_clean"
+        )
+        Metrics.observe(
+            "stage_duration_seconds",
+            time.perf_counter() - cleaned_at,
+            stage="pdf_split",
+        )
+        Metrics.count("pdf_pages_total")
+        Metrics.count("pdf_chunks_total", len(chunks))
+
+        records = [
+            ChunkRecord(file_path, page_index + 1, chunk_num + n, content)
+            for n, content in enumerate(chunks, 1)
+        ]
+        if self.token_counts or self.token_offsets:
+            self.add_token_counts(cleaned.data, records)
+        return records
+
+    # ---------------------------------------------------
+    # Page-range sharding
+    # ---------------------------------------------------
+    @staticmethod
+    def page_count(file_path: str) -> int:
+        from pypdf import PdfReader as PyPdf
+
+        return len(PyPdf(file_path).pages)
+
+    def shard_ranges(self, total_pages: int) -> list[tuple[int, int]]:
+        """
+        [start, end) page ranges, about four per worker so a range of slow
+        pages does not leave the other workers idle at the end
+        """
+        size = max(self.min_shard_pages, math.ceil(total_pages / (self.workers * 4)))
+        return [
+            (start, min(start + size, total_pages))
+            for start in range(0, total_pages, size)
+        ]
+
+    def parse_range(self, file_path: str, start: int, end: int) -> list[ChunkRecord]:
+        """
+        Process-pool entry point: chunks of pages [start, end), numbered
+        from 1. Pages are read the way PyPDFLoader reads them.
+        """
+        from pypdf import PdfReader as PyPdf
+
+        pdf = PyPdf(file_path)
+        records = []
+        for page_index in range(start, end):
+            text = pdf.pages[page_index].extract_text(extraction_mode="plain")
+            records.extend(
+                self.chunk_page(text.strip(), page_index, file_path, len(records))
+            )
+        return records
+
+    def _iter_sharded(self, file_path: str, total_pages: int) -> Iterator[ChunkRecord]:
+        ranges = self.shard_ranges(total_pages)
+        Logger.info(
+            f"Parsing {total_pages} pages of {file_path} in {len(ranges)} ranges "
+            f"on {self.workers} workers",
+            self.service_name,
+        )
+
+        chunk_num = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            # map yields in submission order, i.e. page order.
+            shards = executor.map(
+                self.parse_range,
+                [file_path] * len(ranges),
+                [start for start, _ in ranges],
+                [end for _, end in ranges],
             )
+            for records in shards:
+                for record in records:
+                    record.chunk_number += chunk_num
+                chunk_num += len(records)
+                yield from records
 
-            self.pages = splitter.split_documents(raw_documents)
+    def add_token_counts(self, page_text: str, records: list[ChunkRecord]):
+        """Encode each chunk once; with token_offsets, the page once more"""
+        started = time.perf_counter()
+        enc = get_encoding()
+        for record in records:
+            record.token_count = len(enc.encode(record.content))
 
-            json_result = self.convet_to_json(file_path)
+        if self.token_offsets:
+            _, offsets = enc.decode_with_offsets(enc.encode(page_text))
+            search_from = 0
+            for record in records:
+                start = page_text.find(record.content, search_from)
+                if start < 0:
+                    continue
+                search_from = start + 1
+                end = start + len(record.content)
+                record.extra = {
+                    **(record.extra or {}),
+                    "token_start": bisect.bisect_left(offsets, start),
+                    "token_end": bisect.bisect_left(offsets, end),
+                }
+
+        Metrics.observe(
+            "stage_duration_seconds", time.perf_counter() - started, stage="pdf_tokens"
+        )
+
+    # ---------------------------------------------------
+    # Extract Data
+    # ---------------------------------------------------
+    @Metrics.traced("pdf_extract")
+    def extract_data(self, file_path: str) -> Response[dict]:
+        try:
+            chunks = list(self.iter_chunks(file_path))
+
+            json_result = self.convet_to_json(file_path, chunks)
 
             if not json_result.success:
                 return json_result
@@ -96,28 +308,14 @@ class PdfReader(PdfReadersInterface):
     # ---------------------------------------------------
     # Convert To JSON
     # ---------------------------------------------------
-    def convet_to_json(self, file_path: str) -> Response[dict]:
+    def convet_to_json(
+        self, file_path: str, chunks: list[ChunkRecord]
+    ) -> Response[dict]:
         try:
-            json_pages = []
-
-            for chunk_num, doc in enumerate(self.pages, start=1):
-                page_num = doc.metadata.get("page", 0) + 1
-                chunk_id = f"{file_path}:{page_num}:{chunk_num}"
-
-                json_pages.append(
-                    {
-                        "id": chunk_id,
-                        "page_number": page_num,
-                        "chunk_number": chunk_num,
-                        "content": doc.page_content,
-                        "source": file_path,
-                    }
-                )
-
             result = {
                 "file": file_path,
-                "total_chunks": len(self.pages),
-                "pages": json_pages,
+                "total_chunks": len(chunks),
+                "pages": chunks,
             }
 
             return Response.ok(result, "JSON conversion successful")
@@ -6,6 +6,10 @@ class ImageReadersInterface(ABC):
     def extract_images(self, file_path: str):
         pass
 
+    @abstractmethod
+    def iter_images(self, file_path: str):
+        pass
+
     @abstractmethod
     def convert_to_base64(self, image):
         pass
@@ -6,10 +6,14 @@ class PdfReadersInterface(ABC):
     def extract_data(self, file_path: str):
         pass
 
+    @abstractmethod
+    def iter_chunks(self, file_path: str):
+        pass
+
     @abstractmethod
     def clean_text(self, text: str) -> str:
         pass
 
     @abstractmethod
-    def convet_to_json(self, file_path: str):
+    def convet_to_json(self, file_path: str, chunks: list):
         pass
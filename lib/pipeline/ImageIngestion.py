@@ -0,0 +1,243 @@
+from lib.common.logger import Logger
+from lib.common.metrics import Metrics
+from lib.common.responses import Response
+from lib.documents.ChunkRecord import ChunkRecord
+from lib.documents.ImageReader import ImageReader
+from lib.Services.EmbeddingBatcher import EmbeddingBatcher
+from lib.Services.LLMService import LLMService
+from lib.database.interfaces.VectorStoreInterface import VectorStoreInterface
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.scheduler.RequestScheduler import RequestScheduler
+
+# Gemini counts an image of up to 384x384 px as 258 input tokens; larger
+# images are tiled, so this is a lower bound used for rate limiting.
+IMAGE_TOKENS = 258
+
+
+class ImageIngestionStage:
+    """
+    Indexes page images next to the text chunks of a document.
+
+    Pages where PdfReader extracted fewer than `min_chars` characters
+    (scans, figures, tables) are rendered with ImageReader, described by a
+    vision model `batch_size` pages per request, and the descriptions are
+    embedded and written like chunks. Each record's id carries the render
+    hash, so a page whose render is already indexed skips the vision call,
+    and its metadata links back to the text chunks on and around the page.
+    """
+
+    def __init__(
+        self,
+        image_reader: ImageReader,
+        llm_service: LLMService,
+        embedding_batcher: EmbeddingBatcher,
+        vector_store: VectorStoreInterface,
+        min_chars: int = 200,
+        batch_size: int = 4,
+        scheduler: RequestScheduler | None = None,
+    ):
+        self.service_name = "ImageIngestionStage"
+        self.image_reader = image_reader
+        self.llm_service = llm_service
+        self.embedding_batcher = embedding_batcher
+        self.vector_store = vector_store
+        self.min_chars = min_chars
+        self.batch_size = batch_size
+        self.scheduler = scheduler
+
+    # ---------------------------------------------------
+    # Page selection
+    # ---------------------------------------------------
+    def low_text_pages(self, chunks: list, page_count: int) -> list[int]:
+        """
+        Pages with fewer than `min_chars` characters of text. Consecutive
+        chunks of a page repeat the splitter's overlap; it is counted once.
+        """
+        chars = {}
+        previous = None
+        for chunk in chunks:
+            page = chunk["page_number"]
+            content = chunk["content"]
+            counted = chars.get(page, 0)
+            shared = 0
+            if (
+                counted < self.min_chars
+                and previous is not None
+                and previous["page_number"] == page
+            ):
+                shared = self.overlap(previous["content"], content)
+            chars[page] = counted + len(content) - shared
+            previous = chunk
+        return [
+            page
+            for page in range(1, page_count + 1)
+            if chars.get(page, 0) < self.min_chars
+        ]
+
+    @staticmethod
+    def overlap(left: str, right: str) -> int:
+        """Length of the longest end of `left` that `right` starts with"""
+        for size in range(min(len(left), len(right)), 0, -1):
+            if left.endswith(right[:size]):
+                return size
+        return 0
+
+    @staticmethod
+    def linked_chunks(chunks: list, page: int) -> list[str]:
+        """Chunks on the page, or the nearest chunk before and after it"""
+        on_page = [c["id"] for c in chunks if c["page_number"] == page]
+        if on_page:
+            return on_page
+
+        before = [c for c in chunks if c["page_number"] < page]
+        after = [c for c in chunks if c["page_number"] > page]
+        linked = []
+        if before:
+            linked.append(before[-1]["id"])
+        if after:
+            linked.append(after[0]["id"])
+        return linked
+
+    # ---------------------------------------------------
+    # Process
+    # ---------------------------------------------------
+    @Metrics.traced("image_ingestion")
+    def process(self, document: dict) -> Response[dict]:
+        """
+        `document` is a PdfReader.extract_data result. Returns the records
+        to write, the stale image ids to delete and per-page counts.
+        """
+        try:
+            source = document["file"]
+            chunks = document["pages"]
+
+            page_count = self.image_reader.page_count(source)
+            pages = self.low_text_pages(chunks, page_count)
+
+            stored = {
+                chunk_id
+                for chunk_id in self.vector_store.stored_hashes(source)
+                if self.vector_store.is_image_id(chunk_id)
+            }
+
+            current = set()
+            records = []
+            # Pages whose new description did not make it into the store keep
+            # their old record until a later run succeeds.
+            failed_pages = set()
+            unchanged = 0
+            batch = []
+
+            # Images stream from the reader; only one batch of data URIs is
+            # held at a time.
+            images = self.image_reader.iter_images(source, pages=pages) if pages else []
+            for image in images:
+                page = image["page_number"]
+                image_id = self.vector_store.image_id(source, page, image["hash"])
+                current.add(image_id)
+                if image_id in stored:
+                    unchanged += 1
+                    continue
+
+                batch.append((image_id, page, image["data_uri"]))
+                if len(batch) >= self.batch_size:
+                    self._describe_batch(source, chunks, batch, records, failed_pages)
+                    batch = []
+
+            if batch:
+                self._describe_batch(source, chunks, batch, records, failed_pages)
+
+            embedded, embed_failed = self.embed(records)
+            failed_pages.update(self.page_of(chunk_id) for chunk_id in embed_failed)
+
+            removed = [
+                chunk_id
+                for chunk_id in stored
+                if chunk_id not in current
+                and self.page_of(chunk_id) not in failed_pages
+            ]
+
+            Metrics.count("image_records_total", len(embedded), result="described")
+            Metrics.count("image_records_total", unchanged, result="unchanged")
+
+            return Response.ok(
+                {
+                    "records": embedded,
+                    "removed": removed,
+                    "pages": len(pages),
+                    "described": len(embedded),
+                    "unchanged": unchanged,
+                    "failed": len(failed_pages),
+                },
+                "Page images processed successfully",
+            )
+
+        except Exception as e:
+            Logger.error(
+                f"Image ingestion failed for {document.get('file')}: {e}",
+                self.service_name,
+            )
+            return Response.fail(str(e), "Failed to ingest page images")
+
+    def _describe_batch(
+        self,
+        source: str,
+        chunks: list,
+        batch: list[tuple],
+        records: list,
+        failed_pages: set,
+    ):
+        described = self.describe([uri for _, _, uri in batch])
+        if not described.success:
+            Logger.error(
+                f"Vision batch failed for {source}: {described.error}",
+                self.service_name,
+            )
+            failed_pages.update(page for _, page, _ in batch)
+            return
+
+        for (image_id, page, _), text in zip(batch, described.data):
+            records.append(
+                ChunkRecord(
+                    source,
+                    page,
+                    0,
+                    f"[Page {page} image] {text}",
+                    image_id,
+                    extra={
+                        "kind": "image",
+                        "linked_chunks": ",".join(self.linked_chunks(chunks, page)),
+                    },
+                )
+            )
+
+    def describe(self, images: list[str]) -> Response[list[str]]:
+        if self.scheduler is None:
+            return self.llm_service.describe_pages(images)
+        return self.scheduler.run(
+            self.llm_service.describe_pages,
+            images,
+            token_cost=IMAGE_TOKENS * len(images),
+        )
+
+    def embed(self, records: list[ChunkRecord]) -> tuple[EmbeddingBatch, list[str]]:
+        """Embedded records and the ids that could not be embedded"""
+        if not records:
+            return EmbeddingBatch.empty(), []
+
+        built = self.embedding_batcher.build_batches(records)
+        if not built.success:
+            raise Exception(built.error)
+
+        failed = list(built.data["rejected"])
+        batches = []
+        for batch in built.data["batches"]:
+            result = self.embedding_batcher.embed_batch(batch)
+            failed.extend(result["failed"])
+            batches.append(result["batch"])
+        return EmbeddingBatch.concat(batches), failed
+
+    @staticmethod
+    def page_of(image_id: str) -> int:
+        # "<source>:<page>:image:<hash>"; the source may contain colons.
+        return int(image_id.rsplit(":", 3)[-3])
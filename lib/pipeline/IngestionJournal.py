@@ -0,0 +1,229 @@
+from lib.common.logger import Logger
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from array import array
+import hashlib
+import sqlite3
+import threading
+import time
+
+# Chunk states, in the order a chunk moves through them.
+PARSED = "parsed"
+EMBEDDED = "embedded"
+STORED = "stored"
+FAILED = "failed"
+
+# Ids per lookup query; SQLite builds before 3.32 allow 999 parameters.
+_SELECT_SIZE = 500
+
+
+class IngestionJournal:
+    """
+    Write-ahead journal of per-chunk ingestion state, in a local SQLite file.
+
+    A run records every parsed chunk of a source with its content hash.
+    Each embedding is written to the journal (as a packed float32 blob) as
+    soon as it arrives, before the chunk reaches the vector store. Chunks
+    are marked stored once their batch is synced, which also drops the
+    blob. Failed chunks keep their error and attempt count.
+
+    After a crash the vector store still holds every flushed batch, so its
+    diff only returns the rest. `recover` returns the chunks among them
+    that were embedded but not yet stored, so they are written without
+    being embedded again. Everything else still pending, including earlier
+    failures, is embedded again.
+    """
+
+    def __init__(self, path: str = "./ingest_journal.db"):
+        self.service_name = "IngestionJournal"
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "source TEXT NOT NULL, chunk_id TEXT NOT NULL, "
+            "content_hash TEXT NOT NULL, state TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, error TEXT, "
+            "tokens INTEGER, embedding BLOB, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (source, chunk_id))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    # ---------------------------------------------------
+    # Run
+    # ---------------------------------------------------
+    def begin(self, source: str, chunks: list | None = None) -> dict:
+        """
+        Start a run over `source` and return the state counts left by the
+        previous run. With `chunks`, also record them and drop the entries
+        of chunks no longer in the document; a run that streams its chunks
+        calls `record` for every batch and `prune` at the end instead.
+        """
+        with self._lock:
+            before = self._counts(source)
+        if chunks is not None:
+            self.record(source, chunks)
+            self.prune(source, {chunk["id"] for chunk in chunks})
+        return before
+
+    def record(self, source: str, chunks: list):
+        """Record parsed chunks; entries whose content changed start over as parsed"""
+        now = time.time()
+        hashes = {chunk["id"]: self.content_hash(chunk["content"]) for chunk in chunks}
+        with self._lock:
+            previous = dict(
+                self._select(source, list(hashes), "chunk_id, content_hash")
+            )
+            rows = [
+                (source, chunk_id, content_hash, PARSED, now)
+                for chunk_id, content_hash in hashes.items()
+                if previous.get(chunk_id) != content_hash
+            ]
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chunks "
+                    "(source, chunk_id, content_hash, state, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def prune(self, source: str, chunk_ids: set[str]):
+        """Drop the entries of `source` whose id is not in `chunk_ids`"""
+        with self._lock:
+            stale = [
+                (source, chunk_id)
+                for (chunk_id,) in self._conn.execute(
+                    "SELECT chunk_id FROM chunks WHERE source = ?", (source,)
+                )
+                if chunk_id not in chunk_ids
+            ]
+            with self._conn:
+                self._conn.executemany(
+                    "DELETE FROM chunks WHERE source = ? AND chunk_id = ?", stale
+                )
+
+    def recover(self, source: str, chunks: list) -> EmbeddingBatch:
+        """Chunks of `chunks` embedded by an earlier run but never stored"""
+        hashes = {chunk["id"]: self.content_hash(chunk["content"]) for chunk in chunks}
+        with self._lock:
+            rows = self._select(
+                source,
+                list(hashes),
+                "chunk_id, content_hash, tokens, embedding",
+                state=EMBEDDED,
+            )
+
+        found = {
+            chunk_id: (tokens, blob)
+            for chunk_id, content_hash, tokens, blob in rows
+            if hashes.get(chunk_id) == content_hash
+        }
+        recovered = [chunk for chunk in chunks if chunk["id"] in found]
+        if not recovered:
+            return EmbeddingBatch.empty()
+        return EmbeddingBatch(
+            recovered,
+            [array("f", found[chunk["id"]][1]) for chunk in recovered],
+            [found[chunk["id"]][0] or 0 for chunk in recovered],
+        )
+
+    def _select(
+        self, source: str, chunk_ids: list[str], columns: str, state: str | None = None
+    ) -> list[tuple]:
+        """`columns` of the entries of `chunk_ids`, in chunks of bound parameters"""
+        rows = []
+        condition = "" if state is None else " AND state = ?"
+        for start in range(0, len(chunk_ids), _SELECT_SIZE):
+            ids = chunk_ids[start : start + _SELECT_SIZE]
+            params = [source, *ids] + ([] if state is None else [state])
+            rows.extend(
+                self._conn.execute(
+                    f"SELECT {columns} FROM chunks WHERE source = ? AND chunk_id IN "
+                    f"({','.join('?' * len(ids))}){condition}",
+                    params,
+                ).fetchall()
+            )
+        return rows
+
+    # ---------------------------------------------------
+    # State changes
+    # ---------------------------------------------------
+    def mark_embedded(self, source: str, batch: EmbeddingBatch):
+        now = time.time()
+        rows = [
+            (EMBEDDED, int(tokens), embedding.tobytes(), now, source, chunk.id)
+            for chunk, embedding, tokens in zip(
+                batch.chunks, batch.embeddings, batch.tokens
+            )
+        ]
+        self._update(
+            "UPDATE chunks SET state = ?, tokens = ?, embedding = ?, error = NULL, "
+            "updated_at = ? WHERE source = ? AND chunk_id = ?",
+            rows,
+        )
+
+    def mark_stored(self, source: str, chunk_ids: list[str]):
+        now = time.time()
+        self._update(
+            "UPDATE chunks SET state = ?, embedding = NULL, error = NULL, "
+            "updated_at = ? WHERE source = ? AND chunk_id = ?",
+            [(STORED, now, source, chunk_id) for chunk_id in chunk_ids],
+        )
+
+    def mark_failed(self, source: str, chunk_ids: list[str], error: str):
+        now = time.time()
+        self._update(
+            "UPDATE chunks SET state = ?, attempts = attempts + 1, error = ?, "
+            "updated_at = ? WHERE source = ? AND chunk_id = ?",
+            [(FAILED, error, now, source, chunk_id) for chunk_id in chunk_ids],
+        )
+
+    def _update(self, sql: str, rows: list[tuple]):
+        if not rows:
+            return
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.executemany(sql, rows)
+            except sqlite3.Error as e:
+                Logger.warning(f"Failed to update journal: {e}", self.service_name)
+
+    # ---------------------------------------------------
+    # Stats
+    # ---------------------------------------------------
+    def summary(self, source: str) -> dict:
+        """Chunk counts per state"""
+        with self._lock:
+            return self._counts(source)
+
+    def failures(self, source: str) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id, attempts, error FROM chunks "
+                "WHERE source = ? AND state = ? ORDER BY chunk_id",
+                (source, FAILED),
+            ).fetchall()
+        return [
+            {"id": chunk_id, "attempts": attempts, "error": error}
+            for chunk_id, attempts, error in rows
+        ]
+
+    def _counts(self, source: str) -> dict:
+        counts = {PARSED: 0, EMBEDDED: 0, STORED: 0, FAILED: 0}
+        counts.update(
+            self._conn.execute(
+                "SELECT state, COUNT(*) FROM chunks WHERE source = ? GROUP BY state",
+                (source,),
+            ).fetchall()
+        )
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,352 @@
+from lib.common.logger import Logger
+from lib.common.metrics import Metrics
+from lib.common.responses import Response
+from lib.documents.PdfReader import PdfReader
+from lib.Services.EmbeddingBatcher import EmbeddingBatcher
+from lib.database.interfaces.VectorStoreInterface import VectorStoreInterface
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.pipeline.ImageIngestion import ImageIngestionStage
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable
+import glob
+import queue
+import threading
+
+_DONE = object()
+
+
+def parse_pdf(
+    file_path: str, chunk_size: int, chunk_overlap: int, length_unit: str = "chars"
+) -> Response[dict]:
+    """Process-pool entry point: load, clean, split and token-count one PDF"""
+    reader = PdfReader(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_unit=length_unit
+    )
+    return reader.extract_data(file_path)
+
+
+class IngestionPipeline:
+    """
+    Streaming multi-document ingestion.
+
+    parse (process pool) -> embed (thread pool)  -> write (single batched writer)
+                         -> images (thread pool) ->
+
+    With an ImageIngestionStage, every parsed document also goes to image
+    workers that describe and embed its low-text pages while the text is
+    being embedded; both feed the same writer.
+
+    Every stage hands work to the next through a bounded queue, so a slow
+    stage blocks the one in front of it instead of letting parsed documents
+    or embeddings pile up in memory.
+    """
+
+    def __init__(
+        self,
+        embedding_batcher: EmbeddingBatcher,
+        vector_store: VectorStoreInterface,
+        chunk_size: int = 1200,
+        chunk_overlap: int = 250,
+        length_unit: str = "chars",
+        parse_workers: int = 4,
+        embed_workers: int = 5,
+        max_pending_docs: int = 8,
+        write_batch_size: int = 500,
+        on_sync: Callable[[EmbeddingBatch, list[str]], None] | None = None,
+        image_stage: ImageIngestionStage | None = None,
+        image_workers: int = 2,
+    ):
+        self.service_name = "IngestionPipeline"
+        self.embedding_batcher = embedding_batcher
+        self.vector_store = vector_store
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_unit = length_unit
+        self.parse_workers = parse_workers
+        self.embed_workers = embed_workers
+        self.max_pending_docs = max_pending_docs
+        self.write_batch_size = write_batch_size
+        # Called with the written records and deleted ids of every batch.
+        self.on_sync = on_sync
+        self.image_stage = image_stage
+        self.image_workers = image_workers if image_stage else 0
+
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+
+    # ---------------------------------------------------
+    # Run
+    # ---------------------------------------------------
+    def run(self, pattern: str) -> Response[dict]:
+        files = sorted(glob.glob(pattern, recursive=True))
+        if not files:
+            return Response.fail(f"No files match {pattern}", "Nothing to ingest")
+
+        Logger.info(f"Ingesting {len(files)} PDFs from {pattern}", self.service_name)
+
+        self.stats = {
+            "documents": 0,
+            "failed_documents": 0,
+            "chunks": 0,
+            "embedded": 0,
+            "reused": 0,
+            "unchanged": 0,
+            "failed_chunks": 0,
+            "written": 0,
+            "deleted": 0,
+            "failed_writes": 0,
+            "failed_deletes": 0,
+            "tokens": 0,
+        }
+        if self.image_stage:
+            self.stats.update(
+                {
+                    "image_pages": 0,
+                    "images_described": 0,
+                    "images_unchanged": 0,
+                    "images_failed": 0,
+                    "failed_image_documents": 0,
+                }
+            )
+
+        doc_queue = queue.Queue(maxsize=self.max_pending_docs)
+        image_queue = queue.Queue(maxsize=self.max_pending_docs)
+        write_queue = queue.Queue(maxsize=self.max_pending_docs)
+
+        writer = threading.Thread(target=self._write_stage, args=(write_queue,))
+        writer.start()
+
+        embedders = [
+            threading.Thread(target=self._embed_stage, args=(doc_queue, write_queue))
+            for _ in range(self.embed_workers)
+        ]
+        for embedder in embedders:
+            embedder.start()
+
+        describers = [
+            threading.Thread(target=self._image_stage, args=(image_queue, write_queue))
+            for _ in range(self.image_workers)
+        ]
+        for describer in describers:
+            describer.start()
+
+        try:
+            self._parse_stage(files, doc_queue, image_queue)
+        finally:
+            for _ in embedders:
+                doc_queue.put(_DONE)
+            for _ in describers:
+                image_queue.put(_DONE)
+            for worker in embedders + describers:
+                worker.join()
+
+            write_queue.put(_DONE)
+            writer.join()
+
+        Logger.info(f"Ingestion finished: {self.stats}", self.service_name)
+        lost = self.stats["failed_writes"] + self.stats["failed_deletes"]
+        if lost:
+            # Partial result: the stats still say what was written.
+            return Response(
+                success=False,
+                message="Directory ingested with lost writes",
+                data=self.stats,
+                error=f"{lost} records or deletions could not be written",
+            )
+        return Response.ok(self.stats, "Directory ingested successfully")
+
+    # ---------------------------------------------------
+    # Stage 1: parse + clean + split (CPU bound)
+    # ---------------------------------------------------
+    def _parse_stage(
+        self, files: list[str], doc_queue: queue.Queue, image_queue: queue.Queue
+    ):
+        remaining = iter(files)
+        in_flight = {}
+
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+
+            def submit_next():
+                file_path = next(remaining, None)
+                if file_path is None:
+                    return
+                future = executor.submit(
+                    parse_pdf,
+                    file_path,
+                    self.chunk_size,
+                    self.chunk_overlap,
+                    self.length_unit,
+                )
+                in_flight[future] = file_path
+
+            for _ in range(self.parse_workers):
+                submit_next()
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = Response.fail(str(e), "Failed to process PDF")
+
+                    if result.success:
+                        # Blocks when the embedding stage falls behind.
+                        doc_queue.put(result.data)
+                        if self.image_workers:
+                            image_queue.put(result.data)
+                    else:
+                        Logger.error(
+                            f"Skipping {file_path}: {result.error}", self.service_name
+                        )
+                        self._count("failed_documents")
+
+                    submit_next()
+
+    # ---------------------------------------------------
+    # Stage 2: diff + embed (I/O bound)
+    # ---------------------------------------------------
+    def _embed_stage(self, doc_queue: queue.Queue, write_queue: queue.Queue):
+        while True:
+            document = doc_queue.get()
+            if document is _DONE:
+                return
+
+            try:
+                self._embed_document(document, write_queue)
+            except Exception as e:
+                Logger.error(
+                    f"Embedding stage failed for {document['file']}: {e}",
+                    self.service_name,
+                )
+                self._count("failed_documents")
+
+    def _embed_document(self, document: dict, write_queue: queue.Queue):
+        """
+        Diff and embed a document in groups of whole pages, handing each
+        group's records to the writer as soon as it is embedded. Removals
+        are only known, and written, once every group was diffed.
+        """
+        chunks = document["pages"]
+        differ = self.vector_store.differ(document["file"])
+        groups = PdfReader.group_pages(
+            chunks, min_chunks=self.embedding_batcher.max_batch_size
+        )
+
+        for group in groups:
+            part = differ.update(group)
+            batches = [part["reused"]]
+            failed = 0
+
+            if part["pending"]:
+                built = self.embedding_batcher.build_batches(part["pending"])
+                if not built.success:
+                    raise Exception(built.error)
+
+                failed += len(built.data["rejected"])
+
+                for batch in built.data["batches"]:
+                    result = self.embedding_batcher.embed_batch(batch)
+                    failed += len(result["failed"])
+                    batches.append(result["batch"])
+
+            records = EmbeddingBatch.concat(batches)
+            if len(records):
+                write_queue.put((records, []))
+
+            self._count("embedded", len(records) - len(part["reused"]))
+            self._count("reused", len(part["reused"]))
+            self._count("unchanged", len(part["unchanged"]))
+            self._count("failed_chunks", failed)
+            self._count("tokens", records.total_tokens)
+
+        removed = differ.removed()
+        if removed:
+            write_queue.put((EmbeddingBatch.empty(), removed))
+
+        self._count("documents")
+        self._count("chunks", len(chunks))
+
+    # ---------------------------------------------------
+    # Stage 2b: page images (runs beside the text embedders)
+    # ---------------------------------------------------
+    def _image_stage(self, image_queue: queue.Queue, write_queue: queue.Queue):
+        while True:
+            document = image_queue.get()
+            if document is _DONE:
+                return
+
+            res = self.image_stage.process(document)
+            if not res.success:
+                Logger.error(
+                    f"Image stage failed for {document['file']}: {res.error}",
+                    self.service_name,
+                )
+                self._count("failed_image_documents")
+                continue
+
+            if len(res.data["records"]) or res.data["removed"]:
+                write_queue.put((res.data["records"], res.data["removed"]))
+
+            self._count("image_pages", res.data["pages"])
+            self._count("images_described", res.data["described"])
+            self._count("images_unchanged", res.data["unchanged"])
+            self._count("images_failed", res.data["failed"])
+
+    # ---------------------------------------------------
+    # Stage 3: batched writer
+    # ---------------------------------------------------
+    def _write_stage(self, write_queue: queue.Queue):
+        batches = []
+        pending = 0
+        removed = []
+
+        while True:
+            item = write_queue.get()
+            if item is not _DONE:
+                batches.append(item[0])
+                pending += len(item[0])
+                removed.extend(item[1])
+
+            if item is _DONE or pending + len(removed) >= self.write_batch_size:
+                if pending or removed:
+                    self._flush(batches, pending, removed)
+                    batches = []
+                    pending = 0
+                    removed = []
+
+            if item is _DONE:
+                return
+
+    def _flush(self, batches: list, pending: int, removed: list[str]):
+        """
+        Write one batch. Never raises: the writer must keep draining the
+        queue, or the embed and image workers block on it forever.
+        """
+        try:
+            records = EmbeddingBatch.concat(batches)
+            res = self.vector_store.sync(records, removed)
+            if not res.success:
+                raise Exception(res.error)
+        except Exception as e:
+            Logger.error(
+                f"Failed to write {pending} records / {len(removed)} deletions: {e}",
+                self.service_name,
+            )
+            self._count("failed_writes", pending)
+            self._count("failed_deletes", len(removed))
+            return
+
+        self._count("written", len(records))
+        self._count("deleted", len(removed))
+        if self.on_sync:
+            try:
+                self.on_sync(records, removed)
+            except Exception as e:
+                Logger.error(f"on_sync failed: {e}", self.service_name)
+
+    def _count(self, key: str, value: int = 1):
+        with self._stats_lock:
+            self.stats[key] += value
+        Metrics.count(f"pipeline_{key}_total", value)
@@ -0,0 +1,195 @@
+from lib.common.responses import Response
+from lib.common.logger import Logger
+from lib.common.metrics import Metrics
+from typing import Callable
+import re
+
+_WORD = re.compile(r"\w+")
+
+
+class ContextAssembler:
+    """
+    Turns retrieved chunks into the context that is sent to the LLM.
+
+    1. Merge neighbouring chunks (same source and page, consecutive
+       chunk numbers) and drop the text they share because of the
+       splitter's chunk_overlap.
+    2. Drop near-duplicates by word-shingle Jaccard similarity.
+    3. Pack the survivors, best-ranked first, into a token budget.
+
+    Chunks whose metadata has a token_count (stored at split time) are not
+    encoded again; other chunks and merged passages are counted with
+    `count_tokens` (e.g. the tiktoken encoder that EmbeddingService already
+    loads).
+    """
+
+    def __init__(
+        self,
+        count_tokens: Callable[[str], int],
+        token_budget: int = 3000,
+        max_overlap: int = 400,
+        min_overlap: int = 20,
+        duplicate_threshold: float = 0.85,
+        shingle_size: int = 3,
+    ):
+        self.service_name = "ContextAssembler"
+        self.count_tokens = count_tokens
+        self.token_budget = token_budget
+        self.max_overlap = max_overlap
+        self.min_overlap = min_overlap
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+
+    # ---------------------------------------------------
+    # Assemble
+    # ---------------------------------------------------
+    @Metrics.traced("context_assembly")
+    def assemble(
+        self, ids: list[str], documents: list[str], metadatas: list[dict]
+    ) -> Response[dict]:
+        """
+        `ids`, `documents` and `metadatas` are one query's retrieval results
+        in relevance order. Returns the packed context and token accounting.
+        """
+        try:
+            passages = [
+                {
+                    "ids": [i],
+                    "content": d,
+                    "metadata": m or {},
+                    "rank": rank,
+                    "tokens": (m or {}).get("token_count"),
+                }
+                for rank, (i, d, m) in enumerate(zip(ids, documents, metadatas))
+            ]
+            tokens_before = sum(self.passage_tokens(p) for p in passages)
+
+            merged = self.merge_adjacent(passages)
+            unique = self.drop_duplicates(merged)
+
+            packed = []
+            used = 0
+            for passage in unique:
+                tokens = self.passage_tokens(passage)
+                if used + tokens > self.token_budget:
+                    continue
+                packed.append(passage)
+                used += tokens
+
+            result = {
+                "chunks": [p["content"] for p in packed],
+                "ids": [i for p in packed for i in p["ids"]],
+                "tokens_before": tokens_before,
+                "tokens_after": used,
+                "tokens_saved": tokens_before - used,
+                "merged": len(passages) - len(merged),
+                "duplicates": len(merged) - len(unique),
+                "over_budget": len(unique) - len(packed),
+            }
+
+            Metrics.count("context_tokens_total", tokens_before, phase="retrieved")
+            Metrics.count("context_tokens_total", used, phase="sent")
+            Metrics.count("context_chunks_merged_total", result["merged"])
+            Metrics.count("context_duplicates_dropped_total", result["duplicates"])
+
+            Logger.info(
+                f"Context: {len(documents)} chunks -> {len(packed)} passages, "
+                f"{tokens_before} -> {used} tokens ({result['tokens_saved']} saved)",
+                self.service_name,
+            )
+            return Response.ok(result, "Context assembled successfully")
+
+        except Exception as e:
+            Logger.error(f"Context assembly failed: {e}", self.service_name)
+            return Response.fail(str(e), "Failed to assemble context")
+
+    def passage_tokens(self, passage: dict) -> int:
+        if passage["tokens"] is None:
+            passage["tokens"] = self.count_tokens(passage["content"])
+        return passage["tokens"]
+
+    # ---------------------------------------------------
+    # Merge
+    # ---------------------------------------------------
+    def merge_adjacent(self, passages: list[dict]) -> list[dict]:
+        groups = {}
+        for passage in passages:
+            metadata = passage["metadata"]
+            # Page-image descriptions never merge into the page's text.
+            key = (
+                metadata.get("source"),
+                metadata.get("page_number"),
+                metadata.get("kind", "text"),
+            )
+            groups.setdefault(key, []).append(passage)
+
+        merged = []
+        for (source, page, _), group in groups.items():
+            if source is None or page is None:
+                merged.extend(group)
+                continue
+
+            group.sort(key=lambda p: p["metadata"].get("chunk_number", 0))
+            current = group[0]
+            for passage in group[1:]:
+                previous_number = current["metadata"].get("chunk_number", 0)
+                if passage["metadata"].get("chunk_number", 0) == previous_number + 1:
+                    current = self._join(current, passage)
+                else:
+                    merged.append(current)
+                    current = passage
+            merged.append(current)
+
+        # A merged passage keeps the best rank of its members.
+        merged.sort(key=lambda p: p["rank"])
+        return merged
+
+    def _join(self, first: dict, second: dict) -> dict:
+        overlap = self.overlap_length(first["content"], second["content"])
+        separator = "" if overlap else " "
+        return {
+            "ids": first["ids"] + second["ids"],
+            "content": first["content"] + separator + second["content"][overlap:],
+            # The chunk number of the tail lets a third neighbour chain on.
+            "metadata": second["metadata"],
+            "rank": min(first["rank"], second["rank"]),
+            # Overlap removal changes the tokenization; counted when packed.
+            "tokens": None,
+        }
+
+    def overlap_length(self, first: str, second: str) -> int:
+        """
+        Longest suffix of `first` that is also a prefix of `second`. Matches
+        shorter than min_overlap are coincidences, not splitter overlap.
+        """
+        longest = min(len(first), len(second), self.max_overlap)
+        for size in range(longest, self.min_overlap - 1, -1):
+            if first.endswith(second[:size]):
+                return size
+        return 0
+
+    # ---------------------------------------------------
+    # Deduplicate
+    # ---------------------------------------------------
+    def shingles(self, text: str) -> set:
+        words = _WORD.findall(text.lower())
+        n = self.shingle_size
+        if len(words) < n:
+            return {tuple(words)}
+        return {tuple(words[i : i + n]) for i in range(len(words) - n + 1)}
+
+    def drop_duplicates(self, passages: list[dict]) -> list[dict]:
+        kept = []
+        kept_shingles = []
+        for passage in passages:
+            current = self.shingles(passage["content"])
+            duplicate = False
+            for other in kept_shingles:
+                union = len(current | other)
+                if union and len(current & other) / union >= self.duplicate_threshold:
+                    duplicate = True
+                    break
+            if not duplicate:
+                kept.append(passage)
+                kept_shingles.append(current)
+        return kept
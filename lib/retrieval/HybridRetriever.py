@@ -0,0 +1,104 @@
+from lib.common.responses import Response
+from lib.common.logger import Logger
+from lib.common.metrics import Metrics
+from lib.database.interfaces.VectorStoreInterface import VectorStoreInterface
+from lib.database.LexicalIndex import BM25Index
+
+
+class HybridRetriever:
+    """
+    Fuses dense vector search with BM25 using reciprocal rank fusion.
+
+    Each retriever contributes weight / (rrf_k + rank) per chunk, so exact
+    term matches (drug names, acronyms) surface even when their embedding
+    similarity is mediocre. Results keep the vector store query layout
+    (one inner list per query) so callers can swap it in for `get`.
+    """
+
+    def __init__(
+        self,
+        vector_store: VectorStoreInterface,
+        lexical_index: BM25Index,
+        rrf_k: int = 60,
+        vector_weight: float = 1.0,
+        lexical_weight: float = 1.0,
+        candidates: int = 20,
+    ):
+        self.service_name = "HybridRetriever"
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.rrf_k = rrf_k
+        self.vector_weight = vector_weight
+        self.lexical_weight = lexical_weight
+        self.candidates = candidates
+
+    @Metrics.traced("hybrid_retrieve")
+    def retrieve(
+        self, question: str, query_embedding, n_results: int = 3
+    ) -> Response[dict]:
+        return self.retrieve_many([question], [query_embedding], n_results)
+
+    def retrieve_many(
+        self, questions: list[str], query_embeddings: list, n_results: int = 3
+    ) -> Response[dict]:
+        """
+        Fused results for many questions: one dense query for all of them,
+        BM25 per question and one fetch for chunks only BM25 found.
+        """
+        try:
+            depth = max(self.candidates, n_results)
+
+            dense = self.vector_store.get_many(query_embeddings, n_results=depth)
+            if not dense.success:
+                return dense
+
+            documents = {}
+            metadatas = {}
+            ranked = []
+            for q, question in enumerate(questions):
+                dense_ids = dense.data["ids"][q] or []
+                lexical = self.lexical_index.search(question, depth)
+
+                fused = {}
+                for rank, chunk_id in enumerate(dense_ids):
+                    fused[chunk_id] = self.vector_weight / (self.rrf_k + rank + 1)
+                for rank, (chunk_id, _) in enumerate(lexical):
+                    fused[chunk_id] = fused.get(chunk_id, 0.0) + self.lexical_weight / (
+                        self.rrf_k + rank + 1
+                    )
+
+                best = sorted(fused, key=fused.get, reverse=True)[:n_results]
+                ranked.append((best, fused))
+
+                for n, chunk_id in enumerate(dense_ids):
+                    documents[chunk_id] = dense.data["documents"][q][n]
+                    metadatas[chunk_id] = dense.data["metadatas"][q][n]
+
+            missing = list(
+                {
+                    chunk_id: None
+                    for best, _ in ranked
+                    for chunk_id in best
+                    if chunk_id not in documents
+                }
+            )
+            if missing:
+                stored = self.vector_store.get_by_ids(missing)
+                if not stored.success:
+                    return stored
+                for n, chunk_id in enumerate(stored.data["ids"]):
+                    documents[chunk_id] = stored.data["documents"][n]
+                    metadatas[chunk_id] = stored.data["metadatas"][n]
+
+            result = {"ids": [], "documents": [], "metadatas": [], "scores": []}
+            for best, fused in ranked:
+                best = [chunk_id for chunk_id in best if chunk_id in documents]
+                result["ids"].append(best)
+                result["documents"].append([documents[i] for i in best])
+                result["metadatas"].append([metadatas[i] for i in best])
+                result["scores"].append([fused[i] for i in best])
+
+            return Response.ok(result, "data retrieved successfully")
+        except Exception as e:
+            Logger.error(f"Hybrid retrieval failed: {e}", self.service_name)
+            return Response.fail(str(e), "failed to retrieve data")
@@ -0,0 +1,141 @@
+from lib.common.responses import Response
+from lib.common.logger import Logger
+from lib.common.metrics import Metrics
+from lib.retrieval.interfaces.RerankerInterface import RerankerInterface
+import threading
+import time
+
+
+class RerankStage:
+    """
+    Re-orders over-fetched retrieval results with a RerankerInterface.
+
+    The first stage returns `candidates` chunks per question; they are
+    scored in batches of `batch_size`, best first-stage rank first, and the
+    best `n_results` are kept. Before every batch after the first the stage
+    checks the latency budget: if the time spent plus the slowest batch so
+    far would pass `budget_ms`, the remaining candidates are not scored and
+    follow the scored ones in their first-stage order.
+
+    Results keep the vector store query layout; "scores" holds the rerank
+    scores (None for unscored candidates) and "rerank" one stats dict per
+    question. `stats` accumulates the same numbers over all queries.
+    """
+
+    def __init__(
+        self,
+        reranker: RerankerInterface,
+        candidates: int = 20,
+        batch_size: int = 16,
+        budget_ms: float = 50.0,
+    ):
+        self.service_name = "RerankStage"
+        self.reranker = reranker
+        self.candidates = candidates
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+
+        self.stats = {
+            "queries": 0,
+            "candidates": 0,
+            "scored": 0,
+            "cutoffs": 0,
+            "seconds": 0.0,
+        }
+        self._stats_lock = threading.Lock()
+
+    # ---------------------------------------------------
+    # Rerank
+    # ---------------------------------------------------
+    def rerank(self, question: str, results: dict, n_results: int = 3):
+        return self.rerank_many([question], results, n_results)
+
+    def rerank_many(
+        self, questions: list[str], results: dict, n_results: int = 3
+    ) -> Response[dict]:
+        """`results` holds one inner list per question, as from get_many"""
+        try:
+            reranked = {
+                "ids": [],
+                "documents": [],
+                "metadatas": [],
+                "scores": [],
+                "rerank": [],
+            }
+            for q, question in enumerate(questions):
+                ids = results["ids"][q] or []
+                documents = results["documents"][q] or []
+                metadatas = results.get("metadatas")
+                metadatas = list(metadatas[q] or []) if metadatas else []
+                metadatas += [{}] * (len(ids) - len(metadatas))
+
+                order, scores, stats = self.rank(question, documents)
+                order = order[:n_results]
+                reranked["ids"].append([ids[i] for i in order])
+                reranked["documents"].append([documents[i] for i in order])
+                reranked["metadatas"].append([metadatas[i] for i in order])
+                reranked["scores"].append([scores.get(i) for i in order])
+                reranked["rerank"].append(stats)
+
+            return Response.ok(reranked, "results reranked successfully")
+        except Exception as e:
+            Logger.error(f"Reranking failed: {e}", self.service_name)
+            return Response.fail(str(e), "failed to rerank results")
+
+    def rank(
+        self, question: str, documents: list[str]
+    ) -> tuple[list[int], dict[int, float], dict]:
+        """
+        Candidate positions in reranked order, the scores of the scored
+        ones and the query's timing and cutoff stats
+        """
+        with Metrics.span("rerank") as span:
+            started = time.perf_counter()
+            budget = self.budget_ms / 1000
+            slowest = 0.0
+            scores = {}
+            cutoff = False
+
+            for start in range(0, len(documents), self.batch_size):
+                elapsed = time.perf_counter() - started
+                if scores and elapsed + slowest > budget:
+                    cutoff = True
+                    break
+
+                batch = documents[start : start + self.batch_size]
+                batch_started = time.perf_counter()
+                batch_scores = self.reranker.score(question, batch)
+                slowest = max(slowest, time.perf_counter() - batch_started)
+                for n, score in enumerate(batch_scores, start):
+                    scores[n] = float(score)
+
+            scored = sorted(scores, key=lambda n: -scores[n])
+            order = scored + [n for n in range(len(documents)) if n not in scores]
+            elapsed = time.perf_counter() - started
+
+            stats = {
+                "candidates": len(documents),
+                "scored": len(scores),
+                "cutoff": cutoff,
+                "elapsed_ms": round(elapsed * 1000, 3),
+            }
+            span.set("candidates", len(documents))
+            span.set("scored", len(scores))
+            span.set("cutoff", cutoff)
+
+        self._record(stats, elapsed)
+        return order, scores, stats
+
+    def _record(self, stats: dict, elapsed: float):
+        with self._stats_lock:
+            self.stats["queries"] += 1
+            self.stats["candidates"] += stats["candidates"]
+            self.stats["scored"] += stats["scored"]
+            self.stats["cutoffs"] += int(stats["cutoff"])
+            self.stats["seconds"] += elapsed
+
+        Metrics.observe("stage_duration_seconds", elapsed, stage="rerank")
+        Metrics.count("rerank_candidates_total", stats["candidates"])
+        Metrics.count("rerank_scored_total", stats["scored"])
+        if stats["cutoff"]:
+            Metrics.count("rerank_cutoffs_total")
@@ -0,0 +1,151 @@
+from lib.retrieval.interfaces.RerankerInterface import RerankerInterface
+from lib.database.LexicalIndex import BM25Index, tokenize
+import numpy as np
+import threading
+
+
+class LexicalReranker(RerankerInterface):
+    """
+    CPU-only query / passage scorer. Like a cross-encoder it reads the
+    question and each passage together rather than comparing two vectors:
+
+    - BM25 of the question terms in the passage, with idf from `index` (the
+      app's BM25Index) or, without one, from the candidates themselves;
+    - phrase matches: question bigrams that occur side by side in the
+      passage, weighted by their idf;
+    - coverage: the share of the question's idf mass the passage contains.
+
+    Passages are tokenized once and mapped to question-term ids; every
+    feature of the batch is then a handful of numpy operations over the
+    concatenated ids.
+    """
+
+    def __init__(
+        self,
+        index: BM25Index | None = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+        phrase_weight: float = 0.5,
+        coverage_weight: float = 2.0,
+    ):
+        self.service_name = "LexicalReranker"
+        self.index = index
+        self.k1 = k1
+        self.b = b
+        self.phrase_weight = phrase_weight
+        self.coverage_weight = coverage_weight
+
+    def score(self, query: str, documents: list[str]) -> np.ndarray:
+        query_tokens = tokenize(query)
+        terms = list(dict.fromkeys(query_tokens))
+        if not terms or not documents:
+            return np.zeros(len(documents), dtype=np.float32)
+
+        vocab = {term: n for n, term in enumerate(terms)}
+        n_terms = len(terms)
+        n_docs = len(documents)
+
+        # Question-term id of every passage token, -1 for other words.
+        lengths = np.empty(n_docs, dtype=np.int64)
+        ids = []
+        for d, document in enumerate(documents):
+            tokens = tokenize(document)
+            lengths[d] = len(tokens)
+            ids.extend(vocab.get(token, -1) for token in tokens)
+        ids = np.array(ids, dtype=np.int64)
+        doc_of = np.repeat(np.arange(n_docs), lengths)
+
+        hit = ids >= 0
+        tf = np.bincount(
+            doc_of[hit] * n_terms + ids[hit], minlength=n_docs * n_terms
+        ).reshape(n_docs, n_terms)
+
+        if self.index is not None and self.index.live_docs:
+            idf = self.index.idf(terms)
+        else:
+            df = (tf > 0).sum(axis=0)
+            idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+        avg_length = max(lengths.mean(), 1.0)
+        norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+        bm25 = (idf * tf * (self.k1 + 1) / (tf + norm[:, None])).sum(axis=1)
+
+        coverage = ((tf > 0) * idf).sum(axis=1) / max(idf.sum(), 1e-6)
+
+        phrase = np.zeros(n_docs)
+        pairs = {
+            vocab[left] * n_terms + vocab[right]
+            for left, right in zip(query_tokens, query_tokens[1:])
+        }
+        if pairs and len(ids) > 1:
+            left, right = ids[:-1], ids[1:]
+            adjacent = (left >= 0) & (right >= 0) & (doc_of[:-1] == doc_of[1:])
+            adjacent &= np.isin(left * n_terms + right, list(pairs))
+            phrase = np.bincount(
+                doc_of[:-1][adjacent],
+                weights=(idf[left[adjacent]] + idf[right[adjacent]]),
+                minlength=n_docs,
+            )
+
+        scores = (
+            bm25
+            + self.phrase_weight * np.log1p(phrase)
+            + self.coverage_weight * coverage
+        )
+        return scores.astype(np.float32)
+
+
+class CrossEncoderReranker(RerankerInterface):
+    """
+    A small sentence-transformers cross-encoder on CPU. Needs the optional
+    `sentence-transformers` package; the model is loaded on first use.
+    """
+
+    def __init__(
+        self,
+        model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        batch_size: int = 32,
+        device: str = "cpu",
+    ):
+        self.service_name = "CrossEncoderReranker"
+        self.model_name = model
+        self.batch_size = batch_size
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+
+                self._model = CrossEncoder(self.model_name, device=self.device)
+            return self._model
+
+    def score(self, query: str, documents: list[str]) -> np.ndarray:
+        if not documents:
+            return np.zeros(0, dtype=np.float32)
+        scores = self.model.predict(
+            [(query, document) for document in documents],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+        )
+        return np.asarray(scores, dtype=np.float32)
+
+
+def create_reranker(
+    name: str = "lexical", index: BM25Index | None = None
+) -> RerankerInterface:
+    """
+    Build a reranker by name: "lexical", or "cross-encoder" optionally
+    followed by a model, e.g. "cross-encoder:BAAI/bge-reranker-base".
+    """
+    name, _, model = name.partition(":")
+    if name == "lexical":
+        return LexicalReranker(index)
+
+    if name == "cross-encoder":
+        return CrossEncoderReranker(model) if model else CrossEncoderReranker()
+
+    raise ValueError(f"Unknown reranker: {name}")
@@ -0,0 +1,9 @@
+from abc import ABC, abstractmethod
+
+
+class RerankerInterface(ABC):
+
+    @abstractmethod
+    def score(self, query: str, documents: list[str]):
+        """One relevance score per document, higher is better"""
+        pass
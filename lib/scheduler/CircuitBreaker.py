@@ -0,0 +1,63 @@
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures. While
+    open, calls fail fast for `reset_timeout` seconds; then a single trial
+    call is let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(f"Circuit open, retry in {remaining:.1f}s")
+                self.state = self.HALF_OPEN
+            if self._trial_running:
+                raise CircuitOpenError("Circuit half-open, trial call in progress")
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release_trial(self):
+        """
+        Forget an interrupted call (KeyboardInterrupt, task cancellation)
+        without counting it either way, so a half-open circuit lets the
+        next call through as its trial.
+        """
+        with self._lock:
+            self._trial_running = False
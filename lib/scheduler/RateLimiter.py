@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate_per_minute`.
+
+    `reserve` takes the tokens immediately and returns how long the caller
+    must wait before using them, so concurrent callers queue up one behind
+    the other instead of all waking at the same moment.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float = 1) -> float:
+        """Take `amount` tokens; returns the seconds to wait before using them"""
+        # A request larger than the bucket could never be served otherwise.
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def drain(self):
+        """Empty the bucket, e.g. after the provider answered with a 429"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 0.0)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits for one provider.
+
+    Either limit can be None to disable it. `pause` blocks every caller
+    until a deadline, which is how a provider's Retry-After is honoured.
+    """
+
+    def __init__(
+        self, requests_per_minute: float | None, tokens_per_minute: float | None
+    ):
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int = 0) -> float:
+        wait = 0.0
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        with self._lock:
+            wait = max(wait, self.paused_until - time.monotonic())
+        return max(wait, 0.0)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        if self.requests:
+            self.requests.drain()
+
+    def acquire(self, tokens: int = 0) -> float:
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        wait = self.reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
@@ -0,0 +1,344 @@
+from lib.common.logger import Logger
+from lib.common.responses import Response
+from lib.common.metrics import Metrics
+from lib.scheduler.RateLimiter import RateLimiter
+from lib.scheduler.CircuitBreaker import CircuitBreaker, CircuitOpenError
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable
+import asyncio
+import random
+import re
+import threading
+import time
+
+_TRANSIENT = re.compile(
+    r"\b429\b|rate.?limit|resource.?exhausted|quota|too many requests|"
+    r"timed? ?out|deadline.?exceeded|service unavailable|\bunavailable\b|"
+    r"overloaded|\b50[0234]\b",
+    re.IGNORECASE,
+)
+_RATE_LIMITED = re.compile(
+    r"\b429\b|rate.?limit|resource.?exhausted|quota|too many requests",
+    re.IGNORECASE,
+)
+# Transport and provider exception classes (builtins, httpx / requests,
+# google.api_core) that mean "try again later", matched by class name so
+# none of those packages has to be imported here.
+_TRANSIENT_TYPES = {
+    "ConnectError",
+    "ConnectTimeout",
+    "ReadTimeout",
+    "Timeout",
+    "TimeoutException",
+    "DeadlineExceeded",
+    "ServiceUnavailable",
+    "TooManyRequests",
+    "ResourceExhausted",
+    "InternalServerError",
+}
+_RETRY_AFTER = re.compile(
+    r"retry(?:[ _-]?after|[ _-]?delay| in)\D{0,12}?(\d+(?:\.\d+)?)", re.IGNORECASE
+)
+
+
+@dataclass
+class CallContext:
+    """State of one scheduled call, visible to the code it runs"""
+
+    service_name: str
+    token_cost: int = 0
+    attempt: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+
+_current_call: ContextVar[CallContext | None] = ContextVar(
+    "scheduler_call", default=None
+)
+
+
+def is_transient(error: Exception | str | None) -> bool:
+    """
+    Whether a failure is worth retrying: a 429 / 5xx / timeout reported by
+    the provider, or a connection or timeout error by exception type. Local
+    failures (bad input, a missing file, a tokenizer that cannot load) are
+    not, even when their message mentions a connection.
+    """
+    if error is None:
+        return False
+    if isinstance(error, str):
+        return bool(_TRANSIENT.search(error))
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    if any(cls.__name__ in _TRANSIENT_TYPES for cls in type(error).__mro__):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and (status == 429 or 500 <= status < 600):
+        return True
+    return bool(_TRANSIENT.search(str(error)))
+
+
+def current_call() -> CallContext | None:
+    """The CallContext of the scheduled call running in this thread or task"""
+    return _current_call.get()
+
+
+class RequestScheduler:
+    """
+    Rate-aware front door for one remote provider.
+
+    Every call reserves one request and `token_cost` tokens from the
+    provider's per-minute buckets, waits for a concurrency slot and goes
+    through a circuit breaker. Transient failures (see `is_transient`:
+    connection / timeout exceptions, or errors that report a 429, timeout
+    or 5xx) are retried with
+    exponential backoff and full jitter; a 429 also pauses every other
+    caller, honouring the provider's retry delay when it reports one.
+
+    State lives on the scheduler and on a per-call ContextVar, so one
+    instance can be shared by threads (`run`) and asyncio tasks (`arun`).
+    """
+
+    def __init__(
+        self,
+        service_name: str = "RequestScheduler",
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        max_concurrency: int = 5,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.service_name = service_name
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "failures": 0,
+            "rejected": 0,
+            "waited_seconds": 0.0,
+        }
+
+    # ---------------------------------------------------
+    # Sync front-end
+    # ---------------------------------------------------
+    def run(
+        self,
+        func: Callable,
+        *args,
+        token_cost: int = 0,
+        service_name: str = None,
+        **kwargs,
+    ):
+        """Call func(*args, **kwargs) under the limits, retrying transient errors"""
+        context = CallContext(service_name or self.service_name, token_cost)
+        reset = _current_call.set(context)
+        try:
+            for attempt in range(self.max_retries + 1):
+                context.attempt = attempt
+                self._acquire(token_cost)
+                try:
+                    result = func(*args, **kwargs)
+                    error = None
+                except Exception as e:
+                    result = None
+                    error = e
+                except BaseException:
+                    self.breaker.release_trial()
+                    raise
+                finally:
+                    self._slots.release()
+
+                delay = self._after_call(context, result, error)
+
+                if delay is None:
+                    if error is not None:
+                        raise error
+                    return result
+                time.sleep(delay)
+        finally:
+            _current_call.reset(reset)
+
+    @contextmanager
+    def limit(self, token_cost: int = 0):
+        """Hold one rate-limited, breaker-guarded slot without retries"""
+        self._acquire(token_cost)
+        try:
+            yield
+        except Exception:
+            self.breaker.record_failure()
+            self._count("failures")
+            raise
+        except BaseException:
+            # KeyboardInterrupt / CancelledError: neither outcome, but a
+            # half-open trial must not stay marked as running.
+            self.breaker.release_trial()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._slots.release()
+
+    def _acquire(self, token_cost: int):
+        self._admit()
+        self._count("waited_seconds", self.limiter.acquire(token_cost))
+        self._slots.acquire()
+
+    # ---------------------------------------------------
+    # Async front-end
+    # ---------------------------------------------------
+    async def arun(
+        self,
+        func: Callable,
+        *args,
+        token_cost: int = 0,
+        service_name: str = None,
+        **kwargs,
+    ):
+        """Async `run`: awaits coroutine functions, runs others in a thread"""
+        context = CallContext(service_name or self.service_name, token_cost)
+        reset = _current_call.set(context)
+        try:
+            for attempt in range(self.max_retries + 1):
+                context.attempt = attempt
+                await self._aacquire(token_cost)
+                try:
+                    if asyncio.iscoroutinefunction(func):
+                        result = await func(*args, **kwargs)
+                    else:
+                        result = await asyncio.to_thread(func, *args, **kwargs)
+                    error = None
+                except Exception as e:
+                    result = None
+                    error = e
+                except BaseException:
+                    self.breaker.release_trial()
+                    raise
+                finally:
+                    self._slots.release()
+
+                delay = self._after_call(context, result, error)
+
+                if delay is None:
+                    if error is not None:
+                        raise error
+                    return result
+                await asyncio.sleep(delay)
+        finally:
+            _current_call.reset(reset)
+
+    @asynccontextmanager
+    async def alimit(self, token_cost: int = 0):
+        """
+        Async `limit`, e.g. around a streamed response that cannot be
+        retried once tokens have been yielded.
+        """
+        await self._aacquire(token_cost)
+        try:
+            yield
+        except Exception:
+            self.breaker.record_failure()
+            self._count("failures")
+            raise
+        except BaseException:
+            # KeyboardInterrupt / CancelledError: neither outcome, but a
+            # half-open trial must not stay marked as running.
+            self.breaker.release_trial()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._slots.release()
+
+    async def _aacquire(self, token_cost: int):
+        self._admit()
+        self._count("waited_seconds", await self.limiter.aacquire(token_cost))
+        # Poll instead of blocking a worker thread, so cancellation cannot
+        # leave a slot acquired.
+        while not self._slots.acquire(blocking=False):
+            await asyncio.sleep(0.02)
+
+    # ---------------------------------------------------
+    # Outcome handling
+    # ---------------------------------------------------
+    def _admit(self):
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._count("rejected")
+            raise
+        self._count("calls")
+
+    def _after_call(self, context: CallContext, result, error: Exception | None):
+        """
+        Record the outcome of one attempt. Returns the seconds to wait before
+        retrying, or None when the result (or error) should be handed back.
+        """
+        if error is not None:
+            message = str(error) or type(error).__name__
+            transient = is_transient(error)
+        elif isinstance(result, Response) and not result.success:
+            message = result.error or result.message or ""
+            transient = is_transient(message)
+        else:
+            self.breaker.record_success()
+            return None
+
+        if not transient:
+            # Validation errors and local failures will not change on retry
+            # and say nothing about the provider's health.
+            self.breaker.record_success()
+            return None
+
+        self.breaker.record_failure()
+        self._count("failures")
+
+        if context.attempt >= self.max_retries:
+            Logger.error(f"Max retries reached: {message}", context.service_name)
+            return None
+
+        delay = self.backoff(context.attempt, message)
+        if _RATE_LIMITED.search(message):
+            self._count("rate_limited")
+            self.limiter.pause(delay)
+
+        self._count("retries")
+        Logger.warning(
+            f"Retry {context.attempt + 1}/{self.max_retries} in {delay:.2f}s "
+            f"after error: {message}",
+            context.service_name,
+        )
+        return delay
+
+    def backoff(self, attempt: int, message: str = "") -> float:
+        """Provider retry delay if the error names one, else full-jitter backoff"""
+        match = _RETRY_AFTER.search(message)
+        if match:
+            return min(float(match.group(1)), self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    # ---------------------------------------------------
+    # Stats
+    # ---------------------------------------------------
+    def _count(self, key: str, value: float = 1):
+        with self._stats_lock:
+            self._stats[key] += value
+        Metrics.count(f"scheduler_{key}_total", value, service=self.service_name)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["circuit"] = self.breaker.state
+        return stats
@@ -1,4 +1,5 @@
 import time
+import random
 import asyncio
 from lib.common.logger import Logger
 from typing import Callable
@@ -17,39 +18,37 @@ class AsyncWrapper:
         delay=1,
         **kwargs,
     ):
+        # Resolved per call: the wrapper is shared between threads, so the
+        # instance name must not be overwritten here.
+        service_name = service_name or self.service_name
         for attempt in range(max_retries + 1):
             try:
-                service_name = self.hanldel_change_service_name(service_name)
                 return func(*args, **kwargs)
             except Exception as e:
                 if attempt == max_retries:
-                    Logger.error(f"Max retries reached: {e}", self.service_name)
+                    Logger.error(f"Max retries reached: {e}", service_name)
                     raise
                 Logger.warning(
                     f"Retry {attempt + 1}/{max_retries} after error: {e}",
-                    self.service_name,
+                    service_name,
                 )
-                time.sleep(delay)
+                # Exponential backoff with full jitter keeps threads that
+                # failed together from retrying in lockstep.
+                time.sleep(random.uniform(0, delay * 2**attempt))
 
     async def async_wrapper(
         self, func: Callable, *args, service_name: str = None, **kwargs
     ):
+        service_name = service_name or self.service_name
         try:
-            service_name = self.hanldel_change_service_name(service_name)
             if asyncio.iscoroutinefunction(func):
                 return await func(*args, **kwargs)
             else:
-                return func(*args, **kwargs)
+                # Blocking calls (Chroma, sync SDKs) must not stall the loop.
+                return await asyncio.to_thread(func, *args, **kwargs)
         except Exception as e:
-            Logger.error(f"Error in async wrapper: {e}", self.service_name)
+            Logger.error(f"Error in async wrapper: {e}", service_name)
             raise
 
     def set_service_name(self, service_name: str):
         self.service_name = service_name
-
-    def hanldel_change_service_name(self, service_name):
-        if service_name == None:
-            return self.service_name
-        else:
-            self.service_name = service_name
-            return self.service_name
@@ -0,0 +1,382 @@
+"""
+Batch question answering over a JSONL file.
+
+Each input line is an object with a question (and optionally an id):
+
+    {"id": "q1", "question": "What is generative AI used for in triage?"}
+
+Questions are read in windows of `--window`. Per window all questions are
+embedded in a few batched requests, retrieved with one vector store query
+and answered by `--concurrency` LLM workers; the next window is embedded
+and retrieved while the previous one is still being answered. Every
+answer is appended to the output file as soon as it arrives, with its
+latency and token usage, so a crashed run resumes where it stopped:
+
+    python -m rag.batch_runner questions.jsonl --output answers.jsonl
+
+Ids already answered in the output are skipped; failed ones are retried.
+"""
+
+from lib.common.logger import Logger
+from lib.common.metrics import Metrics
+from lib.common.responses import Response
+from lib.common.env import load_env
+from rag.first_project import App
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+import argparse
+import json
+import os
+import threading
+import time
+
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances", "scores")
+
+
+class BatchQueryRunner:
+    def __init__(
+        self,
+        app: App,
+        output_path: str,
+        window: int = 256,
+        concurrency: int = 8,
+        n_results: int = 3,
+        embed_batch_size: int = 100,
+        max_question_tokens: int = 3000,
+        question_key: str = "question",
+        id_key: str = "id",
+    ):
+        self.service_name = "BatchQueryRunner"
+        self.app = app
+        self.output_path = output_path
+        self.window = window
+        self.concurrency = concurrency
+        self.n_results = n_results
+        self.embed_batch_size = embed_batch_size
+        self.max_question_tokens = max_question_tokens
+        self.question_key = question_key
+        self.id_key = id_key
+
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._output = None
+
+    # ---------------------------------------------------
+    # Resume
+    # ---------------------------------------------------
+    def load_done(self) -> set[str]:
+        """
+        Ids answered without error in an earlier run. A last line torn by a
+        crash is cut off so new records start on a fresh line.
+        """
+        if not os.path.exists(self.output_path):
+            return set()
+
+        with open(self.output_path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                Logger.warning(
+                    f"Dropping a partial line at the end of {self.output_path}",
+                    self.service_name,
+                )
+                f.truncate(end)
+
+        # The last record of an id wins, so a retried failure counts as done.
+        errors = {}
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            errors[str(record["id"])] = record.get("error")
+        return {item_id for item_id, error in errors.items() if error is None}
+
+    def iter_questions(self, input_path: str, done: set[str]) -> Iterator[dict]:
+        seen = set(done)
+        with open(input_path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    Logger.error(f"Skipping line {number}: {e}", self.service_name)
+                    continue
+                if not isinstance(row, dict) or self.question_key not in row:
+                    Logger.error(
+                        f"Skipping line {number}: no {self.question_key!r} field",
+                        self.service_name,
+                    )
+                    continue
+
+                item_id = str(row.get(self.id_key, f"line-{number}"))
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
+                yield {"id": item_id, "question": str(row[self.question_key]).strip()}
+
+    # ---------------------------------------------------
+    # Run
+    # ---------------------------------------------------
+    def run(self, input_path: str) -> Response[dict]:
+        try:
+            done = self.load_done()
+            self.stats = {
+                "skipped": len(done),
+                "answered": 0,
+                "cached": 0,
+                "failed": 0,
+                "embedding_tokens": 0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+            }
+            Logger.info(
+                f"Answering {input_path} into {self.output_path}, "
+                f"{len(done)} already answered",
+                self.service_name,
+            )
+
+            started = time.perf_counter()
+            # Bounds the LLM calls queued across windows, so reading ahead
+            # never holds more than one window of questions and contexts.
+            slots = threading.BoundedSemaphore(self.concurrency + self.window)
+
+            with open(self.output_path, "a", encoding="utf-8") as self._output:
+                with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                    window = []
+                    for item in self.iter_questions(input_path, done):
+                        window.append(item)
+                        if len(window) >= self.window:
+                            self._run_window(window, executor, slots)
+                            window = []
+                    if window:
+                        self._run_window(window, executor, slots)
+                self._sync()
+            self._output = None
+
+            elapsed = time.perf_counter() - started
+            total = self.stats["answered"] + self.stats["cached"]
+            self.stats["seconds"] = round(elapsed, 3)
+            self.stats["questions_per_second"] = round(total / elapsed, 2)
+
+            Logger.info(f"Batch finished: {self.stats}", self.service_name)
+            return Response.ok(self.stats, "Questions answered successfully")
+        except Exception as e:
+            Logger.error(f"Batch run failed: {e}", self.service_name)
+            return Response.fail(str(e), "Failed to answer questions")
+
+    def _run_window(
+        self,
+        items: list[dict],
+        executor: ThreadPoolExecutor,
+        slots: threading.BoundedSemaphore,
+    ):
+        with Metrics.span("batch_window") as span:
+            span.set("questions", len(items))
+            started = time.perf_counter()
+
+            items = self._embed(items, started)
+            if not items:
+                return
+
+            retrieve_started = time.perf_counter()
+            res = self.app.retrieve_many(
+                [item["question"] for item in items],
+                [item["vector"] for item in items],
+                n_results=self.n_results,
+            )
+            retrieve_ms = (time.perf_counter() - retrieve_started) * 1000
+
+            for q, item in enumerate(items):
+                item["timings"]["retrieve_ms"] = round(retrieve_ms, 1)
+                if res.success and res.data.get("rerank"):
+                    item["rerank"] = res.data["rerank"][q]
+                if not res.success:
+                    self._finish(item, error=res.error or "Retrieval failed")
+                    continue
+
+                results = {
+                    key: [res.data[key][q]] for key in RESULT_KEYS if res.data.get(key)
+                }
+                slots.acquire()
+                future = executor.submit(self._answer, item, results)
+                future.add_done_callback(lambda _: slots.release())
+
+        self._sync()
+
+    # ---------------------------------------------------
+    # Stages
+    # ---------------------------------------------------
+    def _embed(self, items: list[dict], started: float) -> list[dict]:
+        """Embed the window in batches; returns the items that got a vector"""
+        embedded = []
+        valid = []
+        for item in items:
+            item["started"] = started
+            item["timings"] = {}
+            item["tokens"] = {"embedding": self.app.count_tokens(item["question"])}
+            if not item["question"]:
+                self._finish(item, error="Empty question")
+            elif item["tokens"]["embedding"] > self.max_question_tokens:
+                self._finish(
+                    item,
+                    error=f"Question too long: {item['tokens']['embedding']} tokens",
+                )
+            else:
+                valid.append(item)
+
+        for i in range(0, len(valid), self.embed_batch_size):
+            batch = valid[i : i + self.embed_batch_size]
+            batch_started = time.perf_counter()
+            res = self.app.embeddingScheduler.run(
+                self.app.embeddingService.embed_queries,
+                [item["question"] for item in batch],
+                max_tokens=self.max_question_tokens,
+                token_counts=[item["tokens"]["embedding"] for item in batch],
+                token_cost=sum(item["tokens"]["embedding"] for item in batch),
+            )
+            embed_ms = (time.perf_counter() - batch_started) * 1000
+
+            for n, item in enumerate(batch):
+                item["timings"]["embed_ms"] = round(embed_ms, 1)
+                if res.success:
+                    item["vector"] = res.data["embeddings"][n]
+                    embedded.append(item)
+                else:
+                    self._finish(item, error=res.error or "Embedding failed")
+
+        return embedded
+
+    def _answer(self, item: dict, results: dict):
+        try:
+            if not (results["documents"][0] or []):
+                self._finish(item, error="No relevant chunks found")
+                return
+
+            question = item["question"]
+            chunk_ids, context_key = self.app.answer_context(results)
+            item["chunk_ids"] = chunk_ids
+
+            cached = self.app.answerCache.lookup(question, item["vector"], context_key)
+            if cached:
+                self._finish(item, answer=cached["answer"], cached=cached["tier"])
+                return
+
+            context, context_tokens = self.app.build_context(results)
+            llm_started = time.perf_counter()
+            res = self.app.llmScheduler.run(
+                self.app.llmService.generate_answer,
+                context,
+                question,
+                token_cost=context_tokens + item["tokens"]["embedding"],
+            )
+            item["timings"]["llm_ms"] = round(
+                (time.perf_counter() - llm_started) * 1000, 1
+            )
+
+            if not res.success:
+                self._finish(item, error=res.error or "Unknown LLM error")
+                return
+
+            item["tokens"]["input"] = res.data["input_tokens"]
+            item["tokens"]["output"] = res.data["output_tokens"]
+            self.app.answerCache.store(
+                question, item["vector"], context_key, chunk_ids, res.data["answer"]
+            )
+            self._finish(item, answer=res.data["answer"])
+        except Exception as e:
+            Logger.error(f"Question {item['id']} failed: {e}", self.service_name)
+            self._finish(item, error=str(e))
+
+    # ---------------------------------------------------
+    # Output
+    # ---------------------------------------------------
+    def _finish(
+        self,
+        item: dict,
+        answer: str | None = None,
+        error: str | None = None,
+        cached: str | None = None,
+    ):
+        record = {
+            "id": item["id"],
+            "question": item["question"],
+            "answer": answer,
+            "error": error,
+            "chunk_ids": item.get("chunk_ids", []),
+            "cached": cached,
+            "latency_ms": round((time.perf_counter() - item["started"]) * 1000, 1),
+            "timings": item["timings"],
+            "tokens": item["tokens"],
+        }
+        if "rerank" in item:
+            record["rerank"] = item["rerank"]
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._write_lock:
+            self._output.write(line)
+            self._output.flush()
+
+        result = "error" if error else ("cached" if cached else "answered")
+        with self._stats_lock:
+            self.stats["failed" if error else result] += 1
+            self.stats["embedding_tokens"] += item["tokens"].get("embedding", 0)
+            self.stats["input_tokens"] += item["tokens"].get("input", 0)
+            self.stats["output_tokens"] += item["tokens"].get("output", 0)
+        Metrics.count("batch_questions_total", result=result)
+        Metrics.observe("batch_question_seconds", record["latency_ms"] / 1000)
+
+    def _sync(self):
+        """Flush answered lines to disk once per window"""
+        if self._output is None:
+            return
+        with self._write_lock:
+            self._output.flush()
+            os.fsync(self._output.fileno())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", help="JSONL file with one question per line")
+    parser.add_argument("--output", default="results.jsonl")
+    parser.add_argument("--window", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--n-results", type=int, default=3)
+    parser.add_argument("--question-key", default="question")
+    parser.add_argument("--id-key", default="id")
+    args = parser.parse_args()
+
+    load_env()
+    Metrics.configure_from_env()
+    app = App(
+        "pdfs/generative_ai_healthcare_guide.pdf",
+        vector_store=os.getenv("VECTOR_STORE", "chroma"),
+        compression=os.getenv("VECTOR_COMPRESSION") or None,
+        reranker=os.getenv("RERANKER") or None,
+        rerank_candidates=int(os.getenv("RERANK_CANDIDATES", 20)),
+        rerank_budget_ms=float(os.getenv("RERANK_BUDGET_MS", 50)),
+        ivf_lists=int(os.getenv("IVF_LISTS", 256)),
+        ivf_nprobe=int(os.getenv("IVF_NPROBE", 8)),
+        ivf_rerank_factor=int(os.getenv("IVF_RERANK_FACTOR", 4)),
+    )
+    runner = BatchQueryRunner(
+        app,
+        args.output,
+        window=args.window,
+        concurrency=args.concurrency,
+        n_results=args.n_results,
+        question_key=args.question_key,
+        id_key=args.id_key,
+    )
+
+    res = runner.run(args.input)
+    if not res.success:
+        print(res.error)
+        raise SystemExit(1)
+    print(json.dumps(res.data, indent=2))
+
+
+if __name__ == "__main__":
+    main()
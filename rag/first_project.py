@@ -1,29 +1,282 @@
-from lib.Services.LLMService import LLMService
 from lib.common.logger import Logger
+from lib.common.metrics import Metrics
+from lib.common.env import load_env
+from lib.common.responses import Response
 from lib.wrappers.AsyncWrapper import AsyncWrapper
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from lib.Services.EmbeddingService import EmbeddingService
-from lib.documents.PdfReader import PdfReader
-from lib.database.ChormaDB import ChromaDB
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.scheduler.RequestScheduler import RequestScheduler
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import asyncio
 import json
+import os
+import queue
+import threading
+
+_DONE = object()
 
 
 class App:
-    def __init__(self, file_path: str):
-        self.pdfReader = PdfReader(chunk_size=1200, chunk_overlap=250)
+    """
+    Terminal RAG app. Subsystems (PDF reader, embedding client, vector
+    store, lexical index, LLM client, ...) are imported and built on first
+    use, so the menu shows without loading Chroma, LangChain or tiktoken.
+    `warm_up` builds the query path in the background ahead of the first
+    question.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        vector_store: str = "chroma",
+        hybrid: bool = True,
+        context_budget: int = 3000,
+        multimodal: bool = False,
+        compression: str | None = None,
+        reranker: str | None = None,
+        rerank_candidates: int = 20,
+        rerank_budget_ms: float = 50.0,
+        ivf_lists: int = 256,
+        ivf_nprobe: int = 8,
+        ivf_rerank_factor: int = 4,
+    ):
+        load_env()
         self.file_path = file_path
-        self.embeddingService = EmbeddingService()
-        self.chromaDB = ChromaDB()
+        self.vector_store_backend = vector_store
+        self.hybrid = hybrid
+        self.context_budget = context_budget
+        # Also describe and index low-text pages (figures, scans) on ingest.
+        self.multimodal = multimodal
+        # EmbeddingCodec spec for the numpy store, e.g. "int8:768".
+        self.compression = compression
+        # Over-fetch `rerank_candidates` chunks and rerank them ("lexical" or
+        # "cross-encoder[:<model>]") within `rerank_budget_ms`.
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.rerank_budget_ms = rerank_budget_ms
+        # IVF store: lists of a newly trained index, lists scanned per query
+        # and candidates re-ranked per result.
+        self.ivf_lists = ivf_lists
+        self.ivf_nprobe = ivf_nprobe
+        self.ivf_rerank_factor = ivf_rerank_factor
+        self._init_lock = threading.RLock()
+        self._warm_thread = None
+
+        # Both schedulers are shared by every thread and task of the app, so
+        # together they stay under the provider quotas.
+        self.embeddingScheduler = RequestScheduler(
+            "EmbeddingService",
+            requests_per_minute=float(os.getenv("EMBEDDING_RPM", 1500)),
+            tokens_per_minute=float(os.getenv("EMBEDDING_TPM", 1_000_000)),
+            max_concurrency=5,
+        )
+        self.llmScheduler = RequestScheduler(
+            "LLMService",
+            requests_per_minute=float(os.getenv("LLM_RPM", 60)),
+            tokens_per_minute=float(os.getenv("LLM_TPM", 250_000)),
+            max_concurrency=4,
+        )
         self.wrapper = AsyncWrapper(service_name="App")
-        self.llmService = LLMService()
+
+    # ---------------------------------------------------
+    # Lazy subsystems
+    # ---------------------------------------------------
+    def _lazy(self, name: str, factory):
+        """Build a subsystem once, even when worker threads ask for it together"""
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            pass
+        with self._init_lock:
+            if name not in self.__dict__:
+                with Metrics.span("app_init", subsystem=name.lstrip("_")):
+                    self.__dict__[name] = factory()
+            return self.__dict__[name]
+
+    @property
+    def pdfReader(self):
+        from lib.documents.PdfReader import PdfReader
+
+        return self._lazy(
+            "_pdfReader",
+            lambda: PdfReader(
+                chunk_size=1200,
+                chunk_overlap=250,
+                workers=int(os.getenv("PDF_PARSE_WORKERS", 1)),
+            ),
+        )
+
+    @property
+    def embeddingService(self):
+        from lib.Services.EmbeddingService import EmbeddingService
+
+        return self._lazy("_embeddingService", EmbeddingService)
+
+    @property
+    def embeddingBatcher(self):
+        from lib.Services.EmbeddingBatcher import EmbeddingBatcher
+
+        return self._lazy(
+            "_embeddingBatcher",
+            lambda: EmbeddingBatcher(
+                self.embeddingService, scheduler=self.embeddingScheduler
+            ),
+        )
+
+    @property
+    def vectorStore(self):
+        from lib.database.VectorStoreFactory import create_vector_store
+
+        return self._lazy(
+            "_vectorStore",
+            lambda: create_vector_store(
+                self.vector_store_backend,
+                compression=self.compression,
+                n_lists=self.ivf_lists,
+                nprobe=self.ivf_nprobe,
+                rerank_factor=self.ivf_rerank_factor,
+            ),
+        )
+
+    @property
+    def lexicalIndex(self):
+        from lib.database.LexicalIndex import BM25Index
+
+        return self._lazy("_lexicalIndex", BM25Index)
+
+    @property
+    def retriever(self):
+        from lib.retrieval.HybridRetriever import HybridRetriever
+
+        return self._lazy(
+            "_retriever",
+            lambda: (
+                HybridRetriever(self.vectorStore, self.lexicalIndex)
+                if self.hybrid
+                else None
+            ),
+        )
+
+    @property
+    def rerankStage(self):
+        from lib.retrieval.RerankStage import RerankStage
+        from lib.retrieval.Rerankers import create_reranker
+
+        return self._lazy(
+            "_rerankStage",
+            lambda: (
+                RerankStage(
+                    create_reranker(self.reranker, self.lexicalIndex),
+                    candidates=self.rerank_candidates,
+                    budget_ms=self.rerank_budget_ms,
+                )
+                if self.reranker
+                else None
+            ),
+        )
+
+    @property
+    def contextAssembler(self):
+        from lib.retrieval.ContextAssembler import ContextAssembler
+
+        return self._lazy(
+            "_contextAssembler",
+            lambda: ContextAssembler(
+                self.count_tokens, token_budget=self.context_budget
+            ),
+        )
+
+    @property
+    def answerCache(self):
+        from lib.cache.AnswerCache import AnswerCache
+
+        return self._lazy("_answerCache", AnswerCache)
+
+    @property
+    def ingestionJournal(self):
+        from lib.pipeline.IngestionJournal import IngestionJournal
+
+        return self._lazy("_ingestionJournal", IngestionJournal)
+
+    @property
+    def llmService(self):
+        from lib.Services.LLMService import LLMService
+
+        return self._lazy("_llmService", LLMService)
+
+    @property
+    def imageReader(self):
+        from lib.documents.ImageReader import ImageReader
+
+        return self._lazy(
+            "_imageReader", lambda: ImageReader(image_format="JPEG", max_size=1536)
+        )
+
+    @property
+    def imageStage(self):
+        from lib.pipeline.ImageIngestion import ImageIngestionStage
+
+        return self._lazy(
+            "_imageStage",
+            lambda: ImageIngestionStage(
+                self.imageReader,
+                self.llmService,
+                self.embeddingBatcher,
+                self.vectorStore,
+                scheduler=self.llmScheduler,
+            ),
+        )
+
+    def warm_up(self, background: bool = True):
+        """
+        Build everything a question needs (embedding client and tokenizer,
+        vector store, lexical index, LLM client). In the background the menu
+        stays responsive; anything not ready yet is built on first use.
+        """
+
+        def build():
+            try:
+                with Metrics.span("app_warm_up"):
+                    self.embeddingService.embeddings
+                    self.embeddingService.enc
+                    self.retriever
+                    self.vectorStore
+                    self.rerankStage
+                    self.contextAssembler
+                    self.answerCache
+                    self.llmService.model
+            except Exception as e:
+                Logger.warning(f"Warm-up failed, continuing lazily: {e}", "App")
+
+        if not background:
+            build()
+            return
+
+        self._warm_thread = threading.Thread(
+            target=build, name="app-warm-up", daemon=True
+        )
+        self._warm_thread.start()
+
+    def close(self):
+        """Checkpoint the stores that were opened"""
+        for name in ("_vectorStore", "_lexicalIndex"):
+            store = self.__dict__.get(name)
+            if store is None:
+                continue
+            res = store.checkpoint()
+            if not res.success:
+                Logger.error(res.error or f"Failed to checkpoint {name}", "App")
 
     def embed_chunk(self, chunk):
         try:
-            res = self.wrapper.retry(
+            tokens = chunk.get("token_count")
+            if tokens is None:
+                tokens = self.count_tokens(chunk["content"])
+            res = self.embeddingScheduler.run(
                 self.embeddingService.embed_query,
                 chunk["content"],
                 max_tokens=3000,
-                service_name="EmbeddingService",
+                tokens=tokens,
+                token_cost=tokens,
             )
 
             if not res.success:
@@ -34,77 +287,441 @@ class App:
                 "App",
             )
 
+            return self.vectorStore.to_record(
+                chunk, res.data["embedding"], res.data["tokens_used"]
+            )
+
+        except Exception as e:
+            Logger.error(
+                f"Fatal embedding error for chunk {chunk['id']}: {e}",
+                "App",
+            )
+            return None
+
+    def embed_batch(self, batch):
+        try:
+            # Retries and rate limits are handled by the batcher's scheduler.
+            return self.embeddingBatcher.embed_batch(batch)
+        except Exception as e:
+            Logger.error(f"Fatal embedding error for batch: {e}", "App")
             return {
-                "id": chunk["id"],
-                "embedding": res.data["embedding"],
-                "content": chunk["content"],
-                "metadata": {
-                    "page_number": chunk["page_number"],
-                    "chunk_number": chunk["chunk_number"],
-                    "source": chunk["source"],
-                },
-                "tokens": res.data["tokens_used"],
+                "batch": EmbeddingBatch.empty(),
+                "failed": [chunk["id"] for chunk, _ in batch],
+                "requests": 1,
             }
 
+    def iter_embeddings(self, groups, batched: bool = True, max_in_flight: int = 10):
+        """
+        Embed chunks on 5 worker threads, yielding (EmbeddingBatch, failed
+        ids, error) as requests finish. `groups` is an iterable of chunk
+        lists, e.g. the pages of a document; the next group is only pulled
+        while fewer than `max_in_flight` requests are waiting, so parsing
+        stays just ahead of embedding. `batched` packs each group into
+        token-budgeted embed_documents requests; otherwise every chunk is
+        one request. Closing the generator cancels requests not yet started.
+        """
+        groups = iter(groups)
+        # future -> chunk id (None for a batch)
+        futures = {}
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            try:
+                while True:
+                    while len(futures) < max_in_flight:
+                        chunks = next(groups, None)
+                        if chunks is None:
+                            break
+                        if not batched:
+                            for chunk in chunks:
+                                future = executor.submit(self.embed_chunk, chunk)
+                                futures[future] = chunk["id"]
+                            continue
+
+                        built = self.embeddingBatcher.build_batches(chunks)
+                        if not built.success:
+                            yield (
+                                EmbeddingBatch.empty(),
+                                [chunk["id"] for chunk in chunks],
+                                built.error or "Failed to build batches",
+                            )
+                            continue
+                        if built.data["rejected"]:
+                            yield (
+                                EmbeddingBatch.empty(),
+                                list(built.data["rejected"]),
+                                "Chunk exceeds the request token limit",
+                            )
+                        for batch in built.data["batches"]:
+                            futures[executor.submit(self.embed_batch, batch)] = None
+
+                    if not futures:
+                        return
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        chunk_id = futures.pop(future)
+                        result = future.result()
+                        if batched:
+                            yield result["batch"], result["failed"], "Embedding failed"
+                        elif result:
+                            yield EmbeddingBatch.from_records([result]), [], None
+                        else:
+                            yield EmbeddingBatch.empty(), [chunk_id], "Embedding failed"
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def run_embeddings(self, batched: bool = True, flush_every: int = 500):
+        """
+        Process PDF chunks and generate embeddings.
+
+        Chunks stream from the reader in groups of whole pages, about one
+        request's worth each. Every group is journaled and diffed against
+        the store, and its pending chunks are submitted while later pages
+        are still being parsed; across groups only the ids seen are kept,
+        to find the removed chunks at the end.
+
+        Embeddings are journaled as they arrive and written to the vector
+        store every `flush_every` chunks, so a run that stops part way is
+        resumed by running it again: stored chunks are skipped, journaled
+        embeddings are written without another request and only the rest
+        (including failed chunks) is embedded.
+
+        With `multimodal`, the page images are described and embedded on a
+        worker thread meanwhile; their records are written once the text
+        is done, and both results are reported.
+        """
+        source = self.file_path
+        groups = self.pdfReader.iter_pages(
+            source, min_chunks=self.embeddingBatcher.max_batch_size
+        )
+        images = None
+        image_worker = None
+        if self.multimodal:
+            # One parse feeds both halves: the worker reads the pages, hands
+            # every group on to the text side and describes the page images
+            # once it has the whole document.
+            parsed = queue.Queue()
+            image_worker = ThreadPoolExecutor(max_workers=1)
+            images = image_worker.submit(
+                self.process_page_images, source, groups, parsed
+            )
+            groups = self._drain(parsed)
+
+        try:
+            text = self.embed_text(source, groups, batched, flush_every)
+            # The worker only reads and embeds; writes stay on this thread.
+            image = None if images is None else self.store_page_images(images.result())
+        finally:
+            if image_worker is not None:
+                image_worker.shutdown(wait=True)
+
+        if text is not None:
+            Logger.info(
+                f"Re-index of {text['chunks']} chunks: {text['embedded']} embedded "
+                f"({text['failed']} failed), {text['recovered']} recovered from "
+                f"the journal, {text['reused']} moved, {text['unchanged']} "
+                f"unchanged, {text['removed']} removed ({text['previous_failed']} "
+                f"failed in the last run); total tokens: {text['tokens']}",
+                "App",
+            )
+            if text["failed"]:
+                Logger.warning(
+                    f"{text['failed']} chunks failed and will be retried on the "
+                    "next run",
+                    "App",
+                )
+        if image is not None:
+            Logger.info(
+                f"Page images: {image['described']} described, "
+                f"{image['unchanged']} unchanged, {image['failed']} failed "
+                f"of {image['pages']} low-text pages",
+                "App",
+            )
+
+        cache = self.embeddingService.cache_stats()
+        Logger.info(
+            f"Embedding cache: {cache['hits']} hits / {cache['misses']} misses "
+            f"(hit rate {cache['hit_rate']:.0%})",
+            "App",
+        )
+
+    def embed_text(
+        self, source: str, groups, batched: bool, flush_every: int
+    ) -> dict | None:
+        """
+        The text half of run_embeddings, over page groups of `source`.
+        Returns its counts, or None when it stopped on an error (already
+        printed and logged).
+        """
+        journal = self.ingestionJournal
+        try:
+            differ = self.vectorStore.differ(source)
         except Exception as e:
+            print("Error:", e)
+            return None
+        previous = journal.begin(source)
+
+        counts = {"chunks": 0, "reused": 0, "recovered": 0, "unchanged": 0}
+        # Reused and recovered records of the groups planned so far.
+        ready = []
+
+        def plan(groups):
+            for chunks in groups:
+                journal.record(source, chunks)
+                part = differ.update(chunks)
+                journal.mark_stored(source, part["unchanged"])
+
+                pending = part["pending"]
+                recovered = journal.recover(source, pending)
+                if len(recovered):
+                    recovered_ids = set(recovered.ids)
+                    pending = [c for c in pending if c["id"] not in recovered_ids]
+
+                ready.extend((part["reused"], recovered))
+                counts["chunks"] += len(chunks)
+                counts["reused"] += len(part["reused"])
+                counts["recovered"] += len(recovered)
+                counts["unchanged"] += len(part["unchanged"])
+                yield pending
+
+        buffer = []
+        buffered = 0
+        embedded = 0
+        tokens = 0
+        failed = 0
+
+        batches = self.iter_embeddings(plan(groups), batched)
+        try:
+            for batch, failed_ids, error in batches:
+                journal.mark_embedded(source, batch)
+                journal.mark_failed(source, failed_ids, error)
+                buffer.extend(ready)
+                buffered += sum(len(b) for b in ready)
+                ready.clear()
+                buffer.append(batch)
+                buffered += len(batch)
+                embedded += len(batch)
+                tokens += batch.total_tokens
+                failed += len(failed_ids)
+
+                if buffered >= flush_every:
+                    if not self.store_embeddings(source, buffer, []):
+                        return None
+                    buffer = []
+                    buffered = 0
+        except Exception as e:
+            # Nothing is removed from the store for a document read part way.
+            print("Error:", e)
             Logger.error(
-                f"Fatal embedding error for chunk {chunk['id']}: {e}",
+                f"Stopped reading {source}: {e}; embedded chunks are kept in "
+                "the ingestion journal",
                 "App",
             )
             return None
+        finally:
+            batches.close()
 
-    def run_embeddings(self):
-        """Process PDF chunks and generate embeddings"""
-        response = self.pdfReader.extract_data(file_path=self.file_path)
-        if not response.success:
-            print("Error:", response.error)
-            return
+        journal.prune(source, differ.seen)
+        removed = differ.removed()
+        if not self.store_embeddings(source, buffer + ready, removed):
+            return None
 
-        pages = response.data["pages"]
+        counts.update(
+            embedded=embedded,
+            failed=failed,
+            tokens=tokens,
+            removed=len(removed),
+            previous_failed=previous["failed"],
+        )
+        return counts
 
-        embeddings_list = []
-        total_tokens = 0
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [executor.submit(self.embed_chunk, chunk) for chunk in pages]
-            for future in as_completed(futures):
-                result = future.result()
-                if result:
-                    embeddings_list.append(result)
-                    total_tokens += result["tokens"]
-
-        res = self.chromaDB.add(embeddings_list)
+    def store_embeddings(self, source: str, batches: list, removed_ids: list[str]):
+        """
+        Write embedded chunks and deletions to the vector store. On failure
+        the chunks stay journaled as embedded for the next run.
+        """
+        records = EmbeddingBatch.concat(batches)
+        if not len(records) and not removed_ids:
+            return True
+
+        res = self.vectorStore.sync(records, removed_ids)
         if not res.success:
             print("Error:", res.error)
-            return
-        Logger.info(
-            f"Generated embeddings for {len(embeddings_list)} chunks and total tokens: {total_tokens}",
-            "App",
+            Logger.error(
+                f"Stopped after a failed write; {len(records)} embedded chunks "
+                "are kept in the ingestion journal",
+                "App",
+            )
+            return False
+
+        self.ingestionJournal.mark_stored(source, records.ids)
+        self.on_store_sync(records, removed_ids)
+        return True
+
+    def process_page_images(
+        self, source: str, groups, parsed: queue.Queue
+    ) -> Response[dict]:
+        """
+        Read the page groups of `source`, passing each one to `parsed` for
+        the text side, then describe and embed the document's low-text
+        pages: picking them and linking them to chunks needs all of it.
+        """
+        chunks = []
+        try:
+            for group in groups:
+                chunks.extend(group)
+                parsed.put(group)
+        except Exception as e:
+            parsed.put(e)
+            return Response.fail(str(e), "Failed to process PDF")
+        parsed.put(_DONE)
+
+        return self.imageStage.process(
+            {"file": source, "total_chunks": len(chunks), "pages": chunks}
+        )
+
+    @staticmethod
+    def _drain(parsed: queue.Queue):
+        """Page groups from process_page_images, re-raising its parse error"""
+        while True:
+            group = parsed.get()
+            if group is _DONE:
+                return
+            if isinstance(group, Exception):
+                raise group
+            yield group
+
+    def store_page_images(self, res: Response[dict]) -> dict | None:
+        """Write the records of process_page_images; None when nothing was"""
+        if not res.success:
+            print("Error:", res.error)
+            return None
+        if not self.store_embeddings(
+            self.file_path, [res.data["records"]], res.data["removed"]
+        ):
+            return None
+        return res.data
+
+    def run_directory_embeddings(self, pattern: str = "pdfs/**/*.pdf"):
+        """Ingest every PDF matching `pattern` through the staged pipeline"""
+        from lib.pipeline.IngestionPipeline import IngestionPipeline
+
+        pipeline = IngestionPipeline(
+            self.embeddingBatcher,
+            self.vectorStore,
+            chunk_size=self.pdfReader.chunk_size,
+            chunk_overlap=self.pdfReader.chunk_overlap,
+            length_unit=self.pdfReader.length_unit,
+            on_sync=self.on_store_sync,
+            image_stage=self.imageStage if self.multimodal else None,
         )
+        res = pipeline.run(pattern)
+        if not res.success:
+            print("Error:", res.error)
+        return res.data
+
+    def on_store_sync(self, records: EmbeddingBatch, removed_ids: list[str]):
+        """Keep the lexical index and answer cache in step with the store"""
+        res = self.lexicalIndex.sync(records, removed_ids)
+        if not res.success:
+            Logger.error(res.error or "Failed to update lexical index", "App")
+
+        self.invalidate_answers([r["id"] for r in records] + removed_ids)
+
+    def invalidate_answers(self, chunk_ids: list[str]):
+        """Forget cached answers built from re-indexed or deleted chunks"""
+        dropped = self.answerCache.invalidate_chunks(chunk_ids)
+        if dropped:
+            Logger.info(f"Invalidated {dropped} cached answers", "App")
+
+    def retrieve(self, question: str, query_embedding, n_results: int = 3):
+        """Hybrid BM25 + vector retrieval, or plain vector search, reranked"""
+        depth = self.retrieval_depth(n_results)
+        if self.retriever is None:
+            res = self.vectorStore.get(query_embedding, n_results=depth)
+        else:
+            res = self.retriever.retrieve(question, query_embedding, depth)
+        return self.rerank([question], res, n_results)
+
+    def retrieve_many(
+        self, questions: list[str], query_embeddings: list, n_results: int = 3
+    ):
+        """`retrieve` for many questions with one vector store query"""
+        depth = self.retrieval_depth(n_results)
+        if self.retriever is None:
+            res = self.vectorStore.get_many(query_embeddings, n_results=depth)
+        else:
+            res = self.retriever.retrieve_many(questions, query_embeddings, depth)
+        return self.rerank(questions, res, n_results)
+
+    def retrieval_depth(self, n_results: int) -> int:
+        """Chunks to fetch per question: the rerank candidates, if reranking"""
+        if self.rerankStage is None:
+            return n_results
+        return max(n_results, self.rerankStage.candidates)
+
+    def rerank(self, questions: list[str], res, n_results: int):
+        if self.rerankStage is None or not res.success:
+            return res
+        return self.rerankStage.rerank_many(questions, res.data, n_results)
+
+    def answer_context(self, results: dict):
+        """Chunk ids and context key of a vector store query result"""
+        ids = results["ids"][0] or []
+        metadatas = results.get("metadatas") or [[]]
+        hashes = [(m or {}).get("content_hash") for m in metadatas[0] or []]
+        hashes += [None] * (len(ids) - len(hashes))
+        return ids, self.answerCache.context_key(ids, hashes)
+
+    def assemble_context(self, results: dict) -> list[str]:
+        """Merge, deduplicate and budget the retrieved chunks for the prompt"""
+        return self.build_context(results)[0]
+
+    def build_context(self, results: dict) -> tuple[list[str], int]:
+        """Assembled passages and their token count"""
+        documents = results["documents"][0] or []
+        metadatas = (results.get("metadatas") or [[]])[0] or []
+        metadatas = list(metadatas) + [{}] * (len(documents) - len(metadatas))
+
+        res = self.contextAssembler.assemble(
+            results["ids"][0] or [], documents, metadatas
+        )
+        if not res.success:
+            Logger.warning("Context assembly failed, using raw chunks", "App")
+            return documents, self.count_tokens(documents)
+        return res.data["chunks"], res.data["tokens_after"]
 
+    def count_tokens(self, text: str | list) -> int:
+        res = self.embeddingService.count_tokens(text)
+        return res.data if res.success else 0
+
+    @Metrics.traced("query")
     def query_embeddings(self, question: str, n_results: int = 3):
-        """Embed user question and get results from ChromaDB"""
+        """Embed user question and get results from the vector store"""
 
-        embedding_res = self.wrapper.retry(
+        question_tokens = self.count_tokens(question)
+        embedding_res = self.embeddingScheduler.run(
             self.embeddingService.embed_query,
             question,
             max_tokens=3000,
-            service_name="EmbeddingService",
+            tokens=question_tokens,
+            token_cost=question_tokens,
         )
 
         if not embedding_res.success:
             Logger.error("Failed to embed question", "App")
             return
 
-        # Query ChromaDB
+        # Query the vector store
         res = self.wrapper.retry(
-            self.chromaDB.get,
+            self.retrieve,
+            question,
             embedding_res.data["embedding"],
             n_results=n_results,
-            service_name="ChromaDB",
+            service_name="VectorStore",
         )
 
         if not res.success:
-            Logger.error("Failed to query ChromaDB", "App")
+            Logger.error("Failed to query vector store", "App")
             return
 
         data = res.data["documents"][0] or []
@@ -113,13 +730,32 @@ class App:
             Logger.info("No relevant chunks found.", "App")
             return
 
-        Logger.info(f"Sending {len(data)} chunks to LLM...", "App")
+        question_embedding = embedding_res.data["embedding"]
+        chunk_ids, context_key = self.answer_context(res.data)
+        cached = self.answerCache.lookup(question, question_embedding, context_key)
 
-        llmsRes = self.llmService.generate_response_for_pdf_chunks(data, question)
+        if cached:
+            Logger.info(f"Answer served from {cached['tier']} cache", "App")
+            answer = cached["answer"]
+        else:
+            context, context_tokens = self.build_context(res.data)
+            Logger.info(f"Sending {len(context)} passages to LLM...", "App")
 
-        if not llmsRes.success:
-            Logger.error(llmsRes.error or "Unknown LLM error", "App")
-            return
+            llmsRes = self.llmScheduler.run(
+                self.llmService.generate_response_for_pdf_chunks,
+                context,
+                question,
+                token_cost=context_tokens + question_tokens,
+            )
+
+            if not llmsRes.success:
+                Logger.error(llmsRes.error or "Unknown LLM error", "App")
+                return
+
+            answer = llmsRes.data
+            self.answerCache.store(
+                question, question_embedding, context_key, chunk_ids, answer
+            )
 
         # ANSI colors
         CYAN = "\033[36m"
@@ -127,36 +763,134 @@ class App:
         RESET = "\033[0m"
 
         print(f"\n{CYAN}========== FINAL ANSWER =========={RESET}\n")
-        print(f"{GREEN}{llmsRes.data}{RESET}\n")
+        print(f"{GREEN}{answer}{RESET}\n")
+
+        self.save_result(question, answer)
 
-        # Save answer to file
+    def save_result(self, question: str, answer: str):
+        """Save answer to file"""
         with open("results.json", "w", encoding="utf-8") as f:
             json.dump(
                 {
                     "question": question,
-                    "answer": llmsRes.data,
+                    "answer": answer,
                 },
                 f,
                 ensure_ascii=False,
                 indent=4,
             )
 
+    async def aquery_embeddings(self, question: str, n_results: int = 3):
+        """
+        Async query path: embed the question with the async client, run the
+        blocking vector store query in a worker thread and yield answer tokens as
+        the LLM streams them. Safe to run many of these concurrently.
+        """
+        question_tokens = self.count_tokens(question)
+        embedding_res = await self.embeddingScheduler.arun(
+            self.embeddingService.aembed_query,
+            question,
+            max_tokens=3000,
+            tokens=question_tokens,
+            token_cost=question_tokens,
+        )
+
+        if not embedding_res.success:
+            Logger.error("Failed to embed question", "App")
+            return
+
+        res = await self.wrapper.async_wrapper(
+            self.retrieve,
+            question,
+            embedding_res.data["embedding"],
+            n_results=n_results,
+        )
+
+        if not res.success:
+            Logger.error("Failed to query vector store", "App")
+            return
+
+        data = res.data["documents"][0] or []
+
+        if not data:
+            Logger.info("No relevant chunks found.", "App")
+            return
+
+        question_embedding = embedding_res.data["embedding"]
+        chunk_ids, context_key = self.answer_context(res.data)
+        cached = self.answerCache.lookup(question, question_embedding, context_key)
+
+        if cached:
+            Logger.info(f"Answer served from {cached['tier']} cache", "App")
+            yield cached["answer"]
+            return
+
+        context, context_tokens = self.build_context(res.data)
+
+        parts = []
+        # A partly streamed answer cannot be retried, so the stream only
+        # takes a rate-limited slot.
+        async with self.llmScheduler.alimit(context_tokens + question_tokens):
+            async for token in self.llmService.astream_response_for_pdf_chunks(
+                context, question
+            ):
+                parts.append(token)
+                yield token
+
+        self.answerCache.store(
+            question, question_embedding, context_key, chunk_ids, "".join(parts).strip()
+        )
+
+    @Metrics.traced("query", mode="stream")
+    async def ask_streaming(self, question: str, n_results: int = 3):
+        """Print the answer as it streams in, then save it"""
+        CYAN = "\033[36m"
+        GREEN = "\033[32m"
+        RESET = "\033[0m"
+
+        parts = []
+        try:
+            async for token in self.aquery_embeddings(question, n_results):
+                if not parts:
+                    print(f"\n{CYAN}========== FINAL ANSWER =========={RESET}\n")
+                    print(GREEN, end="")
+                parts.append(token)
+                print(token, end="", flush=True)
+        except Exception as e:
+            Logger.error(f"Streaming query failed: {e}", "App")
+        finally:
+            if parts:
+                print(f"{RESET}\n")
+
+        if parts:
+            self.save_result(question, "".join(parts).strip())
+
     def terminal_menu(self):
         """Terminal menu to choose options"""
         while True:
             print("\nOptions:")
             print("1. Ask a question")
             print("2. Re-run PDF embeddings")
+            print("3. Ingest all PDFs in pdfs/")
+            print("4. Show metrics")
             print("0. Exit")
             choice = input("Enter your choice: ").strip()
 
             if choice == "1":
                 question = input("Enter your question: ").strip()
                 if question:
-                    self.query_embeddings(question)
+                    asyncio.run(self.ask_streaming(question))
             elif choice == "2":
                 print("Re-running embeddings...")
                 self.run_embeddings()
+            elif choice == "3":
+                print("Ingesting pdfs/ directory...")
+                self.run_directory_embeddings()
+            elif choice == "4":
+                if Metrics.enabled:
+                    print(json.dumps(Metrics.snapshot(), indent=2))
+                else:
+                    print("Metrics are disabled. Set METRICS_ENABLED=1 to enable.")
             elif choice == "0":
                 print("Exiting...")
                 break
@@ -165,5 +899,21 @@ class App:
 
 
 if __name__ == "__main__":
-    app = App("pdfs/generative_ai_healthcare_guide.pdf")
+    load_env()
+    Metrics.configure_from_env()
+    app = App(
+        "pdfs/generative_ai_healthcare_guide.pdf",
+        vector_store=os.getenv("VECTOR_STORE", "chroma"),
+        multimodal=os.getenv("MULTIMODAL_INGEST", "0").lower() in ("1", "true", "yes"),
+        compression=os.getenv("VECTOR_COMPRESSION") or None,
+        reranker=os.getenv("RERANKER") or None,
+        rerank_candidates=int(os.getenv("RERANK_CANDIDATES", 20)),
+        rerank_budget_ms=float(os.getenv("RERANK_BUDGET_MS", 50)),
+        ivf_lists=int(os.getenv("IVF_LISTS", 256)),
+        ivf_nprobe=int(os.getenv("IVF_NPROBE", 8)),
+        ivf_rerank_factor=int(os.getenv("IVF_RERANK_FACTOR", 4)),
+    )
+    if os.getenv("WARM_START", "1").lower() in ("1", "true", "yes"):
+        app.warm_up()
     app.terminal_menu()
+    app.close()
@@ -0,0 +1,104 @@
+from lib.cache.AnswerCache import AnswerCache
+import numpy as np
+import sys
+import pytest
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sys.modules["lib.cache.AnswerCache"], "time", clock)
+    return clock
+
+
+CHUNKS = ["doc.pdf:1:1", "doc.pdf:1:2"]
+HASHES = ["h1", "h2"]
+CONTEXT = AnswerCache.context_key(CHUNKS, HASHES)
+
+
+def unit(*values: float) -> np.ndarray:
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def store(cache, question, embedding=(1.0, 0.0), context=CONTEXT, chunks=CHUNKS):
+    cache.store(question, list(embedding), context, chunks, f"answer to {question}")
+
+
+def test_exact_hit_until_the_ttl_expires(clock):
+    cache = AnswerCache(ttl_seconds=60)
+    store(cache, "What is metformin?")
+
+    # Case and whitespace do not matter for the exact tier.
+    hit = cache.lookup("  what is   METFORMIN? ", [0.0, 1.0], CONTEXT)
+    assert hit == {
+        "answer": "answer to What is metformin?",
+        "tier": "exact",
+        "similarity": 1.0,
+    }
+
+    clock.now += 59
+    assert cache.lookup("What is metformin?", [1.0, 0.0], CONTEXT) is not None
+    clock.now += 2
+    assert cache.lookup("What is metformin?", [1.0, 0.0], CONTEXT) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["exact_hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = AnswerCache(max_entries=2)
+    store(cache, "first")
+    store(cache, "second")
+    assert cache.lookup("first", [1.0, 0.0], CONTEXT)["tier"] == "exact"
+
+    store(cache, "third")
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("second", [0.0, 1.0], CONTEXT) is None
+    assert cache.lookup("first", [0.0, 1.0], CONTEXT) is not None
+    assert cache.lookup("third", [0.0, 1.0], CONTEXT) is not None
+
+
+def test_corpus_changes_invalidate_answers(clock):
+    cache = AnswerCache()
+    other = AnswerCache.context_key(["doc.pdf:2:1"], ["h3"])
+    store(cache, "about chunk one")
+    store(cache, "about chunk three", context=other, chunks=["doc.pdf:2:1"])
+
+    # A re-indexed chunk changes the context key, so its old answer is
+    # never served for the new content.
+    edited = AnswerCache.context_key(CHUNKS, ["h1", "h2-edited"])
+    assert edited != CONTEXT
+    assert cache.lookup("about chunk one", [1.0, 0.0], edited) is None
+
+    # The writer also drops every answer built from a changed chunk.
+    assert cache.invalidate_chunks(["doc.pdf:1:2", "doc.pdf:9:9"]) == 1
+    assert cache.lookup("about chunk one", [1.0, 0.0], CONTEXT) is None
+    assert cache.lookup("about chunk three", [1.0, 0.0], other) is not None
+    assert cache.invalidate_chunks(["doc.pdf:1:2"]) == 0
+
+
+def test_semantic_tier_needs_the_threshold_and_the_same_context(clock):
+    cache = AnswerCache(similarity_threshold=0.95)
+    store(cache, "What does metformin do?", embedding=unit(1.0, 0.0, 0.0))
+
+    close = unit(1.0, 0.2, 0.0)  # cosine ~0.98
+    hit = cache.lookup("How does metformin work?", list(close), CONTEXT)
+    assert hit["tier"] == "semantic"
+    assert hit["answer"] == "answer to What does metformin do?"
+    assert hit["similarity"] == pytest.approx(float(close[0]), abs=1e-6)
+
+    far = unit(1.0, 0.5, 0.0)  # cosine ~0.89
+    assert cache.lookup("Is metformin safe?", list(far), CONTEXT) is None
+
+    other = AnswerCache.context_key(["doc.pdf:2:1"], ["h3"])
+    assert cache.lookup("How does metformin work?", list(close), other) is None
+    stats = cache.stats()
+    assert stats["semantic_hits"] == 1 and stats["misses"] == 2
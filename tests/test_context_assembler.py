@@ -0,0 +1,79 @@
+from lib.retrieval.ContextAssembler import ContextAssembler
+import pytest
+
+OVERLAP = "the shared tail of chunk one that the splitter repeats"
+FIRST = "Chunk one opens with its own words and ends with " + OVERLAP
+SECOND = OVERLAP + " before chunk two goes on with new words"
+
+
+def words(text: str) -> int:
+    return len(text.split())
+
+
+def meta(page: int, number: int, source: str = "doc.pdf", **extra) -> dict:
+    return {"source": source, "page_number": page, "chunk_number": number, **extra}
+
+
+@pytest.fixture
+def assembler():
+    return ContextAssembler(words, token_budget=1000)
+
+
+def test_adjacent_chunks_merge_without_the_overlap(assembler):
+    res = assembler.assemble(
+        ["doc.pdf:1:2", "doc.pdf:1:1"], [SECOND, FIRST], [meta(1, 2), meta(1, 1)]
+    )
+    assert res.success
+    assert res.data["chunks"] == [FIRST + SECOND[len(OVERLAP) :]]
+    assert res.data["ids"] == ["doc.pdf:1:1", "doc.pdf:1:2"]
+    assert res.data["merged"] == 1
+    assert res.data["tokens_after"] == words(FIRST) + words(SECOND) - words(OVERLAP)
+
+
+def test_chunks_merge_only_when_consecutive_on_the_same_page(assembler):
+    passages = [
+        {"ids": [i], "content": c, "metadata": m, "rank": r, "tokens": None}
+        for r, (i, c, m) in enumerate(
+            [
+                ("a", FIRST, meta(1, 1)),
+                ("b", SECOND, meta(1, 3)),
+                ("c", SECOND, meta(2, 2)),
+                ("d", SECOND, meta(1, 2, source="other.pdf")),
+                ("e", "an image of page one", meta(1, 2, kind="image")),
+            ]
+        )
+    ]
+    merged = assembler.merge_adjacent(passages)
+    assert [p["ids"] for p in merged] == [["a"], ["b"], ["c"], ["d"], ["e"]]
+
+
+def test_short_coincidental_overlap_is_kept(assembler):
+    first, second = "ends with the word", "the word starts it"
+    assert assembler.overlap_length(first, second) == 0
+    assert assembler.overlap_length(FIRST, SECOND) == len(OVERLAP)
+
+
+def test_near_duplicates_are_dropped_keeping_the_better_rank(assembler):
+    text = " ".join(f"word{n}" for n in range(60))
+    res = assembler.assemble(
+        ["a", "b", "c"],
+        [text, text.replace("word59", "final"), "an unrelated passage about statins"],
+        [meta(1, 1), meta(4, 7), meta(9, 1)],
+    )
+    assert res.success
+    assert res.data["ids"] == ["a", "c"]
+    assert res.data["duplicates"] == 1
+
+
+def test_budget_skips_passages_that_do_not_fit():
+    assembler = ContextAssembler(words, token_budget=10)
+    res = assembler.assemble(
+        ["a", "b", "c"],
+        ["one two three four five six", "seven " * 8, "eight nine"],
+        [{"token_count": 6}, {}, {}],
+    )
+    assert res.success
+    assert res.data["ids"] == ["a", "c"]
+    assert res.data["over_budget"] == 1
+    assert res.data["tokens_before"] == 16
+    assert res.data["tokens_saved"] == 8
@@ -0,0 +1,69 @@
+from lib.Services.EmbeddingBatcher import EmbeddingBatcher, is_input_error
+from lib.common.responses import Response
+from lib.documents.ChunkRecord import ChunkRecord
+import pytest
+
+
+class ScriptedEmbeddings:
+    """Embedding service that rejects every request holding a bad chunk"""
+
+    def __init__(self, error: str, bad: set[str]):
+        self.error = error
+        self.bad = bad
+        self.requests = 0
+
+    def embed_query(self, texts, max_tokens=None, tokens=None):
+        self.requests += 1
+        if self.bad & set(texts):
+            return Response.fail(self.error, "Embedding generation failed")
+        return Response.ok(
+            {"embedding": [[1.0, 0.0] for _ in texts], "tokens_used": tokens},
+            "ok",
+        )
+
+
+def batch(n: int) -> list[tuple[ChunkRecord, int]]:
+    return [(ChunkRecord("doc.pdf", 1, i, f"chunk {i}"), 10) for i in range(n)]
+
+
+INPUT_ERRORS = [
+    "400 INVALID_ARGUMENT: Request contains an invalid argument.",
+    "The input token count (9000) exceeds the maximum number of tokens allowed (2048).",
+    "413 Request Entity Too Large",
+    "Request payload size exceeds the limit: 10485760 bytes.",
+]
+
+ACCOUNT_ERRORS = [
+    "400 API key not valid. Please pass a valid API key. [reason: API_KEY_INVALID]",
+    "401 UNAUTHENTICATED: Request had invalid authentication credentials.",
+    "403 PERMISSION_DENIED: Generative Language API has not been used in project",
+    "429 RESOURCE_EXHAUSTED: Quota exceeded for quota metric 'Embed requests'",
+    "Quota exceeded; check your plan and billing details.",
+    "Unsupported response from server",
+    "Received an empty response",
+]
+
+
+@pytest.mark.parametrize("error", INPUT_ERRORS)
+def test_input_errors_are_bisected_down_to_the_bad_chunk(error):
+    assert is_input_error(error)
+    chunks = batch(8)
+    service = ScriptedEmbeddings(error, {"chunk 5"})
+    result = EmbeddingBatcher(service).embed_batch(chunks)
+
+    assert result["failed"] == [chunks[5][0].id]
+    assert len(result["batch"]) == 7
+    # 8 -> 4 + 4 -> 2 + 2 -> 1 + 1 on the bad side.
+    assert result["requests"] == service.requests == 7
+
+
+@pytest.mark.parametrize("error", ACCOUNT_ERRORS)
+def test_account_and_other_errors_fail_the_batch_in_one_request(error):
+    assert not is_input_error(error)
+    chunks = batch(8)
+    service = ScriptedEmbeddings(error, {c.content for c, _ in chunks})
+    result = EmbeddingBatcher(service).embed_batch(chunks)
+
+    assert result["failed"] == [c.id for c, _ in chunks]
+    assert len(result["batch"]) == 0
+    assert result["requests"] == service.requests == 1
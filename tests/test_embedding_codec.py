@@ -0,0 +1,91 @@
+from lib.database.EmbeddingCodec import EmbeddingCodec, QUANTIZATIONS
+from lib.database.NumpyVectorStore import NumpyVectorStore
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.documents.ChunkRecord import ChunkRecord
+import numpy as np
+import pytest
+
+SPECS = ["float32", "float32:32", "int8", "int8:32", "binary", "binary:32"]
+
+
+def vectors(rows: int = 200, dim: int = 64, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((rows, dim)).astype(np.float32)
+
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_parse_and_persist_round_trip(tmp_path, spec):
+    codec = EmbeddingCodec.parse(spec)
+    codec.save(str(tmp_path))
+    assert EmbeddingCodec.load(str(tmp_path)) == codec
+    assert EmbeddingCodec.parse(repr(codec).replace("full", "")) == codec
+
+
+def test_parse_rejects_unknown_settings():
+    with pytest.raises(ValueError):
+        EmbeddingCodec.parse("float16")
+    with pytest.raises(ValueError):
+        EmbeddingCodec.parse("int8:0")
+    assert EmbeddingCodec.parse(None) == EmbeddingCodec()
+
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_encode_decode_round_trip(spec):
+    codec = EmbeddingCodec.parse(spec)
+    rows = codec.prepare(vectors())
+    arrays = codec.encode(rows)
+
+    assert set(arrays) == set(codec.array_names)
+    assert codec.size(arrays) == len(rows)
+    assert codec.dim(arrays) == (codec.dims or 64)
+    np.testing.assert_allclose(np.linalg.norm(rows, axis=1), 1.0, atol=1e-5)
+
+    decoded = codec.decode(arrays, np.arange(len(rows)))
+    if codec.quantization == "int8":
+        # One code step of the row's largest component.
+        step = np.abs(rows).max(axis=1, keepdims=True) / 127
+        assert np.all(np.abs(decoded - rows) <= step / 2 + 1e-6)
+    else:
+        np.testing.assert_array_equal(decoded, rows)
+
+
+@pytest.mark.parametrize("quantization", QUANTIZATIONS)
+def test_search_finds_each_row_itself(quantization):
+    codec = EmbeddingCodec(quantization=quantization)
+    rows = codec.prepare(vectors())
+    arrays = codec.encode(rows)
+
+    top, scores = codec.search(arrays, rows[:20], k=3)
+    assert list(top[:, 0]) == list(range(20))
+    assert np.all(scores[:, 0] > 0.98)
+
+    top, scores = codec.search(arrays, rows[:20], k=3, exclude=np.arange(10))
+    assert not np.isin(top, np.arange(10)).any()
+
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_store_reload_round_trip(tmp_path, spec):
+    codec = EmbeddingCodec.parse(spec)
+    data = vectors(50)
+    chunks = [ChunkRecord("doc.pdf", 1, n, f"chunk {n}") for n in range(1, 51)]
+
+    store = NumpyVectorStore("codec", path=str(tmp_path), compression=codec)
+    assert store.sync(EmbeddingBatch(chunks[:30], data[:30]), []).success
+    assert store.sync(EmbeddingBatch(chunks[30:], data[30:]), ["doc.pdf:1:2"]).success
+    before = store.get_many(data[:5], n_results=4).data
+
+    reloaded = NumpyVectorStore("codec", path=str(tmp_path))
+    assert reloaded.codec == codec
+    assert reloaded.count() == 49
+    assert reloaded.get_many(data[:5], n_results=4).data == before
+    assert "doc.pdf:1:2" not in reloaded.get_by_ids(["doc.pdf:1:2"]).data["ids"]
+
+
+def test_store_rejects_a_different_codec(tmp_path):
+    chunks = [ChunkRecord("doc.pdf", 1, 1, "chunk")]
+    store = NumpyVectorStore("codec", path=str(tmp_path))
+    assert store.sync(EmbeddingBatch(chunks, vectors(1)), []).success
+
+    with pytest.raises(ValueError):
+        NumpyVectorStore(
+            "codec", path=str(tmp_path), compression=EmbeddingCodec.parse("int8")
+        )
@@ -0,0 +1,94 @@
+from lib.database.NumpyVectorStore import NumpyVectorStore
+from lib.database.LexicalIndex import BM25Index
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.documents.ChunkRecord import ChunkRecord
+from lib.retrieval.HybridRetriever import HybridRetriever
+import numpy as np
+import pytest
+
+CONTENTS = [
+    "metformin lowers blood glucose in type 2 diabetes",
+    "insulin therapy for type 1 diabetes",
+    "statins reduce cholesterol and cardiovascular risk",
+    "aspirin for secondary prevention of stroke",
+    "blood pressure targets in hypertension",
+]
+
+
+@pytest.fixture
+def stores(tmp_path):
+    chunks = [ChunkRecord("doc.pdf", 1, n, c) for n, c in enumerate(CONTENTS, 1)]
+    vectors = np.eye(len(chunks), 8, dtype=np.float32)
+
+    store = NumpyVectorStore("hybrid", path=str(tmp_path))
+    assert store.sync(EmbeddingBatch(chunks, vectors), []).success
+    index = BM25Index(path=str(tmp_path / "bm25"))
+    index.add(chunks)
+    return store, index
+
+
+def expected_fusion(dense_ids, lexical, rrf_k, vector_weight, lexical_weight):
+    fused = {}
+    for rank, chunk_id in enumerate(dense_ids, 1):
+        fused[chunk_id] = vector_weight / (rrf_k + rank)
+    for rank, (chunk_id, _) in enumerate(lexical, 1):
+        fused[chunk_id] = fused.get(chunk_id, 0.0) + lexical_weight / (rrf_k + rank)
+    return fused
+
+
+@pytest.mark.parametrize("weights", [(1.0, 1.0), (1.0, 3.0), (2.0, 0.5)])
+def test_scores_are_reciprocal_rank_fusion(stores, weights):
+    store, index = stores
+    retriever = HybridRetriever(
+        store,
+        index,
+        rrf_k=10,
+        vector_weight=weights[0],
+        lexical_weight=weights[1],
+        candidates=5,
+    )
+    question = "statins cholesterol"
+    # Dense search prefers chunk 1, BM25 prefers chunk 3.
+    query = np.eye(1, 8, dtype=np.float32)[0] + 0.1
+
+    res = retriever.retrieve(question, query, n_results=5)
+    assert res.success
+
+    dense = store.get(query, n_results=5).data["ids"][0]
+    fused = expected_fusion(dense, index.search(question, 5), 10, *weights)
+    ranked = sorted(fused, key=fused.get, reverse=True)
+
+    assert res.data["ids"] == [ranked]
+    assert res.data["scores"][0] == pytest.approx([fused[i] for i in ranked])
+    assert res.data["documents"][0] == [
+        CONTENTS[int(i.split(":")[-1]) - 1] for i in ranked
+    ]
+
+
+def test_lexical_only_hits_are_fetched(stores):
+    store, index = stores
+    # Dense candidates stop at two chunks, neither of which mentions aspirin.
+    retriever = HybridRetriever(store, index, candidates=2)
+    query = np.eye(1, 8, dtype=np.float32)[0]
+
+    res = retriever.retrieve_many(["aspirin stroke"], [query], n_results=2)
+    assert res.success
+    assert "doc.pdf:1:4" in res.data["ids"][0]
+    position = res.data["ids"][0].index("doc.pdf:1:4")
+    assert res.data["documents"][0][position] == CONTENTS[3]
+    assert res.data["metadatas"][0][position]["page_number"] == 1
+
+
+def test_one_result_list_per_question(stores):
+    store, index = stores
+    retriever = HybridRetriever(store, index, candidates=3)
+    queries = list(np.eye(8, dtype=np.float32)[[1, 3, 4]])
+
+    res = retriever.retrieve_many(["insulin", "aspirin", "blood"], queries, 2)
+    assert res.success
+    assert [len(ids) for ids in res.data["ids"]] == [2, 2, 2]
+    assert [ids[0] for ids in res.data["ids"]] == [
+        "doc.pdf:1:2",
+        "doc.pdf:1:4",
+        "doc.pdf:1:5",
+    ]
@@ -0,0 +1,97 @@
+from lib.pipeline.IngestionJournal import (
+    IngestionJournal,
+    PARSED,
+    EMBEDDED,
+    STORED,
+    FAILED,
+)
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.documents.ChunkRecord import ChunkRecord
+import numpy as np
+import pytest
+
+SOURCE = "doc.pdf"
+
+
+def chunks(*contents: str) -> list[ChunkRecord]:
+    return [ChunkRecord(SOURCE, 1, n, c) for n, c in enumerate(contents, 1)]
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / "journal.db")
+
+
+def test_recover_returns_embedded_but_unstored_chunks(journal_path):
+    parsed = chunks("one", "two", "three", "four")
+    vectors = np.arange(4 * 3, dtype=np.float32).reshape(4, 3)
+
+    journal = IngestionJournal(journal_path)
+    assert journal.begin(SOURCE, parsed) == {
+        PARSED: 0,
+        EMBEDDED: 0,
+        STORED: 0,
+        FAILED: 0,
+    }
+    journal.mark_embedded(SOURCE, EmbeddingBatch(parsed[:3], vectors[:3], [5, 6, 7]))
+    journal.mark_stored(SOURCE, [parsed[0].id])
+    journal.mark_failed(SOURCE, [parsed[3].id], "quota")
+    journal.close()
+
+    # A new process after the crash.
+    journal = IngestionJournal(journal_path)
+    before = journal.begin(SOURCE, parsed)
+    assert before == {PARSED: 0, EMBEDDED: 2, STORED: 1, FAILED: 1}
+
+    # The store already holds chunk 1, so its diff only returns the rest.
+    recovered = journal.recover(SOURCE, parsed[1:])
+    assert recovered.ids == [parsed[1].id, parsed[2].id]
+    np.testing.assert_array_equal(recovered.embeddings, vectors[1:3])
+    assert list(recovered.tokens) == [6, 7]
+    assert journal.failures(SOURCE) == [
+        {"id": parsed[3].id, "attempts": 1, "error": "quota"}
+    ]
+
+    journal.mark_stored(SOURCE, recovered.ids)
+    assert len(journal.recover(SOURCE, parsed)) == 0
+    assert journal.summary(SOURCE) == {PARSED: 0, EMBEDDED: 0, STORED: 3, FAILED: 1}
+    journal.close()
+
+
+def test_changed_content_is_not_recovered(journal_path):
+    parsed = chunks("one", "two")
+    journal = IngestionJournal(journal_path)
+    journal.begin(SOURCE, parsed)
+    journal.mark_embedded(SOURCE, EmbeddingBatch(parsed, np.ones((2, 3))))
+
+    edited = chunks("one", "two, edited")
+    journal.begin(SOURCE, edited)
+    assert journal.recover(SOURCE, edited).ids == [edited[0].id]
+    assert journal.summary(SOURCE) == {PARSED: 1, EMBEDDED: 1, STORED: 0, FAILED: 0}
+    journal.close()
+
+
+def test_begin_drops_chunks_no_longer_in_the_document(journal_path):
+    journal = IngestionJournal(journal_path)
+    journal.begin(SOURCE, chunks("one", "two", "three"))
+    journal.begin(SOURCE, chunks("one"))
+    assert journal.summary(SOURCE)[PARSED] == 1
+    assert journal.summary("other.pdf")[PARSED] == 0
+    journal.close()
+
+
+def test_streamed_record_and_prune_match_begin(journal_path):
+    journal = IngestionJournal(journal_path)
+    journal.begin(SOURCE, chunks("one", "two", "three"))
+    journal.mark_embedded(SOURCE, EmbeddingBatch(chunks("one"), np.ones((1, 3))))
+
+    # A streaming run records the document a page at a time.
+    edited = chunks("one", "two, edited")
+    journal.begin(SOURCE)
+    for page in (edited[:1], edited[1:]):
+        journal.record(SOURCE, page)
+    journal.prune(SOURCE, {chunk.id for chunk in edited})
+
+    assert journal.summary(SOURCE) == {PARSED: 1, EMBEDDED: 1, STORED: 0, FAILED: 0}
+    assert journal.recover(SOURCE, edited).ids == [edited[0].id]
+    journal.close()
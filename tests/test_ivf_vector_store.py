@@ -0,0 +1,85 @@
+from lib.database.IVFVectorStore import IVFVectorStore
+from lib.database.NumpyVectorStore import NumpyVectorStore
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.documents.ChunkRecord import ChunkRecord
+import numpy as np
+import pytest
+
+DIM = 16
+
+
+def batch(start: int, count: int) -> EmbeddingBatch:
+    rng = np.random.default_rng(start)
+    chunks = [
+        ChunkRecord("doc.pdf", 1, n, f"chunk {n}") for n in range(start, start + count)
+    ]
+    return EmbeddingBatch(chunks, rng.standard_normal((count, DIM)))
+
+
+def open_store(path) -> IVFVectorStore:
+    return IVFVectorStore(
+        "ivf",
+        path=str(path),
+        n_lists=4,
+        n_subvectors=4,
+        nprobe=4,
+        min_train_size=64,
+    )
+
+
+def finds_itself(store: IVFVectorStore, data: EmbeddingBatch) -> bool:
+    res = store.get_many(data.embeddings, n_results=1)
+    assert res.success, res.error
+    return [ids[0] for ids in res.data["ids"]] == data.ids
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = open_store(tmp_path)
+    assert store.sync(batch(0, 300), []).success
+    assert store.index.trained
+    return store
+
+
+def test_failed_index_update_is_not_stored(store, monkeypatch):
+    new = batch(1000, 20)
+
+    def broken(ids, vectors):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(store.index, "add", broken)
+    assert not store.sync(new, []).success
+    monkeypatch.undo()
+
+    # Nothing reached the store, so the chunks are embedded and synced again.
+    diff = store.diff("doc.pdf", list(batch(0, 300).chunks) + new.chunks)
+    assert [c["id"] for c in diff.data["pending"]] == new.ids
+
+    assert store.sync(new, []).success
+    assert set(new.ids) <= set(store.index.labels_by_id)
+    assert finds_itself(store, new)
+
+
+def test_reopen_adds_chunks_the_index_missed(store, tmp_path):
+    new = batch(1000, 20)
+    # A crash between the store write and the index update.
+    assert NumpyVectorStore.sync(store, new, ["doc.pdf:1:0"]).success
+    assert not set(new.ids) & set(store.index.labels_by_id)
+
+    reopened = open_store(tmp_path)
+    assert set(reopened.index.labels_by_id) == set(reopened._state[2])
+    assert "doc.pdf:1:0" not in reopened.index.labels_by_id
+    assert finds_itself(reopened, new)
+
+    # The repair was logged, so the next open has nothing to do.
+    again = open_store(tmp_path)
+    assert set(again.index.labels_by_id) == set(reopened.index.labels_by_id)
+
+
+def test_reopen_drops_ids_the_store_never_got(store, tmp_path):
+    orphan = batch(2000, 5)
+    store.index.add(orphan.ids, store.codec.prepare(orphan.embeddings))
+
+    reopened = open_store(tmp_path)
+    assert not set(orphan.ids) & set(reopened.index.labels_by_id)
+    assert len(reopened.index) == reopened.count() == 300
@@ -0,0 +1,98 @@
+from lib.database.LexicalIndex import BLOCK, BM25Index, Postings
+from lib.documents.ChunkRecord import ChunkRecord
+import numpy as np
+import pytest
+
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta"]
+
+
+def corpus(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # Skewed term frequencies: "alpha" is in most chunks, "theta" in few.
+    p = 1.0 / np.arange(1, len(WORDS) + 1)
+    p /= p.sum()
+    return [
+        ChunkRecord(
+            "doc.pdf",
+            1 + i // 10,
+            i,
+            " ".join(rng.choice(WORDS, size=rng.integers(3, 40), p=p)),
+        )
+        for i in range(n)
+    ]
+
+
+QUERIES = ["alpha", "theta", "alpha theta", "beta gamma eta", "zeta alpha delta"]
+
+
+def assert_same_results(left, right):
+    for query in QUERIES:
+        a, b = left.search(query, 10), right.search(query, 10)
+        assert [c for c, _ in a] == [c for c, _ in b]
+        assert np.allclose([s for _, s in a], [s for _, s in b])
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(path=str(tmp_path / "bm25"))
+    assert index.sync(corpus(3 * BLOCK + 17), []).success
+    return index
+
+
+def test_postings_round_trip_through_blocks():
+    rng = np.random.default_rng(1)
+    docs = np.sort(rng.choice(100_000, size=5 * BLOCK + 3, replace=False))
+    tfs = rng.integers(1, 300, size=len(docs))
+    lengths = rng.integers(1, 500, size=100_000).astype(np.uint32)
+
+    posting = Postings.from_arrays(docs, tfs, lengths)
+    assert posting.n_blocks == 5 and len(posting) == len(docs)
+    out_docs, out_tfs = posting.arrays()
+    assert out_docs.tolist() == docs.tolist()
+    assert out_tfs.tolist() == tfs.tolist()
+
+    # Probing returns exactly the postings of the requested documents.
+    wanted = np.sort(rng.choice(docs, size=40, replace=False))
+    probe = np.concatenate([wanted, [100_001]])
+    where = posting.locate(probe)
+    inside = where >= 0
+    found, found_tfs = posting.fetch(probe[inside], where[inside])
+    order = np.argsort(found)
+    assert found[order].tolist() == wanted.tolist()
+    assert found_tfs[order].tolist() == tfs[np.searchsorted(docs, wanted)].tolist()
+
+
+def test_pruned_search_matches_exhaustive(index):
+    for query in QUERIES:
+        for k in (1, 5, 10):
+            pruned = index.search(query, k)
+            exhaustive = index.search(query, k, exhaustive=True)
+            assert [c for c, _ in pruned] == [c for c, _ in exhaustive]
+            assert np.allclose([s for _, s in pruned], [s for _, s in exhaustive])
+    # The shared accumulator is left clean between queries.
+    assert not index._scores.any() and not index._marks.any()
+
+
+def test_checkpoint_and_log_reload(index, tmp_path):
+    assert index.checkpoint().success
+    extra = corpus(BLOCK + 5, seed=2)
+    for n, chunk in enumerate(extra):
+        chunk.chunk_number = 10_000 + n
+    assert index.sync(extra, [corpus(3)[1].id]).success
+
+    reopened = BM25Index(path=str(tmp_path / "bm25"))
+    assert reopened.live_docs == index.live_docs
+    assert_same_results(index, reopened)
+
+
+def test_compaction_keeps_results(index):
+    removed = [c.id for c in corpus(3 * BLOCK + 17)[::3]]
+    index.remove(removed)
+    before = {q: index.search(q, 10) for q in QUERIES}
+
+    index.compact()
+    assert not index.deleted
+    for query in QUERIES:
+        after = index.search(query, 10)
+        assert [c for c, _ in after] == [c for c, _ in before[query]]
+        assert not set(removed) & {c for c, _ in after}
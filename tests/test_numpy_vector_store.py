@@ -0,0 +1,120 @@
+from lib.database.NumpyVectorStore import NumpyVectorStore
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.documents.ChunkRecord import ChunkRecord
+import numpy as np
+import os
+import pytest
+
+DIM = 16
+
+
+def batch(start: int, count: int, seed: int | None = None) -> EmbeddingBatch:
+    rng = np.random.default_rng(start if seed is None else seed)
+    chunks = [
+        ChunkRecord("doc.pdf", 1, n, f"chunk {n}") for n in range(start, start + count)
+    ]
+    return EmbeddingBatch(chunks, rng.standard_normal((count, DIM)))
+
+
+def open_store(path, compact_ratio: float = 2.0) -> NumpyVectorStore:
+    # A ratio above 1 keeps sync from compacting by itself.
+    return NumpyVectorStore("numpy", path=str(path), compact_ratio=compact_ratio)
+
+
+def nearest(store: NumpyVectorStore, data: EmbeddingBatch) -> list[str]:
+    res = store.get_many(data.embeddings, n_results=1)
+    assert res.success, res.error
+    return [ids[0] if ids else None for ids in res.data["ids"]]
+
+
+def vectors(store: NumpyVectorStore, ids: list[str]) -> np.ndarray:
+    stored = store.stored_embeddings(ids)
+    return np.array([stored[i] for i in ids])
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = open_store(tmp_path)
+    assert store.sync(batch(0, 50), []).success
+    return store
+
+
+def test_writes_and_deletes_survive_reopen(store, tmp_path):
+    rewritten = batch(10, 5, seed=99)  # same ids, new vectors
+    deleted = ["doc.pdf:1:0", "doc.pdf:1:1", "doc.pdf:1:2"]
+    new = batch(100, 10)
+    assert store.sync(rewritten, deleted).success
+    assert store.sync(new, []).success
+    assert store.count() == 50 - 3 + 10
+    # Three deletes and five re-written rows are left as tombstones.
+    assert len(store._state[3]) == 8
+
+    reopened = open_store(tmp_path)
+    assert reopened.count() == store.count()
+    assert len(reopened._state[3]) == 8
+    assert not reopened.get_by_ids(deleted).data["ids"]
+    assert nearest(reopened, rewritten) == rewritten.ids
+    assert nearest(reopened, new) == new.ids
+    # Deleted chunks are not returned even for their own vectors.
+    assert not set(deleted) & set(nearest(reopened, batch(0, 3)))
+
+    live = reopened.stored_hashes("doc.pdf")
+    assert sorted(live) == sorted(store.stored_hashes("doc.pdf"))
+    assert np.allclose(vectors(reopened, rewritten.ids), vectors(store, rewritten.ids))
+
+
+def test_compaction_keeps_ids_and_vectors(store, tmp_path):
+    assert store.sync(batch(10, 5, seed=99), ["doc.pdf:1:0", "doc.pdf:1:7"]).success
+    ids = sorted(store._state[2])
+    before = vectors(store, ids)
+    rows_before = len(store._state[1]["ids"])
+
+    assert store.compact().data == {"dropped": 7}
+    assert len(store._state[1]["ids"]) == rows_before - 7
+
+    reopened = open_store(tmp_path)
+    assert sorted(reopened._state[2]) == ids
+    assert not len(reopened._state[3])
+    assert np.array_equal(vectors(reopened, ids), before)
+    assert len(np.load(reopened.array_path("embeddings"), mmap_mode="r")) == len(ids)
+    assert reopened.compact().data == {"dropped": 0}
+
+
+def test_sync_compacts_once_tombstones_reach_the_ratio(tmp_path):
+    store = open_store(tmp_path, compact_ratio=0.5)
+    assert store.sync(batch(0, 10), []).success
+    assert store.sync(batch(0, 4, seed=5), []).success
+    assert len(store._state[3]) == 4
+
+    # 10 of the 20 rows are tombstones once the rest are re-written.
+    assert store.sync(batch(4, 6, seed=5), []).success
+    assert not len(store._state[3])
+    assert len(open_store(tmp_path)._state[1]["ids"]) == 10
+
+
+def test_truncated_log_tail_is_dropped_on_open(store, tmp_path):
+    log = store.records_path
+    intact = os.path.getsize(log)
+    lost = batch(100, 3)
+    assert store.sync(lost, ["doc.pdf:1:0"]).success
+
+    # A crash part way through the last line of the log.
+    with open(log, "r+b") as f:
+        f.truncate(os.path.getsize(log) - 7)
+
+    reopened = open_store(tmp_path)
+    # Every complete line is kept: the delete and the first two records.
+    assert reopened.count() == 50 - 1 + 2
+    assert not reopened.get_by_ids(lost.ids[2:]).data["ids"]
+    assert reopened.get_by_ids(lost.ids[:2]).data["ids"] == lost.ids[:2]
+    assert os.path.getsize(log) > intact
+    with open(log, "rb") as f:
+        assert f.read().endswith(b"\n")
+
+    # The array row left past the log is overwritten by the next sync.
+    again = batch(200, 4)
+    assert reopened.sync(again, []).success
+    final = open_store(tmp_path)
+    assert final.count() == 51 + 4
+    assert nearest(final, again) == again.ids
+    assert nearest(final, batch(100, 2)) == lost.ids[:2]
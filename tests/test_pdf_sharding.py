@@ -0,0 +1,63 @@
+from lib.documents.PdfReader import PdfReader
+from benchmarks.bench_pdf_parse import build_pdf
+import glob
+import os
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATTERN = os.path.join(ROOT, "pdfs", "*.pdf")
+
+pytestmark = pytest.mark.skipif(not glob.glob(PATTERN), reason="no sample PDFs")
+
+
+@pytest.fixture(scope="module")
+def large_pdf(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("pdf") / "large.pdf")
+    build_pdf(PATTERN, 23, path)
+    return path
+
+
+def parse(file_path: str, workers: int) -> list[tuple]:
+    reader = PdfReader(
+        chunk_size=400,
+        chunk_overlap=80,
+        token_counts=False,
+        workers=workers,
+        min_shard_pages=4,
+    )
+    res = reader.extract_data(file_path)
+    assert res.success, res.error
+    return [
+        (chunk.id, chunk.page_number, chunk.chunk_number, chunk.content)
+        for chunk in res.data["pages"]
+    ]
+
+
+def test_shard_ranges_cover_every_page_once():
+    reader = PdfReader(workers=3, min_shard_pages=4)
+    ranges = reader.shard_ranges(23)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 23
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    assert all(end - start >= 4 for start, end in ranges[:-1])
+
+
+def test_sharded_chunks_match_serial(large_pdf):
+    serial = parse(large_pdf, 1)
+    sharded = parse(large_pdf, 2)
+
+    assert serial
+    assert sharded == serial
+    # Chunk numbers run on across pages, so ids never repeat.
+    assert [n for _, _, n, _ in sharded] == list(range(1, len(sharded) + 1))
+    assert len({chunk_id for chunk_id, _, _, _ in sharded}) == len(sharded)
+
+
+def test_page_groups_hold_whole_pages(large_pdf):
+    reader = PdfReader(chunk_size=400, chunk_overlap=80, token_counts=False)
+    groups = list(reader.iter_pages(large_pdf, min_chunks=5))
+    flat = [chunk for group in groups for chunk in group]
+    assert [c.id for c in flat] == [c.id for c in reader.iter_chunks(large_pdf)]
+
+    for group, following in zip(groups, groups[1:]):
+        assert len(group) >= 5
+        assert group[-1].page_number != following[0].page_number
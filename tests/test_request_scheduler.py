@@ -0,0 +1,252 @@
+from lib.scheduler.RequestScheduler import RequestScheduler, is_transient
+from lib.scheduler.RateLimiter import RateLimiter, TokenBucket
+from lib.scheduler.CircuitBreaker import CircuitBreaker, CircuitOpenError
+from lib.common.responses import Response
+import sys
+import pytest
+
+
+class FakeClock:
+    """monotonic() / sleep() for the scheduler modules; sleeping moves time"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    for module in ("RateLimiter", "CircuitBreaker", "RequestScheduler"):
+        monkeypatch.setattr(sys.modules[f"lib.scheduler.{module}"], "time", clock)
+    return clock
+
+
+class TransientError(Exception):
+    pass
+
+
+class ReadTimeout(Exception):
+    """Named like the httpx exception; matched by class name"""
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__("provider error")
+        self.status_code = status_code
+
+
+# ---------------------------------------------------
+# Token buckets
+# ---------------------------------------------------
+def test_bucket_queues_callers_once_empty(clock):
+    bucket = TokenBucket(60)  # one token per second, 60 to start with
+    assert bucket.reserve(60) == 0.0
+    # Each caller waits behind the ones before it.
+    assert bucket.reserve() == pytest.approx(1.0)
+    assert bucket.reserve() == pytest.approx(2.0)
+
+    clock.now += 5
+    # Two owed tokens were paid back; three are left.
+    assert bucket.reserve(3) == 0.0
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_bucket_serves_requests_larger_than_itself(clock):
+    bucket = TokenBucket(60, capacity=10)
+    assert bucket.reserve(500) == 0.0
+    assert bucket.reserve(5) == pytest.approx(5.0)
+
+
+def test_limiter_waits_for_the_slower_limit_and_pauses(clock):
+    limiter = RateLimiter(requests_per_minute=120, tokens_per_minute=600)
+    assert limiter.reserve(tokens=600) == 0.0
+    # Requests are left, tokens are not: 300 tokens at 10 per second.
+    assert limiter.acquire(tokens=300) == pytest.approx(30.0)
+    assert clock.slept == [pytest.approx(30.0)]
+
+    # A 429: everyone waits out the pause, and the request bucket is
+    # emptied so callers do not all rush in together when it ends.
+    limiter.pause(45)
+    assert limiter.requests.tokens <= 0
+    assert limiter.reserve() == pytest.approx(45.0)
+    clock.now += 45
+    assert limiter.reserve() == 0.0
+
+
+# ---------------------------------------------------
+# Error classification and backoff
+# ---------------------------------------------------
+@pytest.mark.parametrize(
+    "error",
+    [
+        "429 RESOURCE_EXHAUSTED: quota exceeded",
+        "503 Service Unavailable",
+        "504 Deadline Exceeded",
+        "The model is overloaded. Please try again later.",
+        ConnectionError("connection reset by peer"),
+        TimeoutError(),
+        ReadTimeout("read timed out"),
+        StatusError(502),
+        StatusError(429),
+    ],
+)
+def test_transient_errors(error):
+    assert is_transient(error)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        None,
+        "400 INVALID_ARGUMENT: Request contains an invalid argument.",
+        "401 UNAUTHENTICATED: API key not valid",
+        ValueError("chunk is empty"),
+        FileNotFoundError("connection.json"),
+        StatusError(404),
+    ],
+)
+def test_permanent_errors(error):
+    assert not is_transient(error)
+
+
+def test_backoff_uses_full_jitter_and_the_provider_delay(monkeypatch):
+    scheduler = RequestScheduler(base_delay=0.5, max_delay=4.0)
+    monkeypatch.setattr(
+        sys.modules["lib.scheduler.RequestScheduler"].random,
+        "uniform",
+        lambda low, high: high,
+    )
+    assert [scheduler.backoff(a) for a in range(5)] == [0.5, 1.0, 2.0, 4.0, 4.0]
+    assert scheduler.backoff(0, "429 Too Many Requests, retry in 3s") == 3.0
+    assert scheduler.backoff(0, "retryDelay: '90s'") == 4.0
+
+
+# ---------------------------------------------------
+# Scheduler retries
+# ---------------------------------------------------
+def flaky(errors: list):
+    """A call that raises the queued errors first, then succeeds"""
+    calls = []
+
+    def call(value):
+        calls.append(value)
+        if errors:
+            raise errors.pop(0)
+        return value * 2
+
+    return call, calls
+
+
+def test_transient_failures_are_retried_with_backoff(clock):
+    scheduler = RequestScheduler(max_retries=3, base_delay=1.0)
+    call, calls = flaky([TransientError("503 unavailable")] * 2)
+
+    assert scheduler.run(call, 21) == 42
+    assert len(calls) == 3
+    assert len(clock.slept) == 2
+    assert all(0 <= s <= 1.0 * 2**n for n, s in enumerate(clock.slept))
+    stats = scheduler.stats()
+    assert stats["retries"] == 2 and stats["failures"] == 2
+    assert stats["circuit"] == CircuitBreaker.CLOSED
+
+
+def test_rate_limit_pauses_other_callers(clock):
+    scheduler = RequestScheduler(requests_per_minute=600, max_retries=1)
+    call, _ = flaky([TransientError("429 Too Many Requests, retry in 7s")])
+
+    assert scheduler.run(call, 1) == 2
+    assert clock.slept == [7.0]
+    assert scheduler.limiter.paused_until == pytest.approx(clock.now)
+    assert scheduler.stats()["rate_limited"] == 1
+
+
+def test_permanent_errors_are_not_retried(clock):
+    scheduler = RequestScheduler(failure_threshold=1)
+    call, calls = flaky([ValueError("400 INVALID_ARGUMENT")])
+
+    with pytest.raises(ValueError):
+        scheduler.run(call, 1)
+    assert len(calls) == 1 and clock.slept == []
+    # A bad request says nothing about the provider's health.
+    assert scheduler.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_responses_are_retried_like_errors(clock):
+    scheduler = RequestScheduler(max_retries=2)
+    responses = [Response.fail("503 Service Unavailable", "failed")] * 3
+    result = scheduler.run(lambda: responses.pop(0))
+    assert not result.success
+    assert len(clock.slept) == 2 and not responses
+
+
+# ---------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------
+def test_breaker_opens_then_half_opens_for_one_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 9
+    with pytest.raises(CircuitOpenError, match="retry in 1.0s"):
+        breaker.before_call()
+
+    clock.now += 1
+    breaker.before_call()  # the trial
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError, match="trial call in progress"):
+        breaker.before_call()
+
+    # A failed trial re-opens it for another full timeout.
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 5
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 5
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+    breaker.before_call()
+    breaker.before_call()
+
+
+def test_released_trial_lets_the_next_call_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    # e.g. KeyboardInterrupt during the trial: neither outcome.
+    breaker.release_trial()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+
+
+def test_open_circuit_rejects_calls_until_the_trial_succeeds(clock):
+    scheduler = RequestScheduler(failure_threshold=2, reset_timeout=30, max_retries=1)
+    call, calls = flaky([TransientError("503 unavailable")] * 2)
+
+    with pytest.raises(TransientError):
+        scheduler.run(call, 1)
+    assert scheduler.breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        scheduler.run(call, 1)
+    assert len(calls) == 2
+    assert scheduler.stats()["rejected"] == 1
+
+    clock.now += 30
+    assert scheduler.run(call, 1) == 2
+    assert scheduler.stats()["circuit"] == CircuitBreaker.CLOSED
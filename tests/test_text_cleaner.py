@@ -0,0 +1,42 @@
+from lib.documents.TextCleaner import TextCleaner
+from benchmarks.bench_clean_text import legacy_clean_text, load_pages
+import glob
+import os
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLES = [
+    "",
+    "plain text",
+    "hyphen-\nated words and ex-  \n  tended breaks",
+    "a well-known term stays hyphenated",
+    "first line\nsecond line\n\nnew paragraph\n\n\nthird",
+    "text above\n12\nmore text\n  7  \n3 apples",
+    "Body text.\nReferences\n[1] Some paper",
+    "Body about REFERENCES to other work\nreferences again",
+    "  many    spaces   here  \n\n  and  there  ",
+    "trailing number line\n42",
+    "tabs\tare\tkept\nbut  spaces  collapse",
+    "unicode — dashes and café-\nterias",
+]
+
+
+@pytest.fixture(scope="module")
+def cleaner():
+    return TextCleaner()
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_clean_matches_legacy(cleaner, text):
+    assert cleaner.clean(text) == legacy_clean_text(text)
+
+
+@pytest.mark.skipif(
+    not glob.glob(os.path.join(ROOT, "pdfs", "*.pdf")), reason="no sample PDFs"
+)
+def test_clean_matches_legacy_on_pdf_pages(cleaner):
+    pages = load_pages(os.path.join(ROOT, "pdfs", "*.pdf"))
+    assert pages
+    for page in pages:
+        assert cleaner.clean(page) == legacy_clean_text(page)
@@ -0,0 +1,100 @@
+from lib.database.NumpyVectorStore import NumpyVectorStore
+from lib.database.EmbeddingBatch import EmbeddingBatch
+from lib.documents.ChunkRecord import ChunkRecord
+import numpy as np
+import pytest
+
+SOURCE = "doc.pdf"
+
+
+def chunk(page: int, number: int, content: str) -> ChunkRecord:
+    return ChunkRecord(SOURCE, page, number, content)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = NumpyVectorStore("diff", path=str(tmp_path))
+    chunks = [
+        chunk(1, 1, "alpha"),
+        chunk(1, 2, "beta"),
+        chunk(2, 3, "gamma"),
+        chunk(2, 4, "delta"),
+    ]
+    vectors = np.eye(len(chunks), 8, dtype=np.float32)
+    assert store.sync(EmbeddingBatch(chunks, vectors), []).success
+    return store
+
+
+def test_unchanged_document(store):
+    res = store.diff(SOURCE, [chunk(1, 1, "alpha"), chunk(1, 2, "beta")])
+    assert res.success
+    assert res.data["unchanged"] == ["doc.pdf:1:1", "doc.pdf:1:2"]
+    assert res.data["pending"] == []
+    assert len(res.data["reused"]) == 0
+    assert sorted(res.data["removed"]) == ["doc.pdf:2:3", "doc.pdf:2:4"]
+
+
+def test_edited_moved_and_new_chunks(store):
+    current = [
+        chunk(1, 1, "alpha"),  # unchanged
+        chunk(1, 2, "beta, edited"),  # same id, new content
+        chunk(2, 3, "delta"),  # content of doc.pdf:2:4 under a new id
+        chunk(3, 4, "epsilon"),  # new
+    ]
+    res = store.diff(SOURCE, current)
+    assert res.success
+
+    assert res.data["unchanged"] == ["doc.pdf:1:1"]
+    assert [c["id"] for c in res.data["pending"]] == ["doc.pdf:1:2", "doc.pdf:3:4"]
+    assert res.data["removed"] == ["doc.pdf:2:4"]
+
+    reused = res.data["reused"]
+    assert reused.ids == ["doc.pdf:2:3"]
+    # The stored embedding of "delta" is reused instead of re-embedding.
+    np.testing.assert_allclose(reused.embeddings[0], np.eye(4, 8)[3], atol=1e-6)
+
+
+def test_other_sources_and_page_images_are_ignored(store):
+    other = ChunkRecord("other.pdf", 1, 1, "alpha")
+    image_id = store.image_id(SOURCE, 1, "f" * 64)
+    image = ChunkRecord(SOURCE, 1, 0, "a figure", chunk_id=image_id)
+    vectors = np.eye(2, 8, k=4, dtype=np.float32)
+    assert store.sync(EmbeddingBatch([other, image], vectors), []).success
+
+    res = store.diff(SOURCE, [])
+    assert res.success
+    assert sorted(res.data["removed"]) == [
+        "doc.pdf:1:1",
+        "doc.pdf:1:2",
+        "doc.pdf:2:3",
+        "doc.pdf:2:4",
+    ]
+
+
+def test_diff_after_removal(store):
+    assert store.sync(EmbeddingBatch.empty(8), ["doc.pdf:2:3"]).success
+    res = store.diff(SOURCE, [chunk(2, 3, "gamma")])
+    assert res.success
+    assert [c["id"] for c in res.data["pending"]] == ["doc.pdf:2:3"]
+    assert "doc.pdf:2:3" not in res.data["removed"]
+
+
+def test_incremental_diff_matches_whole_document(store):
+    current = [
+        chunk(1, 1, "alpha"),
+        chunk(1, 2, "beta, edited"),
+        chunk(2, 3, "delta"),
+        chunk(3, 4, "epsilon"),
+    ]
+    whole = store.diff(SOURCE, current).data
+
+    differ = store.differ(SOURCE)
+    parts = [differ.update(current[:2]), differ.update(current[2:])]
+    assert sum((p["unchanged"] for p in parts), []) == whole["unchanged"]
+    assert [c["id"] for p in parts for c in p["pending"]] == [
+        c["id"] for c in whole["pending"]
+    ]
+    assert [i for p in parts for i in p["reused"].ids] == whole["reused"].ids
+    assert differ.removed() == whole["removed"]
+    # Only the ids are kept across batches, not the chunks.
+    assert differ.seen == {c.id for c in current}